@@ -1,22 +1,51 @@
 from __future__ import annotations
 
-import uuid
-import openai
+import sys
+import threading
+import itertools
+from array import array
 from utils.vdb import VDB
+from utils.edge_store import CSREdgeStore
+from utils.entity_resolution import EntityResolver
+from utils.name_index import NameIndex
+from utils.normalize import normalize_label, normalize_name
+from utils.query import QueryEngine, RelationIndex, TriplePattern
+from utils.property_index import PropertyIndex, properties_match
+from utils.analytics import GraphAnalytics
 from utils.similarity import cosine_similarity
-from utils.gpt import gpt3_embedding, gpt_chat
-from typing import Union, Optional, Dict
+from utils.gpt import gpt_chat, GPTError
+from typing import Union, Optional, Dict, Iterator
 from collections import deque
+from collections.abc import Mapping, Sequence
 
-import networkx as nx
-from pyvis.network import Network
-import pyvis.network as nt
+# unique number of each graph in this process, part of the stamp() of its results
+_graph_ids = itertools.count()
+
+
+def relation_key(head: str, name: str, tail: str) -> tuple:
+   """
+   Canonical key of a triplet: the names normalized like the name indexes normalize them (case and
+   punctuation don't matter, nor the _Relation suffix and plurals of the relation name), so the same
+   triplet extracted from overlapping text windows gets the same key
+
+   Parameters:
+   head (str): name of the head entity
+   name (str): relation name, either as extracted ("chancellor of") or as stored ("Chancellor_of_Relation")
+   tail (str): name of the tail entity
+
+   Returns:
+   tuple: (head, relation, tail) normalized
+   """
+   return (normalize_name(head), normalize_label(name), normalize_name(tail))
 
 
 class KGRelation:
    """
-   Relation class of Knowledge Graph, holds head and tail entity as string
+   Relation class of Knowledge Graph, holds head and tail entity as string. Uses __slots__ and interned
+   names so a graph with millions of relations stays small, the id is a compact integer assigned by
+   the KnowledgeGraph the relation is added to (None before that)
    """
+   __slots__ = ('id', 'name', 'head_entity', 'tail_entity', 'data_properties', 'description', 'source')
     
    def __init__(
       self,
@@ -27,13 +56,24 @@ class KGRelation:
       description: str,
       source: str
    ):
-      self.id = str(uuid.uuid4())
-      self.name: str = name
-      self.head_entity: str = head_entity
-      self.tail_entity: str = tail_entity
+      self.id: Optional[int] = None
+      self.name: str = sys.intern(name)
+      self.head_entity: str = sys.intern(head_entity)
+      self.tail_entity: str = sys.intern(tail_entity)
       self.data_properties: Dict[str, str] = data_properties
       self.description: str = description
       self.source: str = source
+
+   def __getstate__(self):
+      return {slot: getattr(self, slot) for slot in self.__slots__}
+
+   def __setstate__(self, state):
+      # state is a plain __dict__ for pickles written before __slots__ were used
+      for slot in self.__slots__:
+         setattr(self, slot, state.get(slot))
+      self.name = sys.intern(self.name)
+      self.head_entity = sys.intern(self.head_entity)
+      self.tail_entity = sys.intern(self.tail_entity)
    
    def __str__(self):
       return f"\nRelation: (\n  id: {self.id}\n  name: {self.name}\n  head: {self.head_entity}\n  tail: {str(self.tail_entity)}\n  data_properties: {str(self.data_properties)}\n  description: {self.description}\n  source: {self.source}\n)\n"
@@ -41,8 +81,10 @@ class KGRelation:
 
 class KGEntity:
    """
-   Entity class of Knowledge Graph, holds a list of relations where this entity is head
+   Entity class of Knowledge Graph, holds a list of relations where this entity is head. Like KGRelation
+   it uses __slots__, an interned name and a compact integer id assigned by the KnowledgeGraph
    """
+   __slots__ = ('id', 'name', 'data_properties', 'description', 'types', 'relations')
     
    def __init__(
       self,
@@ -52,19 +94,25 @@ class KGEntity:
       types: list[str],
       relations: list[KGRelation]
    ):
-      self.id: str = str(uuid.uuid4())
-      self.name: str = name
+      self.id: Optional[int] = None
+      self.name: str = sys.intern(name)
       self.data_properties: Dict[str, str] = data_properties
       self.description: str = description
       self.types: list[str] = types
       self.relations: list[KGRelation] = relations
 
+   def __getstate__(self):
+      return {slot: getattr(self, slot) for slot in self.__slots__}
+
+   def __setstate__(self, state):
+      # state is a plain __dict__ for pickles written before __slots__ were used
+      for slot in self.__slots__:
+         setattr(self, slot, state.get(slot))
+      self.name = sys.intern(self.name)
+
    def __str__(self):
-      return_str = f"\nEntity: (\n  id: {self.id}\n  name: {self.name}\n  data_properties: {self.data_properties}\n  description: {self.description}\n  types: {str(self.types)}\n  relations: ["
-      for relation in self.relations:
-         return_str += relation.name + ','
-      return_str += "]\n)\n"
-      return return_str
+      relations = "".join(relation.name + ',' for relation in self.relations)
+      return f"\nEntity: (\n  id: {self.id}\n  name: {self.name}\n  data_properties: {self.data_properties}\n  description: {self.description}\n  types: {str(self.types)}\n  relations: [{relations}]\n)\n"
    
 
 class KnowledgeGraph:
@@ -72,6 +120,16 @@ class KnowledgeGraph:
    The Knowledge Graph class, unlike usual Graph which only stores node, it stores both entities and 
    relations (nodes and edges). It also controls 3 vector databases which stores vectorized entities, 
    relations, and types.
+   Entities and relations get dense integer ids in insertion order, so entity_list[id] and relations[id]
+   are the lookups by id and the vector databases are keyed by those ids.
+   If an EntityResolver is given, a new entity whose embedding is close enough to an existing one is
+   merged into it at insert time, and its name is kept as an alias of the existing entity.
+   Writes are serialized by a lock and bump self.version, readers don't lock: they take a snapshot()
+   which sees the graph as it was at one version while writers keep adding to it.
+   Entity and relation names are embedded by the provider of their vector database (remote OpenAI
+   embeddings by default, or the local "hashing" one), which also sets the threshold for names to match.
+   Types are embedded into types_vdb (keyed by the type name) as entities bring them, and an inverted
+   index of types lets lookups of typed names scan the entities of compatible types first.
    """
 
    def __init__(
@@ -79,16 +137,258 @@ class KnowledgeGraph:
       entities: Dict[str, KGEntity],
       relations: set[KGRelation],
       types: set[str],
-      vdb_path: str='./vdb'
+      vdb_path: Optional[str]='./vdb',
+      resolver: Optional[EntityResolver]=None,
+      entity_embedding: str='openai',
+      relation_embedding: str='openai'
    ):
-      self.entities: Dict[str, KGEntity] = entities
-      self.relations: set[KGRelation] = relations
-      self.entities_vdb_map: Dict[str, KGEntity] = dict()
-      self.relations_vdb_map: Dict[str, KGRelation] = dict()
+      self.entities: Dict[str, KGEntity] = dict()
+      self.entity_list: list[KGEntity] = []
+      self.relations: list[KGRelation] = []
       self.types: set[str] = types
-      self.entity_vdb: VDB = VDB(f'{vdb_path}/entity_vdb.json')
-      self.relation_vdb: VDB = VDB(f'{vdb_path}/relation_vdb.json')
-      self.types_vdb: VDB = VDB(f'{vdb_path}/types_vdb.json')
+      # optional CSR adjacency, once built it replaces the relation list of every entity
+      self.edge_store: Optional[CSREdgeStore] = None
+      self.resolver: Optional[EntityResolver] = resolver
+      # vdb_path=None keeps the vector databases in memory only, for throwaway graphs
+      self.entity_vdb: VDB = VDB(f'{vdb_path}/entity_vdb.json' if vdb_path is not None else None, embedding=entity_embedding)
+      self.relation_vdb: VDB = VDB(f'{vdb_path}/relation_vdb.json' if vdb_path is not None else None, embedding=relation_embedding)
+      self.types_vdb: VDB = VDB(f'{vdb_path}/types_vdb.json' if vdb_path is not None else None, embedding=entity_embedding)
+      self._init_sync_state()
+      self._init_indexes()
+
+      for entity in entities.values():
+         self._register_entity(entity)
+      for relation in relations:
+         self._register_relation(relation)
+
+
+   def _init_sync_state(self) -> None:
+      """
+      Create the write lock, the version counter (bumped by every write) and the uid of the graph
+      """
+      self._write_lock: threading.RLock = threading.RLock()
+      self.version: int = 0
+      self.uid: int = next(_graph_ids)
+      # version of the last write to every entity and relation (by id), see diff()
+      self.entity_versions: array = array('q')
+      self.relation_versions: array = array('q')
+
+
+   def _pad_versions(self) -> None:
+      """
+      Give version 0 to the entities and relations of a graph saved before versions were recorded
+      """
+      self.entity_versions.extend([0] * (len(self.entity_list) - len(self.entity_versions)))
+      self.relation_versions.extend([0] * (len(self.relations) - len(self.relation_versions)))
+
+
+   def _init_indexes(self) -> None:
+      """
+      Create the string indexes of entity and relation names and the relation index of queries, they are
+      built lazily on lookup
+      """
+      self.entity_names: NameIndex = NameIndex()
+      self.relation_names: NameIndex = NameIndex(normalize=normalize_label)
+      self.relation_index: RelationIndex = RelationIndex()
+      # exact values and periods (start_time/end_time...) of the data_properties
+      self.entity_properties: PropertyIndex = PropertyIndex()
+      self.relation_properties: PropertyIndex = PropertyIndex()
+      # (head id, normalized relation name, normalized tail) -> relation id, for merging duplicate
+      # relations, the relations added since the last lookup are keyed lazily
+      self.relation_keys: Dict[tuple, int] = dict()
+      self._keyed_relations: int = 0
+      # normalized type -> ids of the entities of that type, built on first use and then kept up to date
+      self.type_entities: Optional[Dict[str, list[int]]] = None
+      # degrees, components and PageRank of the current version, see analytics()
+      self._analytics: Optional[GraphAnalytics] = None
+
+
+   def _lookup_entity_name(self, name: str) -> Optional[KGEntity]:
+      """
+      Entity a name refers to up to trivial variations (case, punctuation, typos...), found with the
+      string index without any embedding call
+
+      Parameters:
+      name (str): the name
+
+      Returns:
+      Optional[KGEntity]: the entity, None if the string index can't tell
+      """
+      self.entity_names.catch_up(self.entity_list)
+      entity_id = self.entity_names.lookup(name, limit=len(self.entity_list))
+      return self.get_entity(entity_id) if entity_id is not None else None
+
+
+   def _type_index(self) -> Dict[str, list[int]]:
+      """
+      The type -> entity ids index, built from the entities on first use
+      """
+      if self.type_entities is None:
+         with self._write_lock:
+            if self.type_entities is None:
+               type_entities = dict()
+               for entity in self.entity_list:
+                  for type in entity.types:
+                     type_entities.setdefault(normalize_label(type), []).append(entity.id)
+               self.type_entities = type_entities
+      return self.type_entities
+
+
+   def compatible_types(self, types: list[str]) -> set[str]:
+      """
+      Types of the graph (normalized) compatible with the given ones: the same up to trivial variations,
+      or close to them in types_vdb
+
+      Parameters:
+      types (list[str]): type names
+
+      Returns:
+      set[str]: normalized names of the compatible types
+      """
+      compatible = set()
+      for type in types:
+         compatible.add(normalize_label(type))
+         if len(self.types_vdb) == 0:
+            continue
+         vector = self.types_vdb.query_id(type) if type in self.types_vdb else self.types_vdb.embed(type)
+         for match in self.types_vdb.query_range(vector, self.types_vdb.threshold):
+            compatible.add(normalize_label(match['id']))
+      return compatible
+
+
+   def entities_of_type(self, types: list[str]) -> list[int]:
+      """
+      Ids of the entities having a type compatible with one of the given ones
+
+      Parameters:
+      types (list[str]): type names
+
+      Returns:
+      list[int]: entity ids, in increasing order
+      """
+      type_index = self._type_index()
+      limit = len(self.entity_list)
+      ids = set()
+      for type in self.compatible_types(types):
+         ids.update(id for id in type_index.get(type, ()) if id < limit)
+      return sorted(ids)
+
+
+   def _best_entity(self, vector, types: Optional[list[str]]=None) -> Optional[KGEntity]:
+      """
+      Entity whose name is the most similar to the vector, above the threshold of the entity VDB. If types
+      are given, the entities with compatible types are scanned first; types are free-form, so when none
+      of them matches all the entities are.
+      """
+      if types:
+         candidates = self.entities_of_type(types)
+         if len(candidates) != 0:
+            most_similar_pair = self.entity_vdb.query_best_among(vector, candidates, self.entity_vdb.threshold)
+            if most_similar_pair is not None:
+               return self.get_entity(most_similar_pair["id"])
+      most_similar_pair = self.entity_vdb.query_best(input_vector=vector, threshold=self.entity_vdb.threshold)
+      return self.get_entity(most_similar_pair["id"]) if most_similar_pair is not None else None
+
+
+   def _register_entity(self, entity: KGEntity) -> bool:
+      """
+      Put the entity into the in-memory structures of the graph, without touching vector database
+
+      Parameters:
+      entity (KGEntity): The entity to add
+
+      Returns:
+      bool: True if it is a new entity, False if it was merged into an existing one with the same name
+      """
+      for type in entity.types:
+         self.types.add(type)
+      name = self.canonical_name(entity.name)
+      if name in self.entities:
+         self._merge_entity(self.entities[name], entity)
+         return False
+      entity.id = len(self.entity_list)
+      self.entity_list.append(entity)
+      self.entities[entity.name] = entity
+      self.entity_versions.append(self.version)
+      if self.type_entities is not None:
+         for type in entity.types:
+            self.type_entities.setdefault(normalize_label(type), []).append(entity.id)
+      if self.edge_store is not None:
+         entity.relations = ()
+      return True
+
+
+   def _register_relation(self, relation: KGRelation) -> None:
+      """
+      Put the relation into the in-memory structures of the graph, without touching vector database
+
+      Parameters:
+      relation (KGRelation): The relation to add
+      """
+      relation.head_entity = self.canonical_name(relation.head_entity)
+      relation.tail_entity = self.canonical_name(relation.tail_entity)
+      head = self.entities[relation.head_entity]
+      relation.id = len(self.relations)
+      self.relations.append(relation)
+      self.relation_versions.append(self.version)
+      if self.edge_store is None:
+         head.relations.append(relation)
+      else:
+         self.edge_store.append(head.id, self.entities[relation.tail_entity].id, relation.id)
+
+
+   def _merge_entity(self, existing: KGEntity, entity: KGEntity) -> None:
+      """
+      Merge a duplicate entity into the one already in the graph
+
+      Parameters:
+      existing (KGEntity): the entity in the graph
+      entity (KGEntity): the duplicate
+      """
+      existing.description += " " + entity.description
+      for key, value in entity.data_properties.items():
+         existing.data_properties.setdefault(key, value)
+      self.entity_properties.update(existing)
+      self.entity_versions[existing.id] = self.version
+      for type in entity.types:
+         if not type in existing.types:
+            existing.types.append(type)
+            if self.type_entities is not None and not existing.id in self.type_entities.get(normalize_label(type), ()):
+               self.type_entities.setdefault(normalize_label(type), []).append(existing.id)
+
+
+   def _merge_relation(self, existing: KGRelation, relation: KGRelation) -> None:
+      """
+      Merge a duplicate relation into the one already in the graph: attributes it doesn't have yet,
+      and its description and source if they are new
+
+      Parameters:
+      existing (KGRelation): the relation in the graph
+      relation (KGRelation): the duplicate
+      """
+      for key, value in relation.data_properties.items():
+         existing.data_properties.setdefault(key, value)
+      self.relation_properties.update(existing)
+      self.relation_versions[existing.id] = self.version
+      if relation.description and not relation.description in existing.description:
+         existing.description += " " + relation.description
+      if relation.source and not relation.source in existing.source:
+         existing.source += " " + relation.source
+
+
+   def canonical_name(self, name: str) -> str:
+      """
+      Name of the entity in the graph that the given name refers to, resolved through the alias table
+
+      Parameters:
+      name (str): an entity name or alias
+
+      Returns:
+      str: the canonical name, the name itself if it is not a known alias
+      """
+      if self.resolver is None:
+         return name
+      return self.resolver.canonical(name)
 
    
    def add_entity(self, entity: KGEntity) -> None:
@@ -98,72 +398,395 @@ class KnowledgeGraph:
       Parameters:
       entity (KGEntity): The entity to add
       """
-      if not entity.name in self.entities:
-         self.entities.update({entity.name: entity})
-         self.entities_vdb_map.update({entity.id: entity})
+      vector = None
+      if not self.canonical_name(entity.name) in self.entities:
+         # the embedding call is made outside of the lock so that other writers are not blocked by it
+         vector = self.entity_vdb.embed(entity.name)
+      type_vectors = {type: self.types_vdb.embed(type) for type in set(entity.types) if not type in self.types_vdb}
 
-         vector = gpt3_embedding(content=entity.name)
+      with self._write_lock:
+         self.version += 1
+         type_vectors = {type: vector for type, vector in type_vectors.items() if not type in self.types_vdb}
+         if len(type_vectors) != 0:
+            self.types_vdb.insert_index(type_vectors)
+         if self.canonical_name(entity.name) in self.entities:
+            # exact name or alias hit (possibly added by another writer meanwhile)
+            self._register_entity(entity)
+            return
+
+         if self.resolver is not None:
+            match = self.resolver.resolve(vector, self.entity_vdb)
+            if match is not None:
+               for type in entity.types:
+                  self.types.add(type)
+               existing = self.get_entity(match)
+               self.resolver.add_alias(entity.name, existing.name)
+               self._merge_entity(existing, entity)
+               return
 
+         self._register_entity(entity)
          self.entity_vdb.insert_index({entity.id: vector})
-      else:
-         self.entities[entity.name].description += " " + entity.description
-      for type in entity.types:
-         self.types.add(type)
 
 
    def add_relation(self, relation: KGRelation) -> None:
       """
-      Add relation into knowledge graph and vector database
+      Add relation into knowledge graph and vector database. If the head already has a relation with
+      the same canonical triplet (see relation_key), the new one is merged into it instead
 
       Parameters:
       relation (KGRelation): The relation to add
       """
-      self.relations.add(relation)
-      self.relations_vdb_map.update({relation.id: relation})
-      self.entities[relation.head_entity].relations.append(relation)
+      vector = None
+      if self._find_duplicate_relation(relation) is None:
+         # the embedding call is made outside of the lock so that other writers are not blocked by it
+         vector = self.relation_vdb.embed(relation.name)
 
-      vector = gpt3_embedding(content=relation.name)
+      with self._write_lock:
+         self.version += 1
+         existing = self._find_duplicate_relation(relation)
+         if existing is not None:
+            self._merge_relation(existing, relation)
+            return
+         if vector is None:
+            vector = self.relation_vdb.embed(relation.name)
+         self._register_relation(relation)
+         self.relation_vdb.insert_index({relation.id: vector})
 
-      self.relation_vdb.insert_index({relation.id: vector})
+
+   def _duplicate_key(self, relation: KGRelation) -> Optional[tuple]:
+      """
+      Key of the relation in relation_keys, None if its head is not in the graph
+      """
+      head_name = self.canonical_name(relation.head_entity)
+      if not head_name in self.entities:
+         return None
+      _, name, tail = relation_key(head_name, relation.name, self.canonical_name(relation.tail_entity))
+      return (self.entities[head_name].id, name, tail)
+
+
+   def _find_duplicate_relation(self, relation: KGRelation) -> Optional[KGRelation]:
+      """
+      The relation of the graph with the same head and canonical triplet as the given one, if any
+      """
+      if self._keyed_relations < len(self.relations):
+         with self._write_lock:
+            for relation_id in range(self._keyed_relations, len(self.relations)):
+               key = self._duplicate_key(self.relations[relation_id])
+               if key is not None:
+                  self.relation_keys.setdefault(key, relation_id)
+            self._keyed_relations = len(self.relations)
+      key = self._duplicate_key(relation)
+      if key is None or not key in self.relation_keys:
+         return None
+      return self.relations[self.relation_keys[key]]
+
+
+   def get_entity(self, entity_id: int) -> KGEntity:
+      """
+      Look up an entity by its integer id
+
+      Parameters:
+      entity_id (int): id of the entity, a string id from the vector database also works
+
+      Returns:
+      KGEntity: the entity
+      """
+      return self.entity_list[int(entity_id)]
+
+
+   def get_relation(self, relation_id: int) -> KGRelation:
+      """
+      Look up a relation by its integer id
+
+      Parameters:
+      relation_id (int): id of the relation, a string id from the vector database also works
+
+      Returns:
+      KGRelation: the relation
+      """
+      return self.relations[int(relation_id)]
+
+
+   def out_relations(self, entity: KGEntity) -> list[KGRelation]:
+      """
+      All the relations where the given entity is head, read from the CSR edge store if it is built
+
+      Parameters:
+      entity (KGEntity): the head entity
+
+      Returns:
+      list[KGRelation]: outgoing relations in insertion order
+      """
+      if self.edge_store is None:
+         return entity.relations
+      return [self.relations[relation_id] for relation_id in self.edge_store.neighbours(entity.id)]
+
+
+   def compact(self) -> None:
+      """
+      Move the adjacency of the graph into an array-backed CSR edge store over entity ids and drop the
+      per-entity relation lists, so every relation is only referenced once (from self.relations).
+      Calling it again merges edges added since the last call into the arrays.
+      """
+      with self._write_lock:
+         if self.edge_store is not None:
+            self.edge_store = self.edge_store.compact(len(self.entity_list))
+            return
+         heads, tails, relation_ids = [], [], []
+         for relation in self.relations:
+            heads.append(self.entities[relation.head_entity].id)
+            tails.append(self.entities[relation.tail_entity].id)
+            relation_ids.append(relation.id)
+         self.edge_store = CSREdgeStore.from_edges(len(self.entity_list), heads, tails, relation_ids)
+         for entity in self.entity_list:
+            entity.relations = ()
+
+
+   def snapshot(self) -> KnowledgeGraphSnapshot:
+      """
+      Read-only view of the graph at its current version. Entities, relations and vectors added later
+      are not visible through it, so a question can be answered against a consistent graph while
+      ingestion keeps writing. (Descriptions/properties merged into an existing entity later are visible,
+      entities are shared with the live graph.)
+
+      Returns:
+      KnowledgeGraphSnapshot: the snapshot
+      """
+      return KnowledgeGraphSnapshot(self)
+
+
+   def stamp(self) -> tuple:
+      """
+      Stamp of the graph at its current version, for caching results computed from it: it changes with
+      every add_entity/add_relation, and a snapshot has the stamp of the version it was taken at
+
+      Returns:
+      tuple: (graph uid, version)
+      """
+      return (self.uid, self.version)
+
+
+   def diff(self, since_version: int, vectors: bool=True) -> Iterator[dict]:
+      """
+      Records (see utils.kg_jsonl) of the entities and relations added or changed after the given
+      version of this graph, read from a snapshot so writers can go on meanwhile. The first record is a
+      header holding the current version, the checkpoint to diff from next time.
+
+      Parameters:
+      since_version (int): version of the last diff (or export) applied by the reader, -1 for everything
+      vectors (bool): include the embeddings, so the reader doesn't have to embed the names again
+
+      Returns:
+      Iterator[dict]: header, entity and relation records, one at a time
+      """
+      from utils.kg_jsonl import graph_records
+      return graph_records(self.snapshot(), since_version, vectors)
+
+
+   def export_jsonl(self, path: str, since_version: Optional[int]=None, vectors: bool=True) -> int:
+      """
+      Stream the graph (or what changed after since_version, see diff) to a JSON lines file, one entity
+      or relation per line, compressed if the path ends with .gz
+
+      Parameters:
+      path (str): output file
+      since_version (int or None): only write what changed after this version, None writes everything
+      vectors (bool): include the embeddings
+
+      Returns:
+      int: the version of the graph that was written, to pass as since_version next time
+      """
+      from utils.kg_jsonl import write_jsonl
+      records = self.diff(-1 if since_version is None else since_version, vectors)
+      header = next(records)
+      write_jsonl(path, itertools.chain([header], records))
+      return header["version"]
+
+
+   def import_jsonl(self, path: str) -> int:
+      """
+      Apply a JSON lines file written by export_jsonl, one record at a time. Entities and relations that
+      are new are added with their ids in this graph, the ones it already has (same name, same triplet)
+      take the state of the record. Names are embedded only if the file has no vectors.
+
+      Parameters:
+      path (str): file written by export_jsonl
+
+      Returns:
+      int: the version of the exported graph, to ask for the next diff from
+      """
+      from utils.kg_jsonl import read_jsonl, entity_from_record, relation_from_record, decode_vector
+      version = None
+      for record in read_jsonl(path):
+         kind = record["kind"]
+         if kind == "header":
+            version = record["version"]
+         elif kind == "entity":
+            self._upsert_entity(entity_from_record(record), decode_vector(record.get("vector")), record.get("aliases", []))
+         elif kind == "relation":
+            self._upsert_relation(relation_from_record(record), decode_vector(record.get("vector")))
+         else:
+            raise Exception(f"unknown record kind {kind} in {path}")
+      return version
+
+
+   def _upsert_entity(self, entity: KGEntity, vector: Optional[list[float]], aliases: list[str]) -> None:
+      """
+      Add an entity exported from another graph, or update the one with its name. The entity resolver
+      is not consulted, the exporting graph has resolved it already, its aliases are recorded instead.
+
+      Parameters:
+      entity (KGEntity): the entity in its current state
+      vector (list[float] or None): its embedding, embedded here if None and it is new
+      aliases (list[str]): other names of the entity
+      """
+      if vector is None and not self.canonical_name(entity.name) in self.entities:
+         vector = self.entity_vdb.embed(entity.name)
+      type_vectors = {type: self.types_vdb.embed(type) for type in set(entity.types) if not type in self.types_vdb}
+
+      with self._write_lock:
+         self.version += 1
+         type_vectors = {type: vector for type, vector in type_vectors.items() if not type in self.types_vdb}
+         if len(type_vectors) != 0:
+            self.types_vdb.insert_index(type_vectors)
+         name = self.canonical_name(entity.name)
+         if name in self.entities:
+            existing = self.entities[name]
+            # the record holds the whole description, merging would repeat it
+            existing.description = ""
+            self._merge_entity(existing, entity)
+            existing.description = entity.description
+            for type in entity.types:
+               self.types.add(type)
+         else:
+            self._register_entity(entity)
+            self.entity_vdb.insert_index({entity.id: vector})
+         if self.resolver is not None:
+            for alias in aliases:
+               self.resolver.add_alias(alias, name)
+
+
+   def _upsert_relation(self, relation: KGRelation, vector: Optional[list[float]]) -> None:
+      """
+      Add a relation exported from another graph, or update the one with its canonical triplet
+
+      Parameters:
+      relation (KGRelation): the relation in its current state
+      vector (list[float] or None): embedding of its name, embedded here if None and it is new
+      """
+      for name in (relation.head_entity, relation.tail_entity):
+         if not self.canonical_name(name) in self.entities:
+            raise Exception(f"relation {relation.name} refers to entity {name} which is neither in the graph nor in the import")
+      if vector is None and self._find_duplicate_relation(relation) is None:
+         vector = self.relation_vdb.embed(relation.name)
+
+      with self._write_lock:
+         self.version += 1
+         existing = self._find_duplicate_relation(relation)
+         if existing is not None:
+            existing.description, existing.source = relation.description, relation.source
+            relation.description = relation.source = ""
+            self._merge_relation(existing, relation)
+            return
+         if vector is None:
+            vector = self.relation_vdb.embed(relation.name)
+         self._register_relation(relation)
+         self.relation_vdb.insert_index({relation.id: vector})
+
+
+   def __getstate__(self):
+      state = self.__dict__.copy()
+      state.pop('_write_lock', None)
+      state.pop('uid', None)
+      state.pop('entity_names', None)
+      state.pop('relation_names', None)
+      state.pop('relation_index', None)
+      state.pop('type_entities', None)
+      state.pop('relation_keys', None)
+      state.pop('_keyed_relations', None)
+      state.pop('entity_properties', None)
+      state.pop('relation_properties', None)
+      state.pop('_analytics', None)
+      return state
+
+
+   def __setstate__(self, state):
+      self._init_sync_state()
+      self._init_indexes()
+      if 'entities_vdb_map' not in state:
+         self.__dict__.update(state)
+         self.__dict__.setdefault('resolver', None)
+         self._pad_versions()
+         return
+      # Pickles written before integer ids: re-number entities and relations and re-key the vector databases
+      self.entities = dict()
+      self.entity_list = []
+      self.relations = []
+      self.types = state['types']
+      self.edge_store = None
+      self.resolver = None
+      self.entity_vdb = state['entity_vdb']
+      self.relation_vdb = state['relation_vdb']
+      self.types_vdb = state['types_vdb']
+
+      entity_ids = dict()
+      for entity in state['entities'].values():
+         old_id = entity.id
+         entity.relations = []
+         self._register_entity(entity)
+         entity_ids[old_id] = entity.id
+      relation_ids = dict()
+      for relation in state['relations']:
+         old_id = relation.id
+         self._register_relation(relation)
+         relation_ids[old_id] = relation.id
+      # the old JSON files are left untouched, the migrated graph should be saved with utils.kg_store
+      for vdb in (self.entity_vdb, self.relation_vdb, self.types_vdb):
+         vdb.vdb_file = None
+      self.entity_vdb.rekey(entity_ids)
+      self.relation_vdb.rekey(relation_ids)
 
 
    def __str__(self):
-      return_str = "Knowledge Graph:\n\nEntities:\n"
-      for entity_name, entity in self.entities.items():
-         return_str += str(entity)
-      return_str += "\nRelations:\n"
-      for relation in self.relations:
-         return_str += str(relation)
-      return_str += "\nTypes:\n["
-      for type in self.types:
-         return_str += type + ","
-      return_str += ']\n'
-      return return_str
+      # joined once, concatenating piece by piece copies the whole dump for every entity and relation
+      parts = ["Knowledge Graph:\n\nEntities:\n"]
+      parts.extend(str(entity) for entity in self.entity_list)
+      parts.append("\nRelations:\n")
+      parts.extend(str(relation) for relation in self.relations)
+      parts.append("\nTypes:\n[")
+      parts.extend(type + "," for type in self.types)
+      parts.append(']\n')
+      return "".join(parts)
    
 
 
-   def find_entity(self, entity_name: str) -> Optional[KGEntity]:
+   def find_entity(self, entity_name: str, types: Optional[list[str]]=None) -> Optional[KGEntity]:
       """
       given name of an entity, find matching entity in the knowledge graph
 
       Parameters:
       entity_name (str): Name of the entity we want to find in KG
+      types (list[str] or None): types of the entity if known, the embedding search then scans the
+         entities of compatible types first (all of them if none of those matches)
 
       Returns:
       Optional[KGEntity]: the result entity
       """
       entity = None
+      entity_name = self.canonical_name(entity_name)
 
       if entity_name in self.entities:
          # If the name matches in the graph
          entity = self.entities[entity_name]
       else:
+         # trivial variations of a name are resolved by the string index, without an embedding call
+         entity = self._lookup_entity_name(entity_name)
+
+      if entity == None:
          # Find the most similar entity in the graph in terms of cosine similarity
-         # If the similarity of the most similar entity is lower than 0.9, means no matching entity
-         target_entity_vector = gpt3_embedding(content=entity_name)
-         most_similar_pair = self.entity_vdb.query_index(input_vector=target_entity_vector, count=1)
-         if most_similar_pair["score"] >= 0.90:
-            entity = self.entities_vdb_map[most_similar_pair["id"]]
+         # If the similarity of the most similar entity is lower than the threshold of the embedding, means no matching entity
+         target_entity_vector = self.entity_vdb.embed(entity_name)
+         entity = self._best_entity(target_entity_vector, types)
    
       if entity == None:
          return None    
@@ -185,56 +808,138 @@ class KnowledgeGraph:
       Optional[KGRelation]: the result relation
       """
       head = None
+      head_name = self.canonical_name(head_name)
+      tail_name = self.canonical_name(tail_name)
       # First find head entity in the knowledge graph
       if head_name in self.entities:
          # If the name matches in the graph
          head = self.entities[head_name]
       else:
+         head = self._lookup_entity_name(head_name)
+
+      if head == None:
          # Find the most similar entity in the graph in terms of cosine similarity
-         # If the similarity of the most similar entity is lower than 0.9, means no matching entity
-         target_head_entity_vector = gpt3_embedding(content=head_name)
-         most_similar_pair = self.entity_vdb.query_index(input_vector=target_head_entity_vector, count=1)
-         if most_similar_pair["score"] >= 0.90:
-            head = self.entities_vdb_map[most_similar_pair["id"]]
+         # If the similarity of the most similar entity is lower than the threshold of the embedding, means no matching entity
+         target_head_entity_vector = self.entity_vdb.embed(head_name)
+         most_similar_pair = self.entity_vdb.query_best(input_vector=target_head_entity_vector, threshold=self.entity_vdb.threshold)
+         if most_similar_pair is not None:
+            head = self.get_entity(most_similar_pair["id"])
    
       if head == None:
          return None    
       
       # Then traverse all the relations of head, and find the one with the same tail entity and relation name
-      for relation in head.relations:
-         if tail_name == relation.tail_entity:
-            # If name of the tail matches
-            if target_relation_name == relation.name:
+      for relation in self.out_relations(head):
+         if tail_name == relation.tail_entity or self.entity_names.match(tail_name, relation.tail_entity):
+            # If name of the tail matches (up to trivial variations)
+            if target_relation_name == relation.name or self.relation_names.match(target_relation_name, relation.name):
                # If relation name also matches
                return relation
             else:
                # If relation name doesn't match, use cosine similarity
-               target_relation_vector = gpt3_embedding(content=target_relation_name)
+               target_relation_vector = self.relation_vdb.embed(target_relation_name)
                curr_relation_vector = self.relation_vdb.query_id(relation.id)
                similarity = cosine_similarity(target_relation_vector, curr_relation_vector)
-               if similarity < 0.90:
+               if similarity < self.relation_vdb.threshold:
                   continue
                return relation
          else:
             # if name does not match, do cosine similarity again
-            target_tail_entity_vector = gpt3_embedding(content=tail_name)
+            target_tail_entity_vector = self.entity_vdb.embed(tail_name)
             curr_tail_entity_vector = self.entity_vdb.query_id(self.entities[relation.tail_entity].id)
             tail_entity_similarity = cosine_similarity(target_tail_entity_vector, curr_tail_entity_vector)
-            if tail_entity_similarity >= 0.90:
-               if target_relation_name == relation.name:
+            if tail_entity_similarity >= self.entity_vdb.threshold:
+               if target_relation_name == relation.name or self.relation_names.match(target_relation_name, relation.name):
                   # If relation name matches
                   return relation
                else:
                   # If relation name doesn't match, use cosine similarity
-                  target_relation_vector = gpt3_embedding(content=target_relation_name)
+                  target_relation_vector = self.relation_vdb.embed(target_relation_name)
                   curr_relation_vector = self.relation_vdb.query_id(relation.id)
                   similarity = cosine_similarity(target_relation_vector, curr_relation_vector)
-                  if similarity < 0.90:
+                  if similarity < self.relation_vdb.threshold:
                      continue
                   return relation
       
       return None
    
+   def entities_with(self, filters: Dict[str, str]) -> list[KGEntity]:
+      """
+      Entities whose data_properties pass the filters, found with the property indexes when possible.
+      A filter value matches the same value up to case and spaces, or a time within it ("2015" matches
+      "2015-09-01"); the special key "during" keeps the entities whose start/end times overlap a period
+
+      Parameters:
+      filters (Dict[str, str]): property key -> wanted value, e.g. {"during": "2015-2016"}
+
+      Returns:
+      list[KGEntity]: the entities, in id order
+      """
+      return self._filtered(self.entity_list, self.entity_properties, filters)
+
+
+   def relations_with(self, filters: Dict[str, str]) -> list[KGRelation]:
+      """
+      Relations whose data_properties pass the filters, see entities_with
+
+      Parameters:
+      filters (Dict[str, str]): property key -> wanted value, e.g. {"start_time": "2015"}
+
+      Returns:
+      list[KGRelation]: the relations, in id order
+      """
+      return self._filtered(self.relations, self.relation_properties, filters)
+
+
+   def filtered_relation_ids(self, filters: Dict[str, str]) -> Optional[set]:
+      """
+      Ids of a superset of relations_with(filters) read from the property indexes, None if no filter can
+      use them
+      """
+      self.relation_properties.catch_up(self.relations)
+      return self.relation_properties.candidates(filters, limit=len(self.relations))
+
+
+   def _filtered(self, items: Sequence, index: PropertyIndex, filters: Dict[str, str]) -> list:
+      index.catch_up(items)
+      ids = index.candidates(filters, limit=len(items))
+      candidates = (items[id] for id in sorted(ids)) if ids is not None else iter(items)
+      return [item for item in candidates if properties_match(item.data_properties, filters)]
+
+
+   def query(self, patterns: list[Union[TriplePattern, tuple]], limit: Optional[int]=None) -> list[dict]:
+      """
+      Evaluate a conjunctive query locally: all the ways to bind the variables of the triple patterns so
+      that every pattern is a relation of the graph. Entity names are resolved with find_entity, relation
+      names up to trivial variations (or by embedding similarity), and patterns are joined in order of
+      selectivity over the adjacency and relation indexes, see utils.query
+
+      Parameters:
+      patterns (list[TriplePattern or tuple]): (head, relation, tail) or (head, relation, tail, properties),
+         terms starting with "?" are variables, properties are attribute values the relation must have
+      limit (int or None): maximum number of results
+
+      Returns:
+      list[dict]: variable -> KGEntity (head/tail variables) or KGRelation (relation variables)
+      """
+      return QueryEngine(self).run(patterns, limit)
+
+
+   def analytics(self) -> GraphAnalytics:
+      """
+      In/out degree, weakly connected components and PageRank of the entities (see utils.analytics),
+      computed over CSR arrays of entity ids and cached until the graph changes
+
+      Returns:
+      GraphAnalytics: the analytics of the current version
+      """
+      analytics = self._analytics
+      if analytics is None or analytics.stamp != self.stamp():
+         analytics = GraphAnalytics(self)
+         self._analytics = analytics
+      return analytics
+
+
    def relation_completion(self) -> None:
       """
       For all the relations from a head entity to tail entity, there should be an inverse relation from
@@ -257,31 +962,42 @@ class KnowledgeGraph:
          visited.add(start)
          while len(q) != 0:
             current = q.popleft()
-            for relation in current.relations:
+            for relation in self.out_relations(current):
                next_entity = self.entities[relation.tail_entity]
                if not next_entity in visited:
                   has_inverse_relation = False
-                  for next_relation in next_entity.relations:
+                  for next_relation in self.out_relations(next_entity):
                      if next_relation.tail_entity == relation.head_entity:
                         has_inverse_relation = True
                   if not has_inverse_relation:
                      # If doesn't have inverse relation, use GPT to generate one
                      messages = [{"role": "system", "content": "You are an expert in linguistics and knowledge graph. You will be given a relation between two entities, and you will output a name for the inverse relation between them. Output only the relation name"}, {"role": "user", "content": f"Head Entity:{relation.head_entity}\nTail Entity: {relation.tail_entity}\nRelation: {relation.name}"}]
-                     inverse_relation = gpt_chat(messages, model="gpt-4")
+                     try:
+                        inverse_relation = gpt_chat(messages, model="gpt-4")
+                     except GPTError as oops:
+                        # left without inverse, the next completion can add it
+                        print(f"Inverse of {relation.name} failed: {oops}")
+                        inverse_relation = None
 
-                     # deal with formatting issues of GPT
-                     if inverse_relation.startswith('Inverse Relation: '):
-                        inverse_relation = inverse_relation[18:]
-                     if not inverse_relation.endswith('Relation'):
-                        inverse_relation += "_Relation"
-                     
-                     # add the new relation to the graph
-                     self.add_relation(KGRelation(name=inverse_relation, head_entity=relation.tail_entity, tail_entity=relation.head_entity, data_properties=relation.data_properties, description=relation.description, source=relation.source))
+                     if inverse_relation is not None:
+                        # deal with formatting issues of GPT
+                        if inverse_relation.startswith('Inverse Relation: '):
+                           inverse_relation = inverse_relation[18:]
+                        if not inverse_relation.endswith('Relation'):
+                           inverse_relation += "_Relation"
+                        
+                        # add the new relation to the graph
+                        self.add_relation(KGRelation(name=inverse_relation, head_entity=relation.tail_entity, tail_entity=relation.head_entity, data_properties=relation.data_properties, description=relation.description, source=relation.source))
 
                   q.append(next_entity)
                   visited.add(next_entity)
    
-      return bfs(list(self.entities.values())[0], visited)
+      # the graph is not always connected, every entity the previous traversals didn't reach starts a new
+      # one, sources and important entities first (see GraphAnalytics.traversal_roots)
+      for entity_id in self.analytics().traversal_roots():
+         entity = self.get_entity(int(entity_id))
+         if not entity in visited:
+            bfs(entity, visited)
    
    
    def find_path(self, e1: KGEntity, e2: KGEntity) -> list[KGRelation]:
@@ -317,7 +1033,7 @@ class KnowledgeGraph:
 
          visited.add(current.id)
 
-         for relation in current.relations:
+         for relation in self.out_relations(current):
             next_entity = self.entities[relation.tail_entity]
             path_result = dfs_find_path(next_entity, target, visited)
             if path_result is not None:
@@ -327,7 +1043,7 @@ class KnowledgeGraph:
       return dfs_find_path(e1, e2, visited)
    
    
-   def find_matching_entities(self, path: list[KGRelation], subgraph: KnowledgeGraph, question: str,) -> set[KGEntity]:
+   def find_matching_entities(self, path: list[KGRelation], subgraph: KnowledgeGraph, question: str, max_hub_degree: Optional[int]=None) -> set[KGEntity]:
       """
       Given a path from one entity to the target entity [ENTITY] in the subgraph, follow the same path in the 
       knowledge graph and find the target entity in the knowledge graph.
@@ -338,12 +1054,18 @@ class KnowledgeGraph:
       path (list[KGRelation]): path from an entity in subgraph to the unknown entity [ENTITY]
       subgraph (KnowledgeGraph): the subgraph
       question (str): The question currently dealing with, used to validate relation during recursion
+      max_hub_degree (int or None): intermediate entities of the path with a higher degree (in + out) are
+         not expanded, hubs multiply the branches without narrowing the answer
 
       Returns:
       set[KGEntity]: the set of all possible target entities
       """
       visited = set()
       matching_entities = set() # will have the result of dfs_find_matching_entities
+      # neighbours are explored by decreasing PageRank, so the important entities are reached first
+      analytics = self.analytics()
+      rank = analytics.pagerank
+      degree = analytics.degree if max_hub_degree is not None else None
 
       def dfs_find_matching_entities(current: KGEntity, path_idx: int, visited: set) -> None:
          """
@@ -361,31 +1083,37 @@ class KnowledgeGraph:
             matching_entities.add(current)
             return
 
+         if degree is not None and path_idx != 0 and degree[current.id] > max_hub_degree:
+            return
+
          visited.add(current.id)
 
-         for relation in current.relations:
+         relations = self.out_relations(current)
+         if len(relations) > 1:
+            relations = sorted(relations, key=lambda relation: -rank[self.entities[relation.tail_entity].id])
+         for relation in relations:
             path_relation_vector = subgraph.relation_vdb.query_id(path[path_idx].id)
             curr_relation_vector = self.relation_vdb.query_id(relation.id)
             similarity = cosine_similarity(path_relation_vector, curr_relation_vector)
-            if similarity < 0.90:
+            if similarity < self.relation_vdb.threshold:
                continue
             
-            # if cosine similarity >= 0.9, means the relation in path and current relation in this recursion matches
+            # if cosine similarity >= threshold, means the relation in path and current relation in this recursion matches
       
             if path_idx != len(path) - 1:
                # If path not ended, keeping recursing
 
                # another step of validation, matching tail entity
-               if path[path_idx].tail_entity == relation.tail_entity:
+               if self.canonical_name(path[path_idx].tail_entity) == relation.tail_entity:
                   # if tail entities' names are also the same
                   next_entity = self.entities[relation.tail_entity]
                   dfs_find_matching_entities(next_entity, path_idx + 1, visited)
                else:
                   # name not same, cosine similarity again
-                  input_tail_entity_vector = subgraph.entity_vdb.query_id(self.entities[path[path_idx].tail_entity].id)
+                  input_tail_entity_vector = subgraph.entity_vdb.query_id(subgraph.entities[path[path_idx].tail_entity].id)
                   tail_entity_vector = self.entity_vdb.query_id(self.entities[relation.tail_entity].id)
                   next_entity_similarity = cosine_similarity(input_tail_entity_vector, tail_entity_vector)
-                  if next_entity_similarity >= 0.90:
+                  if next_entity_similarity >= self.entity_vdb.threshold:
                      next_entity = self.entities[relation.tail_entity]
                      dfs_find_matching_entities(next_entity, path_idx + 1, visited)
             else:
@@ -402,57 +1130,131 @@ class KnowledgeGraph:
          return None
       
       # Find the starting entity in the graph
-      if path[0].head_entity in self.entities:
-         # If the name matches
-         start_entity: KGEntity = self.entities[path[0].head_entity]
+      if self.canonical_name(path[0].head_entity) in self.entities:
+         # If the name (or an alias of it) matches
+         start_entity: KGEntity = self.entities[self.canonical_name(path[0].head_entity)]
       else:
-         # If it doesn't match, use cosine similarity again
-         vector = subgraph.entity_vdb.query_id(self.entities[path[0].head_entity].id)
-         most_similar = self.entity_vdb.query_index(vector, 1)[0]
+         # If it doesn't match, use cosine similarity again, among the entities of compatible types first
+         subgraph_start = subgraph.entities[path[0].head_entity]
+         vector = subgraph.entity_vdb.query_id(subgraph_start.id)
+         start_entity: Optional[KGEntity] = self._best_entity(vector, subgraph_start.types)
         
-         if most_similar['score'] < 0.90:
-            # TODO: raise exception here just for testing
+         if start_entity is None:
             raise Exception("Fail since one entity in question doesn't exist in KG")
-            
-         start_entity: KGEntity = self.entities_vdb_map[most_similar['id']]
    
       dfs_find_matching_entities(start_entity, 0, visited)
       return matching_entities
    
    
-   def visualize(self, path="./kg_visualization/knowledge_graph.html") -> None:
+   def visualize(self, path="./kg_visualization/knowledge_graph.html", entities: Optional[list[str]]=None, hops: int=2, max_nodes: int=500, layout: Optional[str]=None, rank: str="degree", max_hub_degree: Optional[int]=None) -> None:
       """
-      Visualize the knowledge graph into HTML format
+      Visualize the knowledge graph into HTML format (or JSON if path ends with .json). Only a sample of at
+      most max_nodes entities is rendered: the neighbourhood of the given entities, or the most important
+      entities if none are given. The output is streamed to disk.
 
       Parameters:
       path (str): path of where you want to save the visualization
+      entities (list[str] or None): names of the entities to center the visualization on
+      hops (int): how many relations away from those entities to go
+      max_nodes (int): hard limit on the number of rendered entities
+      layout (str or None): "circular" or "spring" to precompute positions, None lets the browser do it
+      rank (str): importance of the entities sampled without a center, "degree" or "pagerank"
+      max_hub_degree (int or None): don't expand the neighbourhood through entities of a higher degree
       """
-      # Create a directed graph
-      G = nx.DiGraph()
+      from utils.visualization import sample_neighbourhood, sample_top, write_visualization
+
+      if entities:
+         sample = sample_neighbourhood(self, entities, hops, max_nodes, max_hub_degree)
+      else:
+         sample = sample_top(self, max_nodes, rank)
+      write_visualization(self, sample, path, layout)
 
-      # Add nodes and edges from both lists
-      for relation in self.relations:
-         G.add_edge(relation.head_entity, relation.tail_entity, label=relation.name)
 
-      # Create a Network instance
-      nt_graph = nt.Network(height="1000px", width="100%", bgcolor="#ffffff", font_color="white")
 
-      # Add nodes to the NetworkX graph
-      for node in G.nodes():
-         label = str(node)
-         color = "blue" if label.startswith("l(") else "black"
-         shape = "box" if color == "blue" else "ellipse"
-         nt_graph.add_node(label, label=label, color=color, shape=shape)
+class _SnapshotEntities(Mapping):
+   """
+   name -> entity map of a snapshot, hides the entities with an id above the snapshot's count
+   """
+   def __init__(self, entities: Mapping, entity_list: Sequence, count: int):
+      self._entities = entities
+      self._entity_list = entity_list
+      self._count = count
 
-      # Use a different layout algorithm with adjustable parameters
-      pos = nx.spring_layout(G, k=0.1)  # Adjust the 'k' parameter to control the force
+   def __getitem__(self, name: str) -> KGEntity:
+      entity = self._entities[name]
+      if entity.id >= self._count:
+         raise KeyError(name)
+      return entity
 
-      # Add edges to the NetworkX graph
-      for u, v in G.edges():
-         label = G[u][v]['label']
-         nt_graph.add_edge(str(u), str(v), title=label)
+   def __iter__(self):
+      for i in range(self._count):
+         yield self._entity_list[i].name
 
-      # Show the graph in an HTML file
-      nt_graph.write_html(path)
-         
-        
+   def __len__(self) -> int:
+      return self._count
+
+
+class _SnapshotList(Sequence):
+   """
+   Prefix of an append-only list, as seen by a snapshot
+   """
+   def __init__(self, items: Sequence, count: int):
+      self._items = items
+      self._count = count
+
+   def __getitem__(self, i):
+      if isinstance(i, slice):
+         return [self._items[j] for j in range(*i.indices(self._count))]
+      return self._items[range(self._count)[i]]
+
+   def __len__(self) -> int:
+      return self._count
+
+
+class KnowledgeGraphSnapshot(KnowledgeGraph):
+   """
+   Read-only view of a KnowledgeGraph at one version. Since ids are dense and only grow, the snapshot is
+   just the number of entities, relations and vectors at that version, taken under the write lock, and
+   everything with a larger id or row is hidden. Taking one is O(1) and doesn't copy the graph.
+   """
+
+   def __init__(self, graph: KnowledgeGraph):
+      with graph._write_lock:
+         self._graph: KnowledgeGraph = graph
+         self.version: int = graph.version
+         self.uid: int = graph.uid
+         self._relation_count: int = len(graph.relations)
+         self.entities = _SnapshotEntities(graph.entities, graph.entity_list, len(graph.entity_list))
+         self.entity_list = _SnapshotList(graph.entity_list, len(graph.entity_list))
+         self.relations = _SnapshotList(graph.relations, len(graph.relations))
+         self.types: set[str] = set(graph.types)
+         self.edge_store = graph.edge_store
+         self.resolver = graph.resolver
+         self.entity_vdb = graph.entity_vdb.snapshot()
+         self.relation_vdb = graph.relation_vdb.snapshot()
+         self.types_vdb = graph.types_vdb.snapshot()
+         self._write_lock = graph._write_lock
+         self.entity_names = graph.entity_names
+         self.relation_names = graph.relation_names
+         self.relation_index = graph.relation_index
+         self.entity_properties = graph.entity_properties
+         self.relation_properties = graph.relation_properties
+         self.entity_versions = graph.entity_versions
+         self.relation_versions = graph.relation_versions
+         self._analytics = graph._analytics if graph._analytics is not None and graph._analytics.stamp == self.stamp() else None
+
+   def _type_index(self) -> Dict[str, list[int]]:
+      # shared with the live graph, entities_of_type hides the ids above the snapshot's count
+      return self._graph._type_index()
+
+   def out_relations(self, entity: KGEntity) -> list[KGRelation]:
+      # the live graph may have moved its adjacency into the edge store since, so always ask it
+      return [relation for relation in self._graph.out_relations(entity) if relation.id < self._relation_count]
+
+   def snapshot(self) -> KnowledgeGraphSnapshot:
+      return self
+
+   def _read_only(self, *args, **kwargs):
+      raise Exception("a KnowledgeGraph snapshot is read-only, write to the graph it was taken from")
+
+   add_entity = add_relation = compact = relation_completion = import_jsonl = _read_only
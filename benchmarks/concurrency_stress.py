@@ -0,0 +1,128 @@
+"""
+Stress test of concurrent ingestion and reads: writer threads keep adding entities and relations while
+reader threads take snapshots and check that every snapshot is a consistent graph which does not change
+while it is being read. Embeddings are deterministic hashes, nothing goes over the network.
+
+Usage: python benchmarks/concurrency_stress.py --writers 4 --readers 8 --seconds 10
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+from utils.embedding import register_embedding
+
+
+def hash_embedding(content: str, engine: str='', dimension: int=64) -> list:
+    """
+    Deterministic stand-in for the remote embedding, with a small sleep like a network call
+    """
+    seed = int.from_bytes(hashlib.sha256(content.encode('utf-8')).digest()[:8], 'little')
+    time.sleep(0.0005)
+    return np.random.default_rng(seed).standard_normal(dimension).tolist()
+
+
+def check_snapshot(snapshot) -> int:
+    """
+    Check the invariants of a snapshot, returns the number of relations checked
+    """
+    num_entities = len(snapshot.entity_list)
+    num_relations = len(snapshot.relations)
+    assert len(snapshot.entity_vdb) == num_entities, (len(snapshot.entity_vdb), num_entities)
+    assert len(snapshot.relation_vdb) == num_relations
+    out_degree = 0
+    for entity in snapshot.entity_list:
+        assert snapshot.entities[entity.name] is entity
+        for relation in snapshot.out_relations(entity):
+            assert relation.id < num_relations
+            assert snapshot.entities[relation.tail_entity].id < num_entities
+            out_degree += 1
+    assert out_degree == num_relations, (out_degree, num_relations)
+
+    if num_entities > 0:
+        target = snapshot.entity_list[random.randrange(num_entities)]
+        assert snapshot.find_entity(target.name) is target
+        best = snapshot.entity_vdb.query_index(snapshot.entity_vdb.query_id(target.id), 1)[0]
+        assert int(best['id']) < num_entities
+        snapshot.find_path(snapshot.entity_list[0], target)
+
+    # the snapshot must not have moved while being read
+    assert len(snapshot.entity_list) == num_entities and len(snapshot.relations) == num_relations
+    return num_relations
+
+
+def writer(graph: KnowledgeGraph, worker: int, stop: threading.Event, counts: list) -> None:
+    rng = random.Random(worker)
+    i = 0
+    while not stop.is_set():
+        name = f"Entity {worker}-{i}"
+        graph.add_entity(KGEntity(name=name, data_properties={}, description="", types=["Thing"], relations=[]))
+        others = graph.entity_list
+        for _ in range(3):
+            tail = others[rng.randrange(len(others))].name
+            graph.add_relation(KGRelation(name=f"relation_{rng.randrange(20)}_Relation", head_entity=name, tail_entity=tail, data_properties={}, description="", source=""))
+        i += 1
+    counts[worker] = i
+
+
+def reader(graph: KnowledgeGraph, worker: int, stop: threading.Event, counts: list, errors: list) -> None:
+    snapshots = 0
+    while not stop.is_set():
+        try:
+            check_snapshot(graph.snapshot())
+        except Exception as oops:
+            errors.append(repr(oops))
+            return
+        snapshots += 1
+    counts[worker] = snapshots
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--compact-every', type=float, default=2.0, help='seconds between CSR compactions, 0 to disable')
+    args = parser.parse_args()
+
+    register_embedding('benchmark', hash_embedding, threshold=0.90)
+
+    with tempfile.TemporaryDirectory() as vdb_path:
+        graph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path=vdb_path, entity_embedding='benchmark', relation_embedding='benchmark')
+        graph.entity_vdb.vdb_file = graph.relation_vdb.vdb_file = graph.types_vdb.vdb_file = None
+        graph.add_entity(KGEntity(name="Root", data_properties={}, description="", types=["Thing"], relations=[]))
+
+        stop = threading.Event()
+        write_counts = [0] * args.writers
+        read_counts = [0] * args.readers
+        errors = []
+        threads = [threading.Thread(target=writer, args=(graph, i, stop, write_counts)) for i in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(graph, i, stop, read_counts, errors)) for i in range(args.readers)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        while time.time() - start < args.seconds and len(errors) == 0:
+            time.sleep(args.compact_every or 0.1)
+            if args.compact_every:
+                graph.compact()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        check_snapshot(graph.snapshot())
+        print(f"entities: {len(graph.entity_list)}  relations: {len(graph.relations)}  version: {graph.version}")
+        print(f"writes/s: {graph.version / elapsed:.0f}  snapshots checked/s: {sum(read_counts) / elapsed:.1f}")
+        if errors:
+            print("FAILED:", errors[0])
+            sys.exit(1)
+        print("OK")
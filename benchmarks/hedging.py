@@ -0,0 +1,114 @@
+"""
+Tail latency of gpt_chat with and without hedged requests, against a simulated endpoint: no API key is
+needed, the OpenAI client is replaced by one whose latencies are mostly short with a heavy tail (a
+fraction of the requests stall). Calls are made from a pool of threads, like the QA engine does, and the
+p50/p95/p99 latency and the extra requests sent by hedging are reported for each setting.
+
+Usage: python benchmarks/hedging.py --calls 2000 --threads 16
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.gpt as gpt
+from utils.call_policy import CallPolicy
+
+
+class SlowTailClient:
+    """
+    Stand-in for the OpenAI client: chat completions sleep for a lognormal latency, and a fraction of them
+    stall for much longer (or until their timeout)
+    """
+    def __init__(self, median: float, sigma: float, stall_rate: float, stall: float, seed: int=0):
+        self.median = median
+        self.sigma = sigma
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout: float, **kwargs):
+        with self._lock:
+            self.requests += 1
+            latency = self.median * self._random.lognormvariate(0, self.sigma)
+            if self._random.random() < self.stall_rate:
+                latency += self.stall
+        time.sleep(min(latency, timeout))
+        if latency > timeout:
+            raise TimeoutError("request timed out")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+
+def run(policy: CallPolicy, client: SlowTailClient, calls: int, threads: int, warmup: int) -> dict:
+    gpt.call_policy = policy
+    gpt._client = client
+    messages = [{"role": "user", "content": "ping"}]
+
+    def one(_) -> float:
+        start = time.perf_counter()
+        gpt.gpt_chat(messages, model="simulated")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # let the policy learn the latencies before measuring
+        list(pool.map(one, range(warmup)))
+        sent = client.requests
+        latencies = list(pool.map(one, range(calls)))
+        sent = client.requests - sent
+    stats = policy.stats()["simulated"]
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "requests_per_call": sent / calls,
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+        "timeouts": stats["timeouts"],
+        "hedging_delay_ms": stats["hedging_delay"] * 1000 if stats["hedging_delay"] is not None else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=2000, help='measured calls per setting')
+    parser.add_argument('--warmup', type=int, default=200, help='calls made before measuring')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent callers')
+    parser.add_argument('--median-ms', type=float, default=20, help='median latency of the endpoint')
+    parser.add_argument('--sigma', type=float, default=0.3, help='spread of the lognormal latency')
+    parser.add_argument('--stall-rate', type=float, default=0.03, help='fraction of requests that stall')
+    parser.add_argument('--stall-ms', type=float, default=400, help='extra latency of a stalled request')
+    parser.add_argument('--hedge-budget', type=float, default=0.1, help='maximum fraction of hedged calls')
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    settings = {
+        "no hedging": dict(hedge_quantile=None),
+        "hedge at p95": dict(hedge_quantile=95, hedge_budget=args.hedge_budget),
+        "hedge at p90": dict(hedge_quantile=90, hedge_budget=args.hedge_budget),
+    }
+    results = dict()
+    for name, options in settings.items():
+        client = SlowTailClient(args.median_ms / 1000, args.sigma, args.stall_rate, args.stall_ms / 1000)
+        # a timeout long enough for stalled requests to finish, so only hedging changes the tail
+        policy = CallPolicy(default_timeout=10, min_timeout=10, max_timeout=10, **options)
+        results[name] = run(policy, client, args.calls, args.threads, args.warmup)
+        result = results[name]
+        print(f"{name:<14} p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+              f"max {result['max_ms']:7.1f} ms  requests/call {result['requests_per_call']:.3f}  hedge wins {result['hedge_wins']}/{result['hedges']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,85 @@
+"""
+Cold start time of the entry points. Each module is imported in a fresh interpreter several times and
+the median wall time is reported, along with the modules that took the most time (python -X importtime).
+Heavy optional dependencies (openai, dotenv, networkx, pyvis, tiktoken) must not be imported until they
+are used: the run fails if one of them is loaded by a plain import, or if an import is slower than
+--max-ms.
+
+Usage: python benchmarks/import_time.py --runs 5 --max-ms 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# qa.py and qa_server.py for short QA jobs, utils.sharding for the worker processes of a sharded VDB
+MODULES = ["KnowledgeGraph", "utils.kg_store", "qa", "qa_server", "utils.sharding"]
+HEAVY = ["openai", "dotenv", "networkx", "pyvis", "tiktoken"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def probe(module: str) -> dict:
+    """
+    Import time (ms) of the module in a fresh interpreter and the heavy dependencies it loaded
+    """
+    output = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, count: int) -> list:
+    """
+    The count modules with the largest cumulative import time when importing the module
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[1:count + 1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules', default=",".join(MODULES), help='comma-separated modules to import')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--max-ms', type=float, default=None, help='fail if the median import time of a module is above')
+    parser.add_argument('--top', type=int, default=5, help='slowest imports to list per module')
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    results = dict()
+    failures = []
+    for module in args.modules.split(','):
+        # the first run warms the bytecode cache, it is not counted
+        probe(module)
+        runs = [probe(module) for _ in range(args.runs)]
+        median = statistics.median(run["ms"] for run in runs)
+        heavy = sorted({name for run in runs for name in run["heavy"]})
+        results[module] = {"import_ms": median, "heavy": heavy, "slowest": slowest_imports(module, args.top)}
+        print(f"{module:<20} {median:8.1f} ms" + (f"  loads {', '.join(heavy)}" if heavy else ""))
+        for cumulative, name in results[module]["slowest"]:
+            print(f"    {cumulative:8.1f} ms  {name}")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+        if args.max_ms is not None and median > args.max_ms:
+            failures.append(f"{module} takes {median:.0f} ms to import (max {args.max_ms:.0f})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
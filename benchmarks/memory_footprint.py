@@ -0,0 +1,127 @@
+"""
+Memory benchmark of the in-memory representation of a knowledge graph, compares the original layout
+(objects with __dict__, uuid4 string ids, relations referenced from a set, a per-entity list and an id map)
+with the current one (__slots__, interned names, integer ids, optionally a CSR edge store).
+
+Usage: python benchmarks/memory_footprint.py --edges 1000000 --entities 100000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+
+
+class LegacyRelation:
+    """
+    Copy of the original KGRelation layout
+    """
+    def __init__(self, name, head_entity, tail_entity, data_properties, description, source):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.head_entity = head_entity
+        self.tail_entity = tail_entity
+        self.data_properties = data_properties
+        self.description = description
+        self.source = source
+
+
+class LegacyEntity:
+    """
+    Copy of the original KGEntity layout
+    """
+    def __init__(self, name, data_properties, description, types, relations):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.data_properties = data_properties
+        self.description = description
+        self.types = types
+        self.relations = relations
+
+
+def synthetic_edges(num_entities: int, num_edges: int, num_relation_names: int, seed: int=0):
+    """
+    Generate (head, relation name, tail) triplets, names are created as new string objects every time,
+    the same way they come out of parsing GPT responses
+    """
+    rng = random.Random(seed)
+    for _ in range(num_edges):
+        head = rng.randrange(num_entities)
+        tail = rng.randrange(num_entities)
+        relation = rng.randrange(num_relation_names)
+        yield f"Entity {head}", f"relation_{relation}_Relation", f"Entity {tail}"
+
+
+def build_legacy(num_entities: int, num_edges: int, num_relation_names: int):
+    entities = dict()
+    entities_vdb_map = dict()
+    for i in range(num_entities):
+        entity = LegacyEntity(f"Entity {i}", {}, "", ["Thing"], [])
+        entities[entity.name] = entity
+        entities_vdb_map[entity.id] = entity
+    relations = set()
+    relations_vdb_map = dict()
+    for head, name, tail in synthetic_edges(num_entities, num_edges, num_relation_names):
+        relation = LegacyRelation(name, head, tail, {}, "", "")
+        relations.add(relation)
+        relations_vdb_map[relation.id] = relation
+        entities[head].relations.append(relation)
+    return entities, entities_vdb_map, relations, relations_vdb_map
+
+
+def build_current(num_entities: int, num_edges: int, num_relation_names: int, vdb_path: str, compact: bool):
+    knowledge_graph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path=vdb_path)
+    for i in range(num_entities):
+        knowledge_graph._register_entity(KGEntity(f"Entity {i}", {}, "", ["Thing"], []))
+    if compact:
+        knowledge_graph.compact()
+    for head, name, tail in synthetic_edges(num_entities, num_edges, num_relation_names):
+        knowledge_graph._register_relation(KGRelation(name, head, tail, {}, "", ""))
+    if compact:
+        knowledge_graph.compact()
+    return knowledge_graph
+
+
+def measure(build, *args) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edges', type=int, default=1_000_000)
+    parser.add_argument('--entities', type=int, default=100_000)
+    parser.add_argument('--relation-names', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as vdb_path:
+        runs = [
+            ("legacy (dict, uuid4, relation set)", build_legacy, ()),
+            ("slots + interned names + int ids", build_current, (vdb_path, False)),
+            ("slots + CSR edge store", build_current, (vdb_path, True)),
+        ]
+        baseline = None
+        for label, build, extra in runs:
+            result, current, peak = measure(build, args.entities, args.edges, args.relation_names, *extra)
+            baseline = baseline or current
+            print(f"{label:40s} current: {current / 2**20:9.1f} MiB  peak: {peak / 2**20:9.1f} MiB  ({current / baseline:.2f}x)")
+
+            # lookups by name and by id keep working
+            if isinstance(result, KnowledgeGraph):
+                entity = result.entities["Entity 0"]
+                assert result.get_entity(entity.id) is entity
+                for relation in result.out_relations(entity):
+                    assert result.get_relation(relation.id) is relation
+            del result
@@ -0,0 +1,76 @@
+"""
+Scaling of sharded VDB scoring with the number of worker processes. A random float32 matrix is scored
+by query_index, query_best and query_range, first in the parent process, then with the rows split over
+1..N worker processes (VDB.enable_sharding), checking that the results are the same. Reports latency of
+single queries and throughput of query_best_batch.
+
+Usage: python benchmarks/sharded_scaling.py --rows 5000000 --dim 64 --processes 1,2,4,8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vdb import VDB
+
+
+def measure(vdb: VDB, queries: list, batch: int, threshold: float) -> dict:
+    """
+    Mean latencies (ms) of the single-query calls and throughput of batched calls
+    """
+    vdb.query_index(queries[0], 10)
+    results = dict()
+    for name, call in (("query_index_ms", lambda q: vdb.query_index(q, 10)), ("query_best_ms", lambda q: vdb.query_best(q, threshold)), ("query_range_ms", lambda q: vdb.query_range(q, threshold))):
+        start = time.perf_counter()
+        for query in queries:
+            call(query)
+        results[name] = (time.perf_counter() - start) * 1000 / len(queries)
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        vdb.query_best_batch(queries[i:i + batch], threshold)
+    results["batch_queries_per_s"] = len(queries) / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--processes', default=','.join(str(p) for p in (1, 2, 4, 8) if p <= (os.cpu_count() or 1)) or '1', help='comma-separated numbers of worker processes')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=16, help='queries per query_best_batch call')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.rows, args.dim), dtype=np.float32)
+    ids = [str(i) for i in range(args.rows)]
+    # half of the queries have a close row, so that threshold queries have results
+    queries = [vectors[rng.integers(args.rows)] + 0.3 * rng.standard_normal(args.dim) if i % 2 == 0 else rng.standard_normal(args.dim) for i in range(args.queries)]
+
+    baseline = VDB.from_arrays(ids, vectors, embedding='hashing')
+    expected = [[match['id'] for match in baseline.query_index(query, 10)] for query in queries]
+    results = {"meta": {"rows": args.rows, "dim": args.dim, "cpu_count": os.cpu_count()}, "runs": [dict(processes=0, **measure(baseline, queries, args.batch, args.threshold))]}
+
+    for processes in [int(p) for p in args.processes.split(',')]:
+        vdb = VDB.from_arrays(ids, vectors, embedding='hashing')
+        vdb.enable_sharding(processes=processes, min_rows=0)
+        start = time.perf_counter()
+        vdb.query_index(queries[0], 10)
+        startup = time.perf_counter() - start
+        assert [[match['id'] for match in vdb.query_index(query, 10)] for query in queries] == expected
+        results["runs"].append(dict(processes=processes, startup_s=startup, **measure(vdb, queries, args.batch, args.threshold)))
+        vdb.sharded.close()
+
+    print(f"{'processes':>9} {'index ms':>9} {'best ms':>9} {'range ms':>9} {'batch q/s':>10}")
+    for run in results["runs"]:
+        print(f"{run['processes'] or 'parent':>9} {run['query_index_ms']:9.2f} {run['query_best_ms']:9.2f} {run['query_range_ms']:9.2f} {run['batch_queries_per_s']:10.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,344 @@
+"""
+Offline benchmark suite of ingestion and QA on synthetic graphs. The LLM is a stub that answers from the
+prompt, embeddings are deterministic hashes, nothing goes over the network. Each size runs in its own
+process so that its peak memory can be measured.
+
+Measured for each size: split_text throughput, predicate_extract overhead (time, LLM calls and prompt
+tokens without LLM latency), add_entity/add_relation throughput, VDB query latency, find_path,
+find_matching_entities, find_entity on name variants, conjunctive queries, graph analytics (components
+and PageRank), relation_completion, pickle and bundle save/load time, JSON lines export/import and diff,
+and peak memory. Names are embedded by random vectors seeded by their hash (--embedding benchmark), or by
+the local hashing provider (--embedding hashing).
+
+Usage:
+    python benchmarks/suite.py --sizes 1000,10000,100000 --output results.json
+    python benchmarks/suite.py --sizes 1000000 --dim 32 --output results_1m.json
+    python benchmarks/suite.py --compare baseline.json results.json --tolerance 0.2
+
+Metric names ending in _per_s are better when higher, all the others (times, sizes, call counts) are
+better when lower. --compare exits with status 1 if a metric regressed by more than the tolerance.
+"""
+import argparse
+import ast
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DIMENSION = 64
+
+
+def hash_embedding(content: str, engine: str='') -> list:
+    """
+    Deterministic stand-in for the remote embedding
+    """
+    seed = int.from_bytes(hashlib.sha256(content.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).standard_normal(DIMENSION).tolist()
+
+
+class StubLLM:
+    """
+    Stand-in for gpt_chat that answers every prompt of the pipeline from the prompt itself, and counts
+    the calls and their input tokens
+    """
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, model=None, **kwargs) -> str:
+        from utils.prompt import count_tokens
+        tokens = sum(count_tokens(message["content"]) for message in messages)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += tokens
+        system, prompt = messages[0]["content"], messages[-1]["content"]
+        if prompt.startswith("Target Entity: "):
+            # triplet extraction: relate the target to every candidate
+            target = prompt[len("Target Entity: "):prompt.index("\n")]
+            candidates = ast.literal_eval(prompt[prompt.index("Entities: ") + len("Entities: "):prompt.index("\nText: ")])
+            return str([[target, "related to", candidate] for candidate in candidates])
+        if "'description': 'brief description', 'source'" in system:
+            return "{'description': 'related', 'source': 'synthetic text'}"
+        if "attributes" in system:
+            return "{}"
+        if "inverse relation" in system:
+            return "inverse_related_to_Relation"
+        if "True or False" in system:
+            return "True"
+        if system.startswith("Given the numbered sentences"):
+            return '{"2:it": "Entity 0", "E1": "Entity 1"}'
+        return ""
+
+
+def synthetic_document(num_sentences: int, num_entities: int, seed: int=0) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(num_sentences):
+        lines.append(f"Entity {rng.randrange(num_entities)} is related to Entity {rng.randrange(num_entities)} since {1900 + i % 100}.")
+        if i % 5 == 4:
+            lines.append("\n")
+    return " ".join(lines)
+
+
+def timed(function, *args, **kwargs) -> tuple:
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def latencies_ms(function, inputs) -> list:
+    result = []
+    for item in inputs:
+        start = time.perf_counter()
+        function(item)
+        result.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def run_size(size: int, degree: int, completion_max: int, embedding: str, seed: int=0) -> dict:
+    """
+    Run every benchmark on a graph of size entities and size * degree relations
+    """
+    import KnowledgeGraph as kg_module
+    import utils.kg_gen as kg_gen
+    from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+    from utils.kg_store import save_bundle, load_bundle
+    from utils.embedding import register_embedding, get_embedding
+
+    llm = StubLLM()
+    register_embedding('benchmark', hash_embedding, threshold=0.90)
+    embed = get_embedding(embedding).embed
+    kg_module.gpt_chat = kg_gen.gpt_chat = llm
+    rng = random.Random(seed)
+    results = dict()
+
+    # split_text
+    document = synthetic_document(min(size, 200_000), size, seed)
+    chunks, elapsed = timed(kg_gen.split_text, document)
+    results["split_text_mb_per_s"] = len(document) / 2**20 / elapsed
+
+    # predicate_extract with an instant LLM: what is left is the overhead of the pipeline itself
+    names = [f"Entity {i}" for i in range(20)]
+    text = " ".join(f"{rng.choice(names)} is related to {rng.choice(names)}." for _ in range(200))
+    entities = [KGEntity(name=name, data_properties={}, description="", types=["Thing"], relations=[]) for name in names]
+    llm.calls = llm.prompt_tokens = 0
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        _, elapsed = timed(kg_gen.predicate_extract, text=text, entities=entities)
+    results["predicate_extract_s"] = elapsed
+    results["predicate_extract_llm_calls"] = llm.calls
+    results["predicate_extract_prompt_tokens"] = llm.prompt_tokens
+
+    # entity_disambiguation: a mention -> name map from the LLM and resolver aliases, replaced locally
+    disambiguation_text = " ".join(f"{rng.choice(names)} met E{rng.randrange(20)}, it was {rng.choice(['Ent 3', 'Entity 3'])}." for _ in range(200))
+    aliases = {f"Ent {i}": f"Entity {i}" for i in range(20)}
+    llm.calls = 0
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        results["disambiguation_ms"] = float(np.mean(latencies_ms(lambda _: kg_gen.entity_disambiguation(disambiguation_text, entities=entities, aliases=aliases), range(20))))
+    results["disambiguation_llm_calls"] = llm.calls / 20
+
+    # ingestion through the public API, vector databases in memory
+    graph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path=None, entity_embedding=embedding, relation_embedding=embedding)
+    start = time.perf_counter()
+    for i in range(size):
+        graph.add_entity(KGEntity(name=f"Entity {i}", data_properties={"index": str(i)}, description="", types=["Thing"], relations=[]))
+    results["add_entity_per_s"] = size / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(size * degree):
+        graph.add_relation(KGRelation(name=f"relation_{rng.randrange(50)}_Relation", head_entity=f"Entity {rng.randrange(size)}", tail_entity=f"Entity {rng.randrange(size)}", data_properties={}, description="", source=""))
+    results["add_relation_per_s"] = size * degree / (time.perf_counter() - start)
+
+    # vector database queries, half of them close to an existing vector
+    queries = []
+    for i in range(200):
+        if i % 2 == 0:
+            vector = np.asarray(embed(f"Entity {rng.randrange(size)}"))
+            vector = vector + 0.1 * np.linalg.norm(vector) / np.sqrt(len(vector)) * np.random.default_rng(i).standard_normal(len(vector))
+        else:
+            vector = np.asarray(embed(f"Other {rng.randrange(size)}"))
+        queries.append(vector)
+    threshold = graph.entity_vdb.threshold
+    graph.entity_vdb.query_best(queries[0], threshold)
+    index_latencies = latencies_ms(lambda vector: graph.entity_vdb.query_index(vector, 15), queries)
+    results["vdb_query_index_ms"] = float(np.mean(index_latencies))
+    results["vdb_query_index_p95_ms"] = float(np.percentile(index_latencies, 95))
+    results["vdb_query_best_ms"] = float(np.mean(latencies_ms(lambda vector: graph.entity_vdb.query_best(vector, threshold), queries)))
+    results["vdb_query_range_ms"] = float(np.mean(latencies_ms(lambda vector: graph.entity_vdb.query_range(vector, threshold), queries)))
+
+    # analytics: edge arrays, components and PageRank of the whole graph
+    def compute_analytics():
+        analytics = graph.analytics()
+        return analytics.num_components, analytics.pagerank
+    (results["num_components"], _), results["analytics_s"] = timed(compute_analytics)
+
+    # traversals
+    pairs = [(graph.entity_list[rng.randrange(size)], graph.entity_list[rng.randrange(size)]) for _ in range(20)]
+    results["find_path_ms"] = float(np.mean(latencies_ms(lambda pair: graph.find_path(*pair), pairs)))
+
+    subgraph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path=None, entity_embedding=embedding, relation_embedding=embedding)
+    # distinct starts, a second relation with the same triplet would be merged into the first one
+    starts = [graph.entity_list[i] for i in rng.sample(range(size), 20)]
+    paths = []
+    for start_entity in starts:
+        relations = graph.out_relations(start_entity)
+        name = relations[0].name if len(relations) != 0 else "relation_0_Relation"
+        subgraph.add_entity(KGEntity(name=start_entity.name, data_properties={}, description="", types=[], relations=[]))
+        subgraph.add_entity(KGEntity(name="[ENTITY]", data_properties={}, description="", types=[], relations=[]))
+        relation = KGRelation(name=name, head_entity=start_entity.name, tail_entity="[ENTITY]", data_properties={}, description="", source="")
+        subgraph.add_relation(relation)
+        paths.append([relation])
+    results["find_matching_entities_ms"] = float(np.mean(latencies_ms(lambda path: graph.find_matching_entities(path=path, subgraph=subgraph, question="Which entity?"), paths)))
+
+    # lookups of names written differently than in the graph, the name index answers most of them
+    variants = [f"{'entity' if i % 2 == 0 else 'ENTITY'}_{rng.randrange(size)}" for i in range(200)]
+    before = graph.entity_names.stats()["avoided_embeddings"]
+    results["find_entity_variant_ms"] = float(np.mean(latencies_ms(graph.find_entity, variants)))
+    results["find_entity_variant_embeddings"] = len(variants) - (graph.entity_names.stats()["avoided_embeddings"] - before)
+
+    # conjunctive queries: the entities two hops before a given one through given relation names
+    queries = [[("?x", f"relation_{rng.randrange(50)}", "?y"), ("?y", f"relation_{rng.randrange(50)}", graph.entity_list[rng.randrange(size)].name)] for _ in range(20)]
+    results["query_two_hops_ms"] = float(np.mean(latencies_ms(graph.query, queries)))
+
+    # persistence
+    with tempfile.TemporaryDirectory() as directory:
+        data, elapsed = timed(pickle.dumps, graph, protocol=pickle.HIGHEST_PROTOCOL)
+        results["pickle_dump_s"] = elapsed
+        results["pickle_mb"] = len(data) / 2**20
+        _, results["pickle_load_s"] = timed(pickle.loads, data)
+        del data
+        path = os.path.join(directory, "graph.ukg")
+        _, results["bundle_save_s"] = timed(save_bundle, graph, path)
+        _, results["bundle_load_s"] = timed(load_bundle, path)
+        path = os.path.join(directory, "graph.jsonl")
+        version, results["export_jsonl_s"] = timed(graph.export_jsonl, path)
+        results["jsonl_mb"] = os.path.getsize(path) / 2**20
+        copy = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path=None, entity_embedding=embedding, relation_embedding=embedding)
+        _, results["import_jsonl_s"] = timed(copy.import_jsonl, path)
+        del copy
+        # incremental export of a few writes
+        for i in range(100):
+            graph.add_relation(KGRelation(name="diff_Relation", head_entity=f"Entity {rng.randrange(size)}", tail_entity=f"Entity {rng.randrange(size)}", data_properties={}, description="", source=""))
+        _, results["export_diff_s"] = timed(graph.export_jsonl, path, since_version=version)
+
+    if size <= completion_max:
+        llm.calls = 0
+        _, results["relation_completion_s"] = timed(graph.relation_completion)
+        results["relation_completion_llm_calls"] = llm.calls
+
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def run_worker(args) -> None:
+    global DIMENSION
+    DIMENSION = args.dim
+    # the traversals are recursive
+    sys.setrecursionlimit(10**7)
+    threading.stack_size(1 << 30)
+    outcome = dict()
+
+    def target():
+        try:
+            outcome["results"] = run_size(args.worker, args.degree, args.completion_max, args.embedding)
+        except BaseException as oops:
+            outcome["error"] = repr(oops)
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    with open(args.output, "w") as f:
+        json.dump(outcome, f)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(baseline_path: str, current_path: str, tolerance: float) -> int:
+    """
+    Print the relative change of every metric between two result files, returns the number of regressions
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    with open(current_path) as f:
+        current = json.load(f)["results"]
+    regressions = 0
+    for size in sorted(set(baseline) & set(current), key=int):
+        print(f"size {size}")
+        for metric in sorted(set(baseline[size]) & set(current[size])):
+            old, new = baseline[size][metric], current[size][metric]
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if metric.endswith("_per_s") else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif worse < -tolerance:
+                flag = "  improved"
+            print(f"  {metric:32s} {old:14.4f} -> {new:14.4f}  {change:+8.1%}{flag}")
+    print(f"{regressions} regression(s) above {tolerance:.0%}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated numbers of entities')
+    parser.add_argument('--degree', type=int, default=3, help='relations per entity')
+    parser.add_argument('--dim', type=int, default=DIMENSION, help='embedding dimension')
+    parser.add_argument('--embedding', default='benchmark', help='benchmark (hash-seeded random vectors) or hashing (local n-gram provider)')
+    parser.add_argument('--completion-max', type=int, default=100_000, help='largest size relation_completion runs on')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change flagged as a regression')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.tolerance) else 0)
+    if args.worker is not None:
+        run_worker(args)
+        sys.exit(0)
+
+    report = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(), "degree": args.degree, "dim": args.dim, "embedding": args.embedding, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": dict(),
+    }
+    for size in [int(size) for size in args.sizes.split(',')]:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            worker_output = f.name
+        command = [sys.executable, os.path.abspath(__file__), "--worker", str(size), "--degree", str(args.degree), "--dim", str(args.dim), "--embedding", args.embedding, "--completion-max", str(args.completion_max), "--output", worker_output]
+        start = time.time()
+        subprocess.run(command, check=True)
+        with open(worker_output) as f:
+            outcome = json.load(f)
+        os.remove(worker_output)
+        if "error" in outcome:
+            print(f"size {size}: FAILED {outcome['error']}")
+            report["results"][str(size)] = {"error": outcome["error"]}
+            continue
+        report["results"][str(size)] = outcome["results"]
+        print(f"size {size} ({time.time() - start:.0f} s)")
+        for metric, value in outcome["results"].items():
+            print(f"  {metric:32s} {value:14.4f}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
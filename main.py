@@ -1,6 +1,7 @@
-import pickle
 import time
 from utils.kg_gen import *
+from utils.kg_store import save_bundle
+from utils.entity_resolution import EntityResolver
 from KnowledgeGraph import *
 
 # change this to the source text you want to test upon
@@ -12,8 +13,12 @@ if __name__ == '__main__':
         text = f.read()
     text_chunks = split_text(text, 6000, 1500, '.')
 
-    knowledge_graph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path='./vdb')
+    # entities whose names embed within the embedding's match threshold (0.90 for openai) of an existing
+    # entity are merged into it
+    knowledge_graph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path='./vdb', resolver=EntityResolver())
 
+    # triplets extracted so far, the chunks overlap so the same triplet comes up in several of them
+    seen_triplets = dict()
     iter = 0
     for text_chunk in text_chunks:
         print('iteration: ', iter)
@@ -21,18 +26,20 @@ if __name__ == '__main__':
         for entity in entities:
             knowledge_graph.add_entity(entity)
         
-        text_chunk = entity_disambiguation(text_chunk)
+        # the model only gives the mention -> name map, other names of the entities come from the resolver
+        text_chunk = entity_disambiguation(text_chunk, entities=entities, aliases=knowledge_graph.resolver.aliases)
         
-        relations = predicate_extract(text=text_chunk, entities=entities)
+        relations = predicate_extract(text=text_chunk, entities=entities, seen=seen_triplets)
         for relation in relations:
             knowledge_graph.add_relation(relation)
 
         iter += 1
     
     knowledge_graph.relation_completion()
-    print(knowledge_graph)
-    with open('./kg_save/knowledge_graph.pkl', 'wb') as file:
-        pickle.dump(knowledge_graph, file)
+    print(f"Knowledge Graph: {len(knowledge_graph.entity_list)} entities, {len(knowledge_graph.relations)} relations, {len(knowledge_graph.types)} types")
+    save_bundle(knowledge_graph, './kg_save/knowledge_graph.ukg')
+    # streamed copy for other hosts, later runs can ship only knowledge_graph.diff(version)
+    knowledge_graph.export_jsonl('./kg_save/knowledge_graph.jsonl.gz')
 
     knowledge_graph.visualize()
     end_time = time.time()
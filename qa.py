@@ -1,161 +1,305 @@
-import pickle
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from utils.kg_gen import *
 from KnowledgeGraph import *
-from utils.gpt import gpt_chat
+from utils.gpt import call_deadline, gpt_chat
+from utils.kg_store import load_knowledge_graph
+from utils.cache import LRUCache, normalize_question
+from utils.property_index import normalize_key
+from utils.prompt import PromptBuilder, render_entity, render_relation
 
 question = "Who is the Chancellor of UIUC from 2015-2016?"
-kg_path = './kg_save/knowledge_graph.pkl'
+# a bundle directory, or a .pkl file written by older versions
+kg_path = './kg_save/knowledge_graph.ukg'
+# sub-questions answered at the same time, and seconds allowed for each of them
+max_workers = 4
+sub_question_timeout = 300
+# answers, and the entities and paths found while answering, are cached for the graph version they were
+# computed at; any write to the graph changes its stamp so stale entries are never hit and age out
+answer_cache = LRUCache(maxsize=1024, ttl=3600)
+intermediate_cache = LRUCache(maxsize=8192, ttl=3600)
+_MISSING = object()
+# start of the note given instead of the answer of a sub-question that failed or timed out
+FAILED_ANSWER = "No answer"
+# tokens of the prompts phrasing an answer from what was found in the graph, and of the prompt combining
+# the answers of the sub-questions; the entities, relations and answers that don't fit are left out
+answer_token_budget = 2000
+final_token_budget = 3000
+
+
+def resolve_entity(knowledge_graph: KnowledgeGraph, name: str, types: Optional[List[str]]=None) -> Optional[KGEntity]:
+    """
+    find_entity, cached for the version of the graph
+    """
+    key = (knowledge_graph.stamp(), "entity", name, tuple(types or ()))
+    entity_id = intermediate_cache.get(key, _MISSING)
+    if entity_id is _MISSING:
+        entity = knowledge_graph.find_entity(name, types)
+        intermediate_cache.put(key, entity.id if entity is not None else None)
+        return entity
+    return knowledge_graph.get_entity(entity_id) if entity_id is not None else None
+
+
+def cached_path(knowledge_graph: KnowledgeGraph, start: KGEntity, end: KGEntity) -> Optional[list[KGRelation]]:
+    """
+    find_path, cached for the version of the graph, None if there is no path
+    """
+    key = (knowledge_graph.stamp(), "path", start.id, end.id)
+    relation_ids = intermediate_cache.get(key, _MISSING)
+    if relation_ids is _MISSING:
+        path = knowledge_graph.find_path(start, end)
+        intermediate_cache.put(key, [relation.id for relation in path] if path is not None else None)
+        return path
+    return [knowledge_graph.get_relation(id) for id in relation_ids] if relation_ids is not None else None
+
+
+def cached_matching_entities(knowledge_graph: KnowledgeGraph, path: list[KGRelation], subgraph: KnowledgeGraph, question: str) -> set[KGEntity]:
+    """
+    find_matching_entities, cached for the version of the graph, the question and the triplets of the path
+    """
+    key = (knowledge_graph.stamp(), "matching", normalize_question(question), tuple((relation.head_entity, relation.name, relation.tail_entity) for relation in path))
+    entity_ids = intermediate_cache.get(key)
+    if entity_ids is None:
+        entities = knowledge_graph.find_matching_entities(path=path, subgraph=subgraph, question=question)
+        intermediate_cache.put(key, [entity.id for entity in entities])
+        return entities
+    return {knowledge_graph.get_entity(id) for id in entity_ids}
+
+
+def cached_query(knowledge_graph: KnowledgeGraph, patterns: list, answer: str, kind: type=KGEntity) -> set:
+    """
+    Entities (or relations, if kind is KGRelation) bound to the answer variable by KnowledgeGraph.query,
+    cached for the version of the graph and the patterns
+    """
+    key = (knowledge_graph.stamp(), "query", repr(patterns), answer, kind.__name__)
+    ids = intermediate_cache.get(key)
+    if ids is None:
+        results = {binding[answer] for binding in knowledge_graph.query(patterns) if isinstance(binding.get(answer), kind)}
+        intermediate_cache.put(key, [result.id for result in results])
+        return results
+    get = knowledge_graph.get_entity if kind is KGEntity else knowledge_graph.get_relation
+    return {get(id) for id in ids}
+
+
+def asked_properties(data_properties: Dict[str, str], attribute: Optional[str]) -> Dict[str, str]:
+    """
+    The property the question asks for if the entity or relation has it, all of them otherwise
+    """
+    if attribute:
+        for key, value in data_properties.items():
+            if normalize_key(key) == normalize_key(attribute):
+                return {key: value}
+    return data_properties
+
+
+def answer_messages(question: str, found, model: str="gpt-3.5-turbo-1106") -> list[dict]:
+    """
+    Messages asking to phrase the answer to a question from what was found in the graph, under
+    answer_token_budget
+
+    Parameters:
+    question (str): the question
+    found (str or list[str]): the answer in the graph, or its items (rendered entities, relations...)
+    model (str): model the messages are sent to
+
+    Returns:
+    list[dict]: the messages
+    """
+    builder = PromptBuilder(answer_token_budget, model)
+    builder.add(f"Question: {question}\n", required=True)
+    if isinstance(found, str):
+        builder.add("Answer in knowledge graph: ", required=True)
+        builder.add(found)
+        builder.add("\n", required=True)
+    else:
+        builder.add_items(found, separator="; ", prefix="Answer in knowledge graph: [", suffix="]\n")
+    return [{"role": "system", "content": "You will get a question about an entity and the answer in knowledge graph, based on that, phrase a final answer to the question"}, {"role": "user", "content": builder.build()}]
+
+
+def extract_relation(question: str, route: dict, knowledge_graph: KnowledgeGraph) -> KGRelation:
+    """
+    The relation between the two entities of a question, extracted as a triplet by GPT and looked up
+    with find_relation
+    """
+    entities = routed_entities(route)
+
+    if len(entities) != 2:
+        raise Exception("there are more than 2 entities in the question")
+    
+    messages = [{"role": "system", "content": "You are an expert in linguistics and knowledge graph. You are given two entities, and a text chunk. You help extract relations between the two entities. Do not add any external information outside of the text to the relations. Your output should be a triplet in this list format: ['Head_entity', 'relation', 'Tail_entity']"}, {"role": "user", "content": f"Entity 1: {entities[0].name}\nEntity 2: {entities[1].name}\nText: {question}"}]
+    triplet_res = gpt_chat(messages, model="gpt-4-1106-preview")
+    print(triplet_res)
+    triplet: List = ast.literal_eval(triplet_res)
+
+    triplet[1] = f'{triplet[1].replace(" ", "_")}_Relation'
+
+    relation = knowledge_graph.find_relation(triplet[0], triplet[2], triplet[1])
+    if relation == None:
+        raise Exception("relation in the question doesn't exist in the knowledge graph")
+    return relation
+
+
+def path_matching_entities(question: str, route: dict, knowledge_graph: KnowledgeGraph) -> set[KGEntity]:
+    """
+    Entities a question asks for, found by building the subgraph of its statement and following the
+    path from each mentioned entity to [ENTITY] in the graph, with GPT validating the last hop
+
+    Parameters:
+    question (str): the question
+    route (dict): result of route_question
+    knowledge_graph (KnowledgeGraph): the graph
+
+    Returns:
+    set[KGEntity]: the entities found
+    """
+    text = route["statement"]
+    if not text or "[ENTITY]" not in text.upper():
+        raise Exception("the question couldn't be converted to a statement about an unknown entity")
+    text = re.sub(r"\[entity\]", "[ENTITY]", text, flags=re.IGNORECASE)
+    print(text)
+
+    # the subgraph of the question lives in memory only, nothing is written to disk
+    # and embeds names the same way as the graph, so that their vectors can be compared
+    subgraph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path=None, entity_embedding=knowledge_graph.entity_vdb.embedding, relation_embedding=knowledge_graph.relation_vdb.embedding)
+
+    # the entities of the statement are the ones mentioned in the question, plus the unknown one
+    entities = routed_entities(route) + [KGEntity(name="[ENTITY]", data_properties={}, description="an unknown entity", types=[], relations=[])]
+    for entity in entities:
+        subgraph.add_entity(entity)
+    
+    relations = predicate_extract(text=text, entities=entities, entity_question=True)
+    for relation in relations:
+        subgraph.add_relation(relation)
+    
+    print(subgraph)
+    
+    final_entities = None
+
+    for entity_name, entity in subgraph.entities.items():
+        if entity_name == "[ENTITY]":
+            continue
+        path = subgraph.find_path(entity, subgraph.entities["[ENTITY]"])
+
+        result_entities = cached_matching_entities(knowledge_graph, path, subgraph, question)
+        print(result_entities)
+        if len(result_entities) != 0:
+            if final_entities == None:
+                 final_entities = result_entities
+            else:
+                final_entities = final_entities & result_entities
+        else:
+            final_entities = set()
+    return final_entities if final_entities is not None else set()
 
 
 def kg_qa (question: str, knowledge_graph:KnowledgeGraph):
-    messages = [{"role": "system", "content": "You are an expert in linguistics and knowledge graph. You will be given a question, output whether the answer to this question would be an distinct entity, relationship between two entities, or attributes of an entity/relationship."}, {"role": "user", "content": f"Question: {question}"}]
-    question_type_res = gpt_chat(messages, model="gpt-4-1106-preview")
+    # answer against one consistent version of the graph, even if it is being written to meanwhile
+    knowledge_graph = knowledge_graph.snapshot()
 
-    print(question_type_res)
+    key = (knowledge_graph.stamp(), normalize_question(question))
+    answer = answer_cache.get(key)
+    if answer is None:
+        answer = _kg_qa(question, knowledge_graph)
+        answer_cache.put(key, answer)
+    return answer
 
-    ## Question about properties/attributes
-    if ("attribut" in question_type_res) or ("Attribut" in question_type_res):
 
-        # First check whether it is about attribute of an entity or a relation
-        messages = [{"role": "system", "content": " You are an expert in linguistics and knowledge graph. You will be given a question, output whether the answer to this question would be attributes of an entity, or attributes a relation between two entities."}, {"role": "user", "content": question}]
-        entity_or_relation_res = gpt_chat(messages, model="gpt-4-1106-preview")
-        print(entity_or_relation_res)
+def _kg_qa (question: str, knowledge_graph:KnowledgeGraph):
+
+    # one structured call gives the question type, sub-type, whether a number is asked, the statement
+    # form of the question and the entities it mentions
+    route = route_question(question)
+    question_type = route["type"]
+    print(route)
+
+    ## Question about properties/attributes
+    if question_type == "attribute":
 
-        if "relation" in entity_or_relation_res:
-            entity_list = entity_extract(question)
+        # attribute of an entity or of a relation
+        if route["sub_type"] != "relation":
+            entity_list = routed_entities(route)
 
             if len(entity_list) != 1:
                 raise Exception("there are more than 1 entity in the question")
             
-            target_entity = knowledge_graph.find_entity(entity_list[0].name)
+            target_entity = resolve_entity(knowledge_graph, entity_list[0].name, entity_list[0].types)
             if target_entity == None:
                 raise Exception("entity in the question doesn't exist in the knowledge graph")
             
-            data_properties = target_entity.data_properties
+            data_properties = asked_properties(target_entity.data_properties, route["attribute"])
             print(data_properties)
 
-            messages = [{"role": "system", "content": "You will get a question about an entity and the answer in knowledge graph, based on that, phrase a final answer to the question"}, {"role": "user", "content": f"Question: {question}\nAnswer in knowledge graph: {str(data_properties)}\n"}]
+            messages = answer_messages(question, str(data_properties))
             
             final_answer = gpt_chat(messages)
             return final_answer
         
         else:
-            entities = entity_extract(question)
-
-            if len(entities) != 2:
-                raise Exception("there are more than 2 entities in the question")
-            
-            messages = [{"role": "system", "content": "You are an expert in linguistics and knowledge graph. You are given two entities, and a text chunk. You help extract relations between the two entities. Do not add any external information outside of the text to the relations. Your output should be a triplet in this list format: ['Head_entity', 'relation', 'Tail_entity']"}, {"role": "user", "content": f"Entity 1: {entities[0].name}\nEntity 2: {entities[1].name}\nText: {question}"}]
-            triplet_res = gpt_chat(messages, model="gpt-4-1106-preview")
-            print(triplet_res)
-            triplet: List = ast.literal_eval(triplet_res)
-
-            triplet[1] = f'{triplet[1].replace(" ", "_")}_Relation'
-
-            relation = knowledge_graph.find_relation(triplet[0], triplet[2], triplet[1])
-            if relation == None:
-                raise Exception("relation in the question doesn't exist in the knowledge graph")
+            relations = set()
+            if route["patterns"] and route["answer"]:
+                # the relation compiled into triple patterns (with its attribute and time filters) is found locally
+                relations = cached_query(knowledge_graph, route["patterns"], route["answer"], KGRelation)
+                print("Query: ", route["patterns"], len(relations))
+            if len(relations) == 0:
+                relations = {extract_relation(question, route, knowledge_graph)}
             
-            data_properties = relation.data_properties
+            data_properties = [asked_properties(relation.data_properties, route["attribute"]) for relation in sorted(relations, key=lambda relation: relation.id)]
+            if len(data_properties) == 1:
+                data_properties = data_properties[0]
 
             print(data_properties)
 
-            messages = [{"role": "system", "content": "You will get a question about an entity and the answer in knowledge graph, based on that, phrase a final answer to the question"}, {"role": "user", "content": f"Question: {question}\nAnswer in knowledge graph: {str(data_properties)}\n"}]
+            messages = answer_messages(question, str(data_properties))
             
             final_answer = gpt_chat(messages)
             return final_answer
 
-    elif ("relation" in question_type_res) or ("Relation" in question_type_res):
+    elif question_type == "relation":
         ## Question about relation
-        entities = entity_extract(question)
+        entities = routed_entities(route)
 
         if len(entities) != 2:
             raise Exception("there are more than 2 entities in the question")
         
-        start_entity = knowledge_graph.find_entity(entities[0].name)
-        end_entity = knowledge_graph.find_entity(entities[1].name)
+        start_entity = resolve_entity(knowledge_graph, entities[0].name, entities[0].types)
+        end_entity = resolve_entity(knowledge_graph, entities[1].name, entities[1].types)
 
         if start_entity == None or end_entity == None:
             raise Exception("One of the entities in the question doesn't exist in knowledge graph.")
         
-        path = knowledge_graph.find_path(start_entity, end_entity)
+        path = cached_path(knowledge_graph, start_entity, end_entity)
+        if path is None:
+            raise Exception("There is no path between the entities of the question in the knowledge graph.")
 
-        path_str = "["
-        for relation in path:
-            path_str += str(relation)
-        path_str += "]"
+        # the relations of the path, without ids and source excerpts, as many as fit the budget
+        path_items = [render_relation(relation) for relation in path]
+        print(path_items)
 
-        print(path_str)
-
-        messages = [{"role": "system", "content": "You will get a question about an entity and the answer in knowledge graph, based on that, phrase a final answer to the question"}, {"role": "user", "content": f"Question: {question}\nAnswer in knowledge graph: {path_str}\n"}]
+        messages = answer_messages(question, path_items)
         
         final_answer = gpt_chat(messages)
         return final_answer
 
-    elif ("entit" in question_type_res) or ("Entit" in question_type_res):
+    elif question_type == "entity":
         ## Question about entity
 
-        question_modified = None
-        is_number_question = False
-
-        messages = [{"role": "system", "content": "You are an expert in linguistics and knowledge graph. You will be given a question, output whether this question is about an entity/entities, or number of entity/entities"}, {"role": "user", "content": question}]
-        entity_or_number_res = gpt_chat(messages, model="gpt-4-1106-preview")
+        is_number_question = route["is_number"]
 
-        if 'number' in entity_or_number_res:
-            is_number_question = True
-            messages = [{"role": "system", "content": "You will be given a question of finding the number of something, convert this question to \"Who\" or \"What\" type of question.\n\nExample:\n\"How many presidents were there between 2010-2020?\" Should be converted to \"Who are presidents between 2010-2020?\""}, {"role": "user", "content": question}]
-            question_modified = gpt_chat(messages, model="gpt-4-1106-preview")
-            
-        messages = [{"role": "system", "content": "If the question is about multiple entities, convert it to a question about single entity, else output the same question. don't change content of question.\n\nExample: \n\"Where are all the restaurants in this town?\" should be converted to \"Where is the restaurant in this town?\"\n\n\"Who is the CEO of Meta\" should be the same."}, {"role": "user", "content": question}]
-        question_modified = gpt_chat(messages, model="gpt-4-1106-preview")
-        print(question_modified)
-
-        messages = [{"role": "system", "content": "You will be given a question related to an entity, convert the question into a statement and replace the entity asked with [ENTITY]\n\nFor example: question \"Who is the Chancellor of UIUC at 2015-2016?\" should be convert to \"[Entity] is the Chancellor of UIUC at 2015-2016.\""}, {"role": "user", "content": question_modified}]
-        text = gpt_chat(messages, model="gpt-4-1106-preview")
-        print(text)
-
-        # # Read subgraph from the pkl file
-        # with open('./kg_save/subgraph.pkl', 'rb') as file:
-        #    subgraph: KnowledgeGraph = pickle.load(file)
-        subgraph = KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path='./subgraph_vdb')
-
-        entities = entity_extract(text, entity_question=True)
-        for entity in entities:
-            subgraph.add_entity(entity)
+        final_entities = set()
+        if route["patterns"] and route["answer"]:
+            # the question compiled into triple patterns is answered locally over the graph indexes
+            final_entities = cached_query(knowledge_graph, route["patterns"], route["answer"])
+            print("Query: ", route["patterns"], final_entities)
+        if len(final_entities) == 0:
+            # nothing matched exactly, walk the graph along the paths of the statement
+            final_entities = path_matching_entities(question, route, knowledge_graph)
         
-        relations = predicate_extract(text=text, entities=entities, entity_question=True)
-        for relation in relations:
-            subgraph.add_relation(relation)
+        # the most important entities first, in case they don't all fit the budget
+        rank = knowledge_graph.analytics().pagerank
+        entity_items = [render_entity(entity) for entity in sorted(final_entities, key=lambda entity: -rank[entity.id])]
+        print(entity_items)
         
-        print(subgraph)
-        with open('./kg_save/subgraph.pkl', 'wb') as file:
-            pickle.dump(subgraph, file)
-        
-        final_entities = None
-
-        for entity_name, entity in subgraph.entities.items():
-            if entity_name == "[ENTITY]":
-                continue
-            path = subgraph.find_path(entity, subgraph.entities["[ENTITY]"])
-
-            result_entities = knowledge_graph.find_matching_entities(relations=path, subgraph=subgraph, question=question_modified)
-            print(result_entities)
-            if len(result_entities) != 0:
-                if final_entities == None:
-                     final_entities = result_entities
-                else:
-                    final_entities = final_entities & result_entities
-            else:
-                final_entities = set()
-        
-        entities_str = "["
-        for final_entity in final_entities:
-            entities_str += str(final_entity)
-        entities_str += "]"
-        print(entities_str)
-        
-        messages = [{"role": "system", "content": "You will get a question about an entity and the answer in knowledge graph, based on that, phrase a final answer to the question"}, {"role": "user", "content": f"Question: {question}\nAnswer in knowledge graph: {entities_str if not is_number_question else len(final_entities)}\n"}]
+        messages = answer_messages(question, entity_items if not is_number_question else str(len(final_entities)))
         
         final_answer = gpt_chat(messages)
         return final_answer
@@ -164,12 +308,72 @@ def kg_qa (question: str, knowledge_graph:KnowledgeGraph):
         return gpt_chat(messages, model="gpt-4-1106-preview")
 
 
-if __name__ == '__main__':
-    start_time = time.time()
-
-    # Read knowledge graph from the pkl file
-    with open(kg_path, 'rb') as file:
-       knowledge_graph: KnowledgeGraph = pickle.load(file)
+def answer_sub_questions(questions: List[str], knowledge_graph: KnowledgeGraph, max_workers: int=max_workers, timeout: float=sub_question_timeout) -> List[str]:
+    """
+    Answer the sub-questions concurrently with at most max_workers of them running at a time. A
+    sub-question that fails or runs for more than timeout seconds gets a note instead of an answer, the
+    answers of the other ones are kept. The GPT calls of a sub-question time out at its deadline, so its
+    thread stops soon after it is given up on.
+
+    Parameters:
+    questions (list[str]): the sub-questions
+    knowledge_graph (KnowledgeGraph): the graph, all sub-questions are answered against the same snapshot
+    max_workers (int): size of the thread pool
+    timeout (float): seconds allowed for each sub-question, counted from when it starts running
+
+    Returns:
+    list[str]: answer of each sub-question, in order
+    """
+    knowledge_graph = knowledge_graph.snapshot()
+    started = dict()
+
+    def run(idx: int, sub_question: str) -> str:
+        started[idx] = time.time()
+        with call_deadline(timeout):
+            return kg_qa(sub_question, knowledge_graph)
+
+    answers = [None] * len(questions)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(run, idx, sub_question): idx for idx, sub_question in enumerate(questions)}
+    pending = set(futures)
+    while len(pending) != 0:
+        done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+        for future in done:
+            idx = futures[future]
+            try:
+                answers[idx] = future.result()
+            except Exception as oops:
+                print(f"Sub-question {idx + 1} failed: {oops!r}")
+                answers[idx] = f"{FAILED_ANSWER} (failed: {oops})"
+        for future in list(pending):
+            idx = futures[future]
+            if idx in started and time.time() - started[idx] > timeout:
+                # the thread can't be interrupted, its GPT calls give up at the deadline and its result
+                # is not waited for
+                print(f"Sub-question {idx + 1} timed out")
+                answers[idx] = f"{FAILED_ANSWER} (timed out after {timeout} seconds)"
+                pending.discard(future)
+    executor.shutdown(wait=False)
+    return answers
+
+
+def answer_question(question: str, knowledge_graph: KnowledgeGraph) -> str:
+    """
+    Answer a question: decompose it into questions the QA engine accepts, answer them concurrently and
+    combine their answers
+
+    Parameters:
+    question (str): the question
+    knowledge_graph (KnowledgeGraph): the graph
+
+    Returns:
+    str: the final answer
+    """
+    knowledge_graph = knowledge_graph.snapshot()
+    key = (knowledge_graph.stamp(), "final", normalize_question(question))
+    final_answer = answer_cache.get(key)
+    if final_answer is not None:
+        return final_answer
 
     messages = [{"role": "system", "content": "I have a QA engine based on knowledge graph. It only accepts questions about the name of one or more entities given other information, relation between two entities, attributes of an entity, and attributes of a relation. \n\nYou will be given a question. Can you list all the questions that my QA engine accepts and that combining answers to them gives answer to this question?\n\nYour output should be in this list format: [\"question1\", \"question2\", ...]"}, {"role": "user", "content": question}]
     
@@ -177,18 +381,29 @@ if __name__ == '__main__':
 
     questions: List = ast.literal_eval(format_list_answer(questions_list_res))
 
-    final_prompt = ""
-    for idx, sub_question in enumerate(questions):
-        answer = kg_qa(sub_question, knowledge_graph)
-        final_prompt += f"Question {idx + 1}: {sub_question}\nAnswer: {answer}\n\n"
-    
-    final_prompt += f"Given answers to those questions, provide an answer to this final question:\n{question}"
+    answers = answer_sub_questions(questions, knowledge_graph)
+    builder = PromptBuilder(final_token_budget, "gpt-4-1106-preview")
+    builder.add_items((f"Question {idx + 1}: {sub_question}\nAnswer: {answer}\n\n" for idx, (sub_question, answer) in enumerate(zip(questions, answers))), separator="", suffix=f"Given answers to those questions, provide an answer to this final question:\n{question}")
+    final_prompt = builder.build()
     print("Final prompt: ", final_prompt)
     messages = [{"role": "system", "content": ""}, {"role": "user", "content": final_prompt}]
     
     final_answer = gpt_chat(messages, model="gpt-4-1106-preview")
+    if not any(answer.startswith(FAILED_ANSWER) for answer in answers):
+        # an answer built on failed sub-questions is not reused
+        answer_cache.put(key, final_answer)
+    return final_answer
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    # Read knowledge graph, the bundle is memory-mapped and only the parts used by the question are loaded
+    knowledge_graph: KnowledgeGraph = load_knowledge_graph(kg_path)
+
+    final_answer = answer_question(question, knowledge_graph)
 
     print("Final Answer: ", final_answer)
 
     end_time = time.time()
-    print(f"Time elapsed: {end_time - start_time} seconds")
\ No newline at end of file
+    print(f"Time elapsed: {end_time - start_time} seconds")
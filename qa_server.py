@@ -0,0 +1,100 @@
+"""
+Resident QA service: loads the knowledge graph once and answers questions read as JSON lines from stdin,
+one object per line: {"id": ..., "question": "..."}. Answers are written to stdout as JSON lines as soon
+as they are ready (not necessarily in input order) with the latency of each request:
+{"id": ..., "question": "...", "answer": "...", "latency": seconds} or {..., "error": "..."}.
+
+Questions are answered concurrently. Embedding calls and entity lookups made at the same time by
+different questions are coalesced into batched embedding requests and batched VDB queries. Throughput
+and latency statistics are written to stderr at the end of the input.
+
+Usage: python qa_server.py --kg ./kg_save/knowledge_graph.ukg --workers 8 < questions.jsonl > answers.jsonl
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import utils.gpt as gpt
+from utils.batching import Batcher
+from utils.kg_store import load_knowledge_graph
+from qa import answer_question, kg_path
+
+
+def serve(knowledge_graph, lines, out, workers: int) -> list:
+    """
+    Answer the questions of the JSON lines concurrently, writing each result to out when it is ready
+
+    Parameters:
+    knowledge_graph (KnowledgeGraph): the graph
+    lines (Iterable[str]): input JSON lines
+    out (TextIO): where results are written
+    workers (int): number of questions answered at the same time
+
+    Returns:
+    list[float]: latency of each request
+    """
+    latencies = []
+    out_lock = threading.Lock()
+
+    def handle(idx: int, line: str, received: float) -> None:
+        result = dict()
+        try:
+            request = json.loads(line)
+            result["id"] = request.get("id", idx)
+            result["question"] = request["question"]
+            result["answer"] = answer_question(request["question"], knowledge_graph)
+        except Exception as oops:
+            result.setdefault("id", idx)
+            result["error"] = repr(oops)
+        result["latency"] = time.time() - received
+        with out_lock:
+            latencies.append(result["latency"])
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for idx, line in enumerate(lines):
+            if line.strip():
+                executor.submit(handle, idx, line, time.time())
+    return latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kg', default=kg_path, help='knowledge graph bundle or pickle')
+    parser.add_argument('--workers', type=int, default=8, help='questions answered at the same time')
+    parser.add_argument('--batch-size', type=int, default=64, help='maximum embeddings/lookups per batch')
+    parser.add_argument('--batch-wait-ms', type=float, default=5, help='how long a call waits for others to join its batch')
+    parser.add_argument('--vdb-processes', type=int, default=0, help='worker processes scoring large vector databases, 0 scores in this process')
+    args = parser.parse_args()
+
+    # stdout carries the results only, the progress printed by the QA code goes to stderr
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    start_time = time.time()
+    # the service never writes to the graph, one snapshot is shared by all the questions
+    knowledge_graph = load_knowledge_graph(args.kg).snapshot()
+    gpt.embedding_batcher = Batcher(gpt.batched_embeddings, max_batch=args.batch_size, max_wait=args.batch_wait_ms / 1000, name="embedding")
+    for vdb in (knowledge_graph.entity_vdb, knowledge_graph.relation_vdb):
+        vdb.enable_batching(max_batch=args.batch_size, max_wait=args.batch_wait_ms / 1000)
+        if args.vdb_processes > 0:
+            vdb.enable_sharding(processes=args.vdb_processes)
+    print(f"Loaded {args.kg} in {time.time() - start_time:.2f} seconds", file=sys.stderr)
+
+    start_time = time.time()
+    latencies = serve(knowledge_graph, sys.stdin, out, args.workers)
+    elapsed = time.time() - start_time
+
+    if latencies:
+        print(f"requests: {len(latencies)}  elapsed: {elapsed:.2f} s  QPS: {len(latencies) / elapsed:.2f}", file=sys.stderr)
+        print(f"latency p50: {np.percentile(latencies, 50):.2f} s  p95: {np.percentile(latencies, 95):.2f} s  max: {max(latencies):.2f} s", file=sys.stderr)
+    for batcher in (gpt.embedding_batcher, knowledge_graph.entity_vdb.batcher, knowledge_graph.relation_vdb.batcher):
+        print(batcher.stats(), file=sys.stderr)
+    for model, stats in gpt.call_policy.stats().items():
+        print(model, stats, file=sys.stderr)
@@ -0,0 +1,40 @@
+"""
+Shared fixtures. Graphs are built in memory with the local hashing embedding, so the tests need no API key
+and make no network call.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+
+
+def make_graph(**kwargs) -> KnowledgeGraph:
+    return KnowledgeGraph(entities=dict(), relations=set(), types=set(), vdb_path=None, entity_embedding='hashing', relation_embedding='hashing', **kwargs)
+
+
+def entity(name: str, types=(), **properties) -> KGEntity:
+    return KGEntity(name=name, data_properties=dict(properties), description="", types=list(types), relations=[])
+
+
+def relation(head: str, name: str, tail: str, **properties) -> KGRelation:
+    return KGRelation(name=name, head_entity=head, tail_entity=tail, data_properties=dict(properties), description="", source="")
+
+
+@pytest.fixture
+def chancellors() -> KnowledgeGraph:
+    """
+    The chancellors of UIUC and where they studied
+    """
+    graph = make_graph()
+    for name, types in (("Phyllis Wise", ["person"]), ("Barbara Wilson", ["person"]), ("Robert Jones", ["person"]), ("UIUC", ["organization"]), ("Stanford University", ["organization"])):
+        graph.add_entity(entity(name, types))
+    graph.add_relation(relation("Phyllis Wise", "Chancellor_of_Relation", "UIUC", start_time="2011", end_time="2015"))
+    graph.add_relation(relation("Barbara Wilson", "Chancellor_of_Relation", "UIUC", start_time="2015", end_time="2016"))
+    graph.add_relation(relation("Robert Jones", "Chancellor_of_Relation", "UIUC", start_time="2016", end_time="present"))
+    graph.add_relation(relation("Barbara Wilson", "Studied_at_Relation", "Stanford University"))
+    return graph
@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+
+from conftest import entity, make_graph, relation
+from utils.analytics import connected_components, pagerank
+
+
+def test_components_and_degrees(chancellors):
+    chancellors.add_entity(entity("Island"))
+    analytics = chancellors.analytics()
+    assert analytics.num_components == 2
+    assert analytics.components[chancellors.entities["Island"].id] == 5
+    assert analytics.out_degree.tolist() == [1, 2, 1, 0, 0, 0]
+    assert analytics.in_degree[chancellors.entities["UIUC"].id] == 3
+
+
+def test_pagerank_is_a_distribution():
+    heads, tails = np.array([0, 1, 2, 2]), np.array([1, 2, 0, 3])
+    rank = pagerank(5, heads, tails)
+    assert np.isclose(rank.sum(), 1.0) and (rank > 0).all()
+    # node 4 has no relation, node 3 is only pointed to
+    assert rank[3] > rank[4]
+    assert connected_components(5, heads, tails).tolist() == [0, 0, 0, 0, 4]
+
+
+def test_analytics_are_cached_per_version(chancellors):
+    analytics = chancellors.analytics()
+    assert chancellors.analytics() is analytics
+    assert chancellors.snapshot().analytics() is analytics
+    chancellors.add_relation(relation("UIUC", "Partner_of_Relation", "Stanford University"))
+    assert chancellors.analytics() is not analytics
+    assert chancellors.analytics().num_components == 1
+
+
+def test_compacted_graph_gives_the_same_arrays(chancellors):
+    before = chancellors.analytics()
+    chancellors.compact()
+    chancellors._analytics = None
+    after = chancellors.analytics()
+    assert sorted(zip(before.heads.tolist(), before.tails.tolist())) == sorted(zip(after.heads.tolist(), after.tails.tolist()))
+
+
+def test_traversal_roots_start_from_sources(chancellors):
+    roots = chancellors.analytics().traversal_roots().tolist()
+    sources = {chancellors.entities[name].id for name in ("Phyllis Wise", "Barbara Wilson", "Robert Jones")}
+    assert set(roots[:3]) == sources and sorted(roots) == list(range(5))
+
+
+def test_visualization_samples_by_pagerank(chancellors, tmp_path):
+    chancellors.visualize(str(tmp_path / "graph.json"), max_nodes=1, rank="pagerank")
+    with open(tmp_path / "graph.json") as f:
+        rendered = json.load(f)
+    assert [node["label"] for node in rendered["nodes"]] == ["UIUC"]
@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+import suite
+
+
+def _results(path, **metrics):
+    with open(path, "w") as f:
+        json.dump({"results": {"1000": metrics}}, f)
+    return str(path)
+
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    baseline = _results(tmp_path / "baseline.json", insert_ms=10.0, lookups_per_s=1000.0, peak_rss_mb=100.0)
+    current = _results(tmp_path / "current.json", insert_ms=13.0, lookups_per_s=700.0, peak_rss_mb=90.0)
+    assert suite.compare(baseline, current, 0.2) == 2
+    output = capsys.readouterr().out
+    assert output.count("REGRESSION") == 2 and "improved" not in output
+    assert suite.compare(baseline, current, 0.5) == 0
+
+
+def test_suite_runs_on_a_small_graph(tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "suite.py"), "--sizes", "200", "--output", str(output)], check=True, capture_output=True, cwd=tmp_path)
+    with open(output) as f:
+        report = json.load(f)
+    assert "error" not in report["results"]["200"]
+    assert report["results"]["200"]["peak_rss_mb"] > 0
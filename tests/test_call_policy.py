@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from utils.call_policy import CallPolicy
+
+
+class Transient(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def quick_policy(**kwargs):
+    return CallPolicy(default_timeout=1.0, backoff=0.0, **kwargs)
+
+
+def test_transient_errors_are_retried():
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise Transient("unavailable")
+        return "ok"
+
+    policy = quick_policy()
+    assert policy.call("model", request) == "ok"
+    assert len(attempts) == 3
+    # every retry gets a longer timeout
+    assert attempts[0] < attempts[1] < attempts[2]
+
+
+def test_client_errors_are_not_retried():
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        raise BadRequest("invalid")
+
+    policy = quick_policy()
+    with pytest.raises(BadRequest):
+        policy.call("model", request)
+    assert len(attempts) == 1
+    assert policy.stats()["model"]["failures"] == 1
+    assert not CallPolicy.retryable(BadRequest())
+    assert CallPolicy.retryable(Transient())
+    assert CallPolicy.retryable(TimeoutError())
+
+
+def test_slow_attempts_are_hedged():
+    lock = threading.Lock()
+    attempts = []
+
+    def request(timeout):
+        with lock:
+            attempts.append(timeout)
+            first = len(attempts) == 1
+        if first:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    policy = quick_policy(hedge_delay=0.05, hedge_budget=1.0)
+    assert policy.call("model", request) == "fast"
+    stats = policy.stats()["model"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_retries_give_up_after_max_retry():
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        raise Transient("unavailable")
+
+    with pytest.raises(Transient):
+        quick_policy(max_retry=2).call("model", request)
+    assert len(attempts) == 2
+
+
+def test_deadline_caps_attempts_and_retries():
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        time.sleep(0.1)
+        raise Transient("unavailable")
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        quick_policy(max_retry=100).call("model", request, timeout=10.0, deadline=start + 0.35)
+    assert all(timeout <= 0.35 for timeout in attempts)
+    assert time.monotonic() - start < 0.6
+
+
+def test_retries_are_counted_and_only_printed_when_verbose(capsys):
+    def flaky():
+        attempts = []
+
+        def request(timeout):
+            attempts.append(timeout)
+            if len(attempts) < 2:
+                raise Transient("unavailable")
+            return "ok"
+        return request
+
+    policy = quick_policy()
+    assert policy.call("model", flaky()) == "ok"
+    assert policy.stats()["model"]["retries"] == 1
+    assert capsys.readouterr().out == ""
+
+    assert quick_policy(verbose=True).call("model", flaky()) == "ok"
+    assert "attempt 1/5" in capsys.readouterr().out
@@ -0,0 +1,125 @@
+import pickle
+
+import pytest
+
+import utils.kg_gen as kg_gen
+from utils.gpt import GPTError
+from conftest import entity, make_graph, relation
+from KnowledgeGraph import relation_key
+
+
+def test_relation_key_ignores_case_spaces_and_suffix():
+    assert relation_key("Barbara Wilson", "chancellor of", "UIUC") == relation_key("barbara  wilson", "Chancellor_of_Relation", "uiuc")
+    assert relation_key("Barbara Wilson", "chancellor of", "UIUC") != relation_key("Barbara Wilson", "studied at", "UIUC")
+
+
+def test_duplicate_relation_is_merged(chancellors):
+    embedded = []
+    embed = chancellors.relation_vdb.embed
+    chancellors.relation_vdb.embed = lambda content: embedded.append(content) or embed(content)
+
+    wilson = chancellors.entities["Barbara Wilson"]
+    duplicate = relation("Barbara Wilson", "chancellor of", "UIUC", start_time="2010", title="interim")
+    duplicate.description = "She led the campus."
+    chancellors.add_relation(duplicate)
+
+    assert len(chancellors.relations) == 4 and embedded == []
+    merged = chancellors.out_relations(wilson)[0]
+    # attributes already there are kept, new ones are added
+    assert merged.data_properties == {"start_time": "2015", "end_time": "2016", "title": "interim"}
+    assert merged.description.endswith("She led the campus.")
+
+    chancellors.add_relation(relation("Barbara Wilson", "chancellor of", "Stanford University"))
+    assert len(chancellors.relations) == 5
+
+
+
+def test_plural_entity_names_stay_apart():
+    graph = make_graph()
+    for name in ("Serena Williams", "Serena William", "UIUC"):
+        graph.add_entity(entity(name))
+    graph.add_relation(relation("Serena Williams", "studied at", "UIUC"))
+    graph.add_relation(relation("Serena William", "studied at", "UIUC"))
+    graph.add_relation(relation("UIUC", "alumni of", "Serena Williams"))
+    graph.add_relation(relation("UIUC", "alumnus of", "Serena William"))
+    assert len(graph.entity_list) == 3 and len(graph.relations) == 4
+    assert relation_key("UIUC", "Alumni_of_Relation", "Serena Williams") != relation_key("UIUC", "alumni of", "Serena William")
+
+
+def test_duplicates_are_found_after_a_pickle_round_trip(chancellors):
+    graph = pickle.loads(pickle.dumps(chancellors))
+    graph.add_relation(relation("Barbara Wilson", "Chancellors_of_Relation", "UIUC", title="interim"))
+    assert len(graph.relations) == 4
+    assert graph.out_relations(graph.entities["Barbara Wilson"])[0].data_properties["title"] == "interim"
+
+@pytest.fixture
+def extraction(monkeypatch):
+    calls = []
+
+    def gpt_chat(messages, **kwargs):
+        system_prompt = messages[0]["content"]
+        calls.append(system_prompt)
+        if "help extract relations" in system_prompt:
+            return "[['Barbara Wilson', 'chancellor of', 'UIUC']]"
+        if "brief description" in system_prompt:
+            return "{'description': 'Wilson led UIUC', 'source': 'Barbara Wilson was the chancellor of UIUC'}"
+        return "{'start_time': '2015'}"
+
+    monkeypatch.setattr(kg_gen, "gpt_chat", gpt_chat)
+    monkeypatch.setattr(kg_gen, "phrase_selection", lambda entity, text_chunk: text_chunk)
+    monkeypatch.setattr(kg_gen, "mention_recognition", lambda entity_list, text_chunk: [name for name in entity_list if name in text_chunk])
+    # two overlapping windows that both hold the triplet
+    monkeypatch.setattr(kg_gen, "split_text", lambda text, *args: [text, text])
+    return calls
+
+
+def test_predicate_extract_skips_repeated_triplets(extraction):
+    text = "Barbara Wilson was the chancellor of UIUC from 2015 to 2016."
+    entities = [entity("Barbara Wilson"), entity("UIUC")]
+    seen = dict()
+    relations = kg_gen.predicate_extract(text, entities, seen=seen)
+
+    assert [(r.head_entity, r.name, r.tail_entity) for r in relations] == [("Barbara Wilson", "chancellor_of_Relation", "UIUC")]
+    # one triplet extraction per head entity and window, a single description and attribute call
+    assert len(extraction) == 6
+    assert seen[relation_key("Barbara Wilson", "chancellor of", "UIUC")] is relations[0]
+    # the sentence of the repeat that the first source didn't hold is merged into it
+    assert relations[0].source == "Barbara Wilson was the chancellor of UIUC Barbara Wilson was the chancellor of UIUC from 2015 to 2016."
+
+    # the seen dict is shared across the chunks of a document
+    assert kg_gen.predicate_extract(text, entities, seen=seen) == []
+    assert len(extraction) == 10
+
+
+def test_repeat_from_an_earlier_chunk_is_returned_for_merging(extraction):
+    graph = make_graph()
+    entities = [entity("Barbara Wilson"), entity("UIUC")]
+    for item in entities:
+        graph.add_entity(item)
+    seen = dict()
+    first = kg_gen.predicate_extract("Barbara Wilson was the chancellor of UIUC.", entities, seen=seen)
+    graph.add_relation(first[0])
+    first[0].data_properties.clear()
+
+    repeats = kg_gen.predicate_extract("In 2015 Barbara Wilson became the chancellor of UIUC.", entities, seen=seen)
+    assert [(r.name, r.source, r.data_properties) for r in repeats] == [(first[0].name, "In 2015 Barbara Wilson became the chancellor of UIUC.", {"start_time": "2015"})]
+    # relations already handed out are left to the graph, which merges the repeat on add_relation
+    assert first[0].data_properties == {}
+    graph.add_relation(repeats[0])
+    assert len(graph.relations) == 1
+    assert first[0].data_properties == {"start_time": "2015"}
+    assert first[0].source.endswith("In 2015 Barbara Wilson became the chancellor of UIUC.")
+
+
+def test_failed_attribute_call_keeps_the_relation(monkeypatch, extraction):
+    chat = kg_gen.gpt_chat
+
+    def gpt_chat(messages, **kwargs):
+        if "help extract relations" in messages[0]["content"] or "brief description" in messages[0]["content"]:
+            return chat(messages, **kwargs)
+        raise GPTError("timed out")
+
+    monkeypatch.setattr(kg_gen, "gpt_chat", gpt_chat)
+    text = "Barbara Wilson was the chancellor of UIUC from 2015 to 2016."
+    relations = kg_gen.predicate_extract(text, [entity("Barbara Wilson"), entity("UIUC")])
+    assert [(r.head_entity, r.tail_entity, r.data_properties) for r in relations] == [("Barbara Wilson", "UIUC", {})]
@@ -0,0 +1,34 @@
+import pytest
+
+import utils.kg_gen as kg_gen
+from utils.gpt import GPTError
+from utils.prompt import sentence_spans, split_sentences
+from conftest import entity
+
+TEXT = "Tiger Wang is an excellent student at UIUC, he is also the Co-founder of Geni. At 2019, Wang founded Geni with his friends. She met him; University of Illinois is big."
+
+
+@pytest.mark.parametrize("text", [TEXT, "a. b? c!;; d", "Hello; world. ", "...", ""])
+def test_sentence_spans_agree_with_split_sentences(text):
+    assert [text[start:end].strip() for start, end in sentence_spans(text)] == list(split_sentences(text))
+
+
+def test_replace_aliases_keeps_longer_names():
+    assert kg_gen.replace_aliases("Wang met Tiger Wang and Wangs.", {"Wang": "Tiger Wang"}) == "Tiger Wang met Tiger Wang and Wangs."
+
+
+def test_disambiguation_applies_the_map(monkeypatch):
+    answer = '{"1:he": "Tiger Wang", "Wang": "Tiger Wang", "2:his": "Tiger Wang\'s", "3:She": "Alice", "Geni": "Geni"}'
+    monkeypatch.setattr(kg_gen, "gpt_chat", lambda messages, **kwargs: answer)
+    result = kg_gen.entity_disambiguation(TEXT, [entity("Tiger Wang"), entity("UIUC"), entity("Geni")], aliases={"University of Illinois": "UIUC"})
+    assert result == "Tiger Wang is an excellent student at UIUC, Tiger Wang is also the Co-founder of Geni. At 2019, Tiger Wang founded Geni with Tiger Wang's friends. She met him; UIUC is big."
+
+
+@pytest.mark.parametrize("failure", [GPTError("timed out"), "not json {"])
+def test_disambiguation_failure_keeps_the_text(monkeypatch, failure):
+    def chat(messages, **kwargs):
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+    monkeypatch.setattr(kg_gen, "gpt_chat", chat)
+    assert kg_gen.entity_disambiguation(TEXT, [entity("Tiger Wang")]) == TEXT
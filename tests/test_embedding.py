@@ -0,0 +1,46 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from utils.embedding import HASHING_THRESHOLD, get_embedding, register_embedding
+from utils.kg_store import save_bundle, load_bundle
+from utils.vdb import VDB
+
+
+def _similarity(a: str, b: str) -> float:
+    embed = get_embedding("hashing").embed
+    return float(np.dot(embed(a), embed(b)))
+
+
+@pytest.mark.parametrize("a, b", [("Barbara Wilson", "Wilson, Barbara"), ("Is_chancellor_of_Relation", "Chancellor_of_Relation"), ("UIUC", "uiuc")])
+def test_hashing_matches_variants_of_a_name(a, b):
+    assert _similarity(a, b) >= HASHING_THRESHOLD
+
+
+@pytest.mark.parametrize("a, b", [("Tiger Wang", "Tiger Wong"), ("Entity 12", "Entity 13"), ("Phyllis Wise", "Robert Jones")])
+def test_hashing_keeps_different_names_apart(a, b):
+    assert _similarity(a, b) < HASHING_THRESHOLD
+
+
+def test_hashing_embeds_empty_names():
+    vector = get_embedding("hashing").embed("")
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+
+
+def test_unknown_provider_is_rejected():
+    with pytest.raises(Exception, match="unknown embedding provider"):
+        VDB(None, embedding="no-such-provider")
+
+
+def test_vdb_keeps_its_provider(chancellors, tmp_path):
+    register_embedding("constant", lambda content: [1.0, 0.0], 0.5)
+    vdb = VDB(None, embedding="constant")
+    assert vdb.embed("anything") == [1.0, 0.0] and vdb.threshold == 0.5
+    assert pickle.loads(pickle.dumps(vdb)).embedding == "constant"
+
+    assert chancellors.entity_vdb.threshold == HASHING_THRESHOLD
+    save_bundle(chancellors, str(tmp_path / "graph.ukg"))
+    graph = load_bundle(str(tmp_path / "graph.ukg"))
+    assert graph.entity_vdb.embedding == graph.relation_vdb.embedding == "hashing"
+    assert graph.find_entity("phyllis wise").name == "Phyllis Wise"
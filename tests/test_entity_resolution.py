@@ -0,0 +1,83 @@
+import hashlib
+
+import numpy as np
+
+from conftest import make_graph, entity, relation
+from utils.embedding import HASHING_THRESHOLD
+from utils.entity_resolution import EntityResolver
+from utils.kg_store import save_bundle, load_bundle
+from utils.vdb import VDB
+
+
+def _graph_with_fillers(resolver: EntityResolver):
+    # the hyperplanes go through the mean of the indexed rows, which needs more than a couple of them
+    graph = make_graph(resolver=resolver)
+    for i in range(64):
+        graph.add_entity(entity(hashlib.md5(str(i).encode()).hexdigest()[:12]))
+    assert len(graph.entity_list) == 64
+    return graph
+
+
+def test_similar_name_is_merged_into_an_alias():
+    resolver = EntityResolver(threshold=HASHING_THRESHOLD)
+    graph = _graph_with_fillers(resolver)
+    graph.add_entity(entity("University of Illinois Urbana-Champaign", ["organization"]))
+    graph.add_entity(entity("University of Illinois at Urbana Champaign", ["university"]))
+
+    assert len(graph.entity_list) == 65
+    assert resolver.canonical("University of Illinois at Urbana Champaign") == "University of Illinois Urbana-Champaign"
+    assert "university" in graph.types
+
+    # relations written with the alias land on the canonical entity
+    graph.add_entity(entity("Urbana"))
+    graph.add_relation(relation("University of Illinois at Urbana Champaign", "Located_in_Relation", "Urbana"))
+    canonical = graph.entities["University of Illinois Urbana-Champaign"]
+    assert [r.tail_entity for r in graph.out_relations(canonical)] == ["Urbana"]
+
+
+def test_different_names_stay_apart():
+    resolver = EntityResolver(threshold=HASHING_THRESHOLD)
+    graph = _graph_with_fillers(resolver)
+    graph.add_entity(entity("Phyllis Wise"))
+    graph.add_entity(entity("Robert Jones"))
+    assert resolver.aliases == {}
+    assert len(graph.entity_list) == 66
+
+
+def test_candidates_match_brute_force_on_exact_vectors():
+    rng = np.random.default_rng(1)
+    vdb = VDB(None)
+    vectors = rng.standard_normal((200, 32))
+    vdb.insert_index({i: vector for i, vector in enumerate(vectors)})
+    resolver = EntityResolver(threshold=0.99)
+    for i in (0, 57, 199):
+        assert resolver.resolve(vectors[i], vdb) == str(i)
+    assert resolver.resolve(rng.standard_normal(32), vdb) is None
+
+
+def test_resolver_aliases_are_saved_in_bundles(tmp_path):
+    resolver = EntityResolver(threshold=HASHING_THRESHOLD)
+    graph = _graph_with_fillers(resolver)
+    graph.add_entity(entity("University of Illinois Urbana-Champaign"))
+    graph.add_entity(entity("University of Illinois at Urbana Champaign"))
+    save_bundle(graph, str(tmp_path / "graph.ukg"))
+
+    loaded = load_bundle(str(tmp_path / "graph.ukg"))
+    assert loaded.resolver.threshold == HASHING_THRESHOLD
+    assert loaded.resolver.aliases == resolver.aliases
+
+
+def test_resolver_uses_the_provider_threshold():
+    graph = _graph_with_fillers(EntityResolver())
+    graph.add_entity(entity("University of Illinois Urbana-Champaign"))
+    graph.add_entity(entity("University of Illinois at Urbana Champaign"))
+    assert graph.resolver.threshold is None
+    assert graph.resolver.canonical("University of Illinois at Urbana Champaign") == "University of Illinois Urbana-Champaign"
+
+
+def test_explicit_resolver_threshold_overrides():
+    resolver = EntityResolver(threshold=0.999)
+    graph = _graph_with_fillers(resolver)
+    graph.add_entity(entity("University of Illinois Urbana-Champaign"))
+    graph.add_entity(entity("University of Illinois at Urbana Champaign"))
+    assert resolver.aliases == {}
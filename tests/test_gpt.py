@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+import utils.gpt as gpt
+from utils.cache import LRUCache
+from utils.call_policy import CallPolicy
+
+
+def test_embeddings_are_cached_per_engine(monkeypatch):
+    requests = []
+
+    def gpt3_embeddings(contents, engine="text-embedding-ada-002"):
+        requests.append((engine, list(contents)))
+        return [[float(len(content)), 1.0] for content in contents]
+
+    monkeypatch.setattr(gpt, "gpt3_embeddings", gpt3_embeddings)
+    monkeypatch.setattr(gpt, "embedding_cache", LRUCache(maxsize=16))
+    assert gpt.gpt3_embedding("UIUC") == [4.0, 1.0]
+    assert gpt.gpt3_embedding("UIUC") == [4.0, 1.0]
+    gpt.gpt3_embedding("UIUC", engine="other")
+    assert requests == [("text-embedding-ada-002", ["UIUC"]), ("other", ["UIUC"])]
+
+
+class FakeCompletions:
+    def __init__(self, error=None):
+        self.error = error
+        self.timeouts = []
+
+    def create(self, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        if self.error is not None:
+            raise self.error
+        message = SimpleNamespace(content="answer")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def fake_client(monkeypatch, error=None):
+    completions = FakeCompletions(error)
+    monkeypatch.setattr(gpt, "_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(gpt, "call_policy", CallPolicy(default_timeout=1.0, backoff=0.0, max_retry=2))
+    return completions
+
+
+def test_gpt_chat_passes_the_timeout_to_the_client(monkeypatch):
+    completions = fake_client(monkeypatch)
+    assert gpt.gpt_chat([{"role": "user", "content": "hi"}], timeout=2.5) == "answer"
+    assert completions.timeouts == [2.5]
+
+
+def test_gpt_chat_raises_typed_errors(monkeypatch):
+    completions = fake_client(monkeypatch, TimeoutError("slow"))
+    with pytest.raises(gpt.GPTTimeoutError):
+        gpt.gpt_chat([{"role": "user", "content": "hi"}])
+    assert len(completions.timeouts) == 2
+
+    fake_client(monkeypatch, ConnectionError("reset"))
+    with pytest.raises(gpt.GPTError) as error:
+        gpt.gpt_chat([{"role": "user", "content": "hi"}])
+    assert not isinstance(error.value, gpt.GPTTimeoutError)
+
+
+def test_call_deadline_shortens_the_timeout(monkeypatch):
+    completions = fake_client(monkeypatch)
+    with gpt.call_deadline(0.5):
+        gpt.gpt_chat([{"role": "user", "content": "hi"}], timeout=2.5)
+    gpt.gpt_chat([{"role": "user", "content": "hi"}], timeout=2.5)
+    assert completions.timeouts[0] <= 0.5 and completions.timeouts[1] == 2.5
+
+
+def test_programming_errors_are_not_wrapped(monkeypatch):
+    fake_client(monkeypatch, TypeError("create() got an unexpected keyword argument"))
+    with pytest.raises(TypeError):
+        gpt.gpt_chat([{"role": "user", "content": "hi"}])
@@ -0,0 +1,99 @@
+import pickle
+
+import numpy as np
+
+from conftest import make_graph, entity, relation
+from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+from utils.embedding import get_embedding
+from utils.vdb import VDB
+
+hash_embedding = get_embedding("hashing").embed
+
+
+def test_ids_are_dense_in_insertion_order(chancellors):
+    assert [e.id for e in chancellors.entity_list] == list(range(5))
+    assert [r.id for r in chancellors.relations] == list(range(4))
+    assert chancellors.get_entity("3").name == "UIUC"
+    assert chancellors.get_relation(1).head_entity == "Barbara Wilson"
+
+
+def test_same_name_merges_into_one_entity():
+    graph = make_graph()
+    graph.add_entity(KGEntity("UIUC", {}, "a university", ["organization"], []))
+    graph.add_entity(KGEntity("UIUC", {}, "in Illinois", ["organization"], []))
+    assert len(graph.entity_list) == 1
+    assert graph.entities["UIUC"].description == "a university in Illinois"
+
+
+def test_compact_keeps_out_relations(chancellors):
+    wilson = chancellors.entities["Barbara Wilson"]
+    before = [r.id for r in chancellors.out_relations(wilson)]
+    chancellors.compact()
+    assert wilson.relations == ()
+    assert [r.id for r in chancellors.out_relations(wilson)] == before
+
+    chancellors.add_entity(entity("Illinois"))
+    chancellors.add_relation(relation("Barbara Wilson", "Lives_in_Relation", "Illinois"))
+    chancellors.compact()
+    assert [r.name for r in chancellors.out_relations(wilson)] == ["Chancellor_of_Relation", "Studied_at_Relation", "Lives_in_Relation"]
+
+
+def test_pickle_round_trip(chancellors):
+    graph = pickle.loads(pickle.dumps(chancellors))
+    assert [e.name for e in graph.entity_list] == [e.name for e in chancellors.entity_list]
+    assert [r.id for r in graph.out_relations(graph.entities["Barbara Wilson"])] == [1, 3]
+    assert graph.relations[0].data_properties == {"start_time": "2011", "end_time": "2015"}
+
+
+def _old_object(cls, **state):
+    # objects unpickled from before __slots__ get their plain __dict__ passed to __setstate__
+    obj = cls.__new__(cls)
+    obj.__setstate__(state)
+    return obj
+
+
+def test_setstate_migrates_uuid_pickles(tmp_path):
+    wise = _old_object(KGEntity, id="uuid-wise", name="Phyllis Wise", data_properties={}, description="", types=["person"], relations=[])
+    uiuc = _old_object(KGEntity, id="uuid-uiuc", name="UIUC", data_properties={}, description="", types=["organization"], relations=[])
+    chancellor = _old_object(KGRelation, id="uuid-rel", name="Chancellor_of_Relation", head_entity="Phyllis Wise", tail_entity="UIUC", data_properties={}, description="", source="")
+    wise.relations.append(chancellor)
+
+    entity_vdb = VDB(str(tmp_path / "entity_vdb.json"))
+    entity_vdb.insert_index({"uuid-wise": hash_embedding("Phyllis Wise"), "uuid-uiuc": hash_embedding("UIUC")})
+    relation_vdb = VDB(str(tmp_path / "relation_vdb.json"))
+    relation_vdb.insert_index({"uuid-rel": hash_embedding("Chancellor_of_Relation")})
+
+    graph = KnowledgeGraph.__new__(KnowledgeGraph)
+    graph.__setstate__({
+        "entities": {"Phyllis Wise": wise, "UIUC": uiuc},
+        "relations": {chancellor},
+        "types": {"person", "organization"},
+        "entity_vdb": entity_vdb,
+        "relation_vdb": relation_vdb,
+        "types_vdb": VDB(str(tmp_path / "types_vdb.json")),
+        "entities_vdb_map": {"uuid-wise": wise, "uuid-uiuc": uiuc},
+        "relations_vdb_map": {"uuid-rel": chancellor},
+    })
+
+    assert wise.id == 0 and uiuc.id == 1 and chancellor.id == 0
+    assert graph.out_relations(wise) == [chancellor]
+    assert np.allclose(graph.entity_vdb.query_id(1), hash_embedding("UIUC"))
+    assert graph.relation_vdb.query_index(hash_embedding("Chancellor_of_Relation"), count=1)[0]["id"] == "0"
+
+
+def test_find_entity_falls_back_to_the_closest_vector():
+    graph = make_graph()
+    graph.add_entity(entity("University of Illinois Urbana-Champaign"))
+    graph.add_entity(entity("Stanford University"))
+    assert graph.find_entity("University of Illinois at Urbana Champaign").name == "University of Illinois Urbana-Champaign"
+    assert graph.find_entity("Robert Jones") is None
+
+
+def test_in_memory_graph_writes_no_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    graph = make_graph()
+    graph.add_entity(entity("UIUC"))
+    graph.add_entity(entity("Urbana"))
+    graph.add_relation(relation("UIUC", "Located_in_Relation", "Urbana"))
+    assert graph.entity_vdb.vdb_file is None and len(graph.entity_vdb) == 2
+    assert list(tmp_path.iterdir()) == []
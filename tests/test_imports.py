@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.mark.parametrize("module", ["qa", "qa_server", "main", "utils.kg_store"])
+def test_entry_points_defer_heavy_imports(module):
+    code = f"import sys, {module}; print(','.join(name for name in ('openai', 'dotenv', 'networkx', 'pyvis', 'tiktoken', 'multiprocessing.pool') if name in sys.modules))"
+    env = {key: value for key, value in os.environ.items() if not key.endswith("OPENAI_API_KEY")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
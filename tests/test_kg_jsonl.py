@@ -0,0 +1,54 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from conftest import entity, make_graph, relation
+
+
+def _triplets(graph) -> list:
+    return sorted((r.head_entity, r.name, r.tail_entity, tuple(sorted(r.data_properties.items()))) for r in graph.relations)
+
+
+@pytest.mark.parametrize("name", ["graph.jsonl", "graph.jsonl.gz"])
+def test_export_import_round_trip(chancellors, tmp_path, name):
+    path = str(tmp_path / name)
+    version = chancellors.export_jsonl(path)
+    assert version == chancellors.version
+
+    graph = make_graph()
+    embedded = []
+    graph.entity_vdb.embed = graph.relation_vdb.embed = lambda content: embedded.append(content)
+    assert graph.import_jsonl(path) == version
+    assert [e.name for e in graph.entity_list] == [e.name for e in chancellors.entity_list]
+    assert _triplets(graph) == _triplets(chancellors)
+    assert graph.entities["UIUC"].types == ["organization"]
+    # the vectors come with the records
+    assert embedded == []
+    assert np.allclose(graph.entity_vdb.query_id(3), chancellors.entity_vdb.query_id(3))
+
+    if name.endswith(".gz"):
+        with gzip.open(path, "rt") as f:
+            assert json.loads(f.readline())["kind"] == "header"
+
+
+def test_diff_only_holds_later_changes(chancellors, tmp_path):
+    replica = make_graph()
+    checkpoint = chancellors.export_jsonl(str(tmp_path / "full.jsonl"))
+    replica.import_jsonl(str(tmp_path / "full.jsonl"))
+
+    chancellors.add_entity(entity("Carol Folt", ["person"]))
+    chancellors.add_relation(relation("Carol Folt", "Chancellor_of_Relation", "UIUC", start_time="2009"))
+    # a merged duplicate changes the existing relation
+    chancellors.add_relation(relation("Barbara Wilson", "chancellor of", "UIUC", role="interim"))
+
+    records = list(chancellors.diff(checkpoint, vectors=False))
+    assert records[0]["kind"] == "header" and records[0]["version"] == chancellors.version
+    assert sorted((record["kind"], record["name"]) for record in records[1:]) == [("entity", "Carol Folt"), ("relation", "Chancellor_of_Relation"), ("relation", "Chancellor_of_Relation")]
+
+    chancellors.export_jsonl(str(tmp_path / "diff.jsonl"), since_version=checkpoint)
+    replica.import_jsonl(str(tmp_path / "diff.jsonl"))
+    assert _triplets(replica) == _triplets(chancellors)
+    assert len(replica.relations) == 5
+    assert list(chancellors.diff(chancellors.version))[1:] == []
@@ -0,0 +1,66 @@
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from conftest import entity, relation
+from utils.kg_store import save_bundle, load_bundle, load_knowledge_graph
+
+
+def _snapshot(graph) -> list:
+    return [(r.id, r.head_entity, r.name, r.tail_entity, r.data_properties) for e in graph.entity_list for r in graph.out_relations(e)]
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_bundle_round_trip(chancellors, tmp_path, lazy):
+    chancellors.entities["UIUC"].data_properties["founded"] = "1867"
+    save_bundle(chancellors, str(tmp_path / "graph.ukg"))
+    graph = load_bundle(str(tmp_path / "graph.ukg"), lazy=lazy)
+
+    assert len(graph.entity_list) == len(chancellors.entity_list)
+    assert graph.entities["UIUC"].data_properties == {"founded": "1867"}
+    assert graph.entities["Barbara Wilson"].types == ["person"]
+    assert "Nobody" not in graph.entities
+    assert _snapshot(graph) == _snapshot(chancellors)
+    assert graph.types == chancellors.types
+    assert np.allclose(graph.entity_vdb.query_id(3), chancellors.entity_vdb.query_id(3))
+
+
+def test_lazy_bundle_accepts_new_entities(chancellors, tmp_path):
+    save_bundle(chancellors, str(tmp_path / "graph.ukg"))
+    graph = load_bundle(str(tmp_path / "graph.ukg"))
+    graph.add_entity(entity("Illinois"))
+    graph.add_relation(relation("UIUC", "Located_in_Relation", "Illinois"))
+    assert graph.entities["Illinois"].id == 5
+    assert [r.tail_entity for r in graph.out_relations(graph.entities["UIUC"])] == ["Illinois"]
+
+
+def test_save_replaces_existing_bundle(chancellors, tmp_path):
+    os.makedirs(tmp_path / "bundles")
+    path = str(tmp_path / "bundles" / "graph.ukg")
+    save_bundle(chancellors, path)
+    chancellors.add_entity(entity("Illinois"))
+    save_bundle(chancellors, path)
+    assert len(load_bundle(path).entity_list) == 6
+    assert sorted(os.listdir(tmp_path / "bundles")) == ["graph.ukg"]
+
+
+def test_newer_bundle_version_is_rejected(chancellors, tmp_path):
+    path = str(tmp_path / "graph.ukg")
+    save_bundle(chancellors, path)
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    manifest["version"] += 1
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(Exception, match="newer"):
+        load_bundle(path)
+
+
+def test_load_knowledge_graph_reads_pickles(chancellors, tmp_path):
+    with open(tmp_path / "graph.pkl", "wb") as f:
+        pickle.dump(chancellors, f)
+    graph = load_knowledge_graph(str(tmp_path / "graph.pkl"))
+    assert _snapshot(graph) == _snapshot(chancellors)
@@ -0,0 +1,51 @@
+from conftest import entity, make_graph
+
+
+def _typed_graph():
+    graph = make_graph()
+    graph.add_entity(entity("Jordan River", ["river"]))
+    graph.add_entity(entity("Jordan Rivers", ["person"]))
+    graph.add_entity(entity("UIUC", ["Organization"]))
+    graph.add_entity(entity("Parkland College", ["organizations", "school"]))
+    return graph
+
+
+def test_types_are_embedded_once():
+    graph = _typed_graph()
+    assert sorted(graph.types_vdb.ids) == ["Organization", "organizations", "person", "river", "school"]
+
+
+def test_entities_of_compatible_types():
+    graph = _typed_graph()
+    assert {"organization", "school"} <= graph.compatible_types(["Organization"]) | graph.compatible_types(["school"])
+    assert graph.entities_of_type(["organization"]) == [2, 3]
+    assert graph.entities_of_type(["mountain"]) == []
+    # entities added after the index was built are indexed too
+    graph.add_entity(entity("Mississippi River", ["River"]))
+    assert graph.entities_of_type(["river"]) == [0, 4]
+
+
+def test_typed_lookup_only_scans_compatible_entities():
+    graph = _typed_graph()
+    vector = graph.entity_vdb.embed("Jordan Rivers")
+    assert graph._best_entity(vector).name == "Jordan Rivers"
+    assert graph._best_entity(vector, ["river"]).name == "Jordan River"
+    assert graph.find_entity("Jordan Rivers", types=["river"]).name == "Jordan Rivers"
+
+
+def test_query_best_among_ignores_unknown_ids():
+    graph = _typed_graph()
+    vector = graph.entity_vdb.embed("Jordan River")
+    assert graph.entity_vdb.query_best_among(vector, [1, 99], 0.5)["id"] == "1"
+    assert graph.entity_vdb.query_best_among(vector, [99], 0.5) is None
+
+
+def test_typed_lookup_falls_back_to_all_entities():
+    graph = make_graph()
+    graph.add_entity(entity("University of Illinois Urbana-Champaign", ["organization"]))
+    graph.add_entity(entity("Parkland College", ["school"]))
+    vector = graph.entity_vdb.embed("University of Illinois at Urbana-Champaign")
+    assert graph._best_entity(vector).name == "University of Illinois Urbana-Champaign"
+    assert graph._best_entity(vector, ["school"]).name == "University of Illinois Urbana-Champaign"
+    assert graph._best_entity(graph.entity_vdb.embed("Parkland Colleges"), ["school"]).name == "Parkland College"
+
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils.name_index import NameIndex, distinguishing
+from utils.normalize import normalize_label, normalize_name
+from KnowledgeGraph import relation_key
+
+
+def test_normalize_name():
+    assert normalize_label("Chancellor_of_Relation") == "chancellor of"
+    assert normalize_label("  Chancellors-Of ") == "chancellor of"
+    assert normalize_label("Class") == "class"
+    # entity names are not singularized
+    assert normalize_name("  Serena_Williams ") == "serena williams"
+    assert normalize_name("News") == "news"
+
+
+def test_relation_key_uses_the_name_normalization():
+    assert relation_key("UIUC", "chancellor of", "Robert Jones") == relation_key("uiuc", "Chancellor_of_Relation", "Robert  Jones")
+    assert relation_key("UIUC", "chancellor of", "Robert Jones")[1] == normalize_label("Chancellor_of_Relation")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Queen Elizabeth I", "Queen Elizabeth II"),
+    ("2015 Annual Report of the University of Illinois", "2016 Annual Report of the University of Illinois"),
+    ("Chancellor_of_University_of_Illinois_Relation", "Vice_Chancellor_of_University_of_Illinois_Relation"),
+    ("Journal of Machine Learning Research", "Journal of Machine Learning Research Workshop"),
+    ("Henry Ford Senior", "Henry Ford Junior"),
+    ("Serena Williams", "Serena William"),
+    ("Roberts Family Foundation", "Robert Family Foundation"),
+])
+def test_close_but_different_names_are_left_to_embeddings(a, b):
+    index = NameIndex()
+    assert not index.match(a, b)
+    index.catch_up([SimpleNamespace(name=b)])
+    assert index.lookup(a) is None
+
+
+@pytest.mark.parametrize("a, b, normalize", [
+    ("University of Ilinois", "University of Illinois", normalize_name),
+    ("Chancellor_of_Relation", "chancellors of", normalize_label),
+    ("Urbana-Champaign", "urbana champaign", normalize_name),
+])
+def test_trivial_variations_match(a, b, normalize):
+    index = NameIndex(normalize=normalize)
+    assert index.match(a, b)
+    index.catch_up([SimpleNamespace(name=b), SimpleNamespace(name="Parkland College")])
+    assert index.lookup(a) == 0
+
+
+def test_unrelated_names_dont_match():
+    index = NameIndex()
+    index.catch_up([SimpleNamespace(name="Phyllis Wise"), SimpleNamespace(name="Parkland College")])
+    assert index.lookup("Robert Jones") is None
+    assert not index.match("Phyllis Wise", "Robert Jones")
+
+
+def test_lookup_limit_and_ambiguity():
+    index = NameIndex()
+    index.catch_up([SimpleNamespace(name="Barbara Wilson"), SimpleNamespace(name="barbara_wilson")])
+    # two items with the same normalized name: embeddings decide
+    assert index.lookup("Barbara Wilson") is None
+    assert index.lookup("Barbara Wilson", limit=1) == 0
+
+
+def test_distinguishing():
+    assert distinguishing("world war i", "world war ii")
+    assert distinguishing("apple", "apple inc")
+    assert distinguishing("serena williams", "serena william")
+    assert not distinguishing("univerity of illinois", "university of illinois")
+
+
+def test_find_entity_resolves_variants_without_embedding(chancellors):
+    embedded = []
+    chancellors.entity_vdb.embed = lambda content: embedded.append(content)
+    assert chancellors.find_entity("barbara_wilson").name == "Barbara Wilson"
+    assert chancellors.find_entity("Stanford-University").name == "Stanford University"
+    assert embedded == []
+    assert chancellors.find_relation("Barbara Wilson", "UIUC", "chancellors of").name == "Chancellor_of_Relation"
@@ -0,0 +1,43 @@
+from utils.prompt import PromptBuilder, count_tokens, pack_sentences, render_entity, render_relation, truncate_tokens
+from conftest import entity, relation
+
+
+def test_truncate_tokens():
+    text = "The University of Illinois Urbana-Champaign is a public land-grant research university in Illinois. " * 20
+    assert truncate_tokens("short", 10) == "short"
+    cut = truncate_tokens(text, 20)
+    assert cut.endswith("…") and count_tokens(cut) <= 20
+    assert truncate_tokens(text, 1) == ""
+
+
+def test_builder_keeps_required_parts_and_notes_dropped_items():
+    builder = PromptBuilder(budget=40)
+    builder.add("Question: who?\n", required=True)
+    added = builder.add_items((f"Entity number {i} with a fairly long description" for i in range(50)), prefix="Entities:\n", suffix="\nEnd", reserve=0)
+    prompt = builder.build()
+    assert prompt.startswith("Question: who?\nEntities:\n") and prompt.endswith("\nEnd")
+    assert 0 < added < 50
+    assert f"({50 - added} more left out)" in prompt
+    assert builder.used <= 40 + count_tokens(f"\n({50 - added} more left out)")
+
+
+def test_builder_never_drops_required_parts():
+    builder = PromptBuilder(budget=5)
+    long = "a very long required instruction " * 10
+    builder.add(long, required=True)
+    assert not builder.add("optional")
+    assert builder.build() == long and builder.dropped == 1
+
+
+def test_pack_sentences_keeps_mentions_in_order():
+    text = "Barbara Wilson led UIUC. It rained. Phyllis Wise led UIUC before. Wilson studied at Stanford."
+    assert pack_sentences(text, 100, terms=["UIUC"]) == "Barbara Wilson led UIUC. Phyllis Wise led UIUC before."
+    assert pack_sentences(text, 100, terms=["Wilson", "UIUC"], require_all=True) == "Barbara Wilson led UIUC."
+    assert pack_sentences(text, 8, terms=["UIUC"]) == "Barbara Wilson led UIUC."
+
+
+def test_render_entity_and_relation():
+    uiuc = entity("UIUC", ["organization"], founded="1867")
+    uiuc.description = "a university "
+    assert render_entity(uiuc) == "UIUC (organization): a university [founded: 1867]"
+    assert render_relation(relation("Barbara Wilson", "Chancellor_of_Relation", "UIUC", start_time="2015")) == "Barbara Wilson -[Chancellor of]-> UIUC [start_time: 2015]"
@@ -0,0 +1,57 @@
+import math
+
+from utils.property_index import PropertyIndex, parse_period, periods_overlap, properties_match, property_period, value_matches
+from conftest import relation
+
+
+def test_parse_period():
+    assert parse_period("2015") == (2015.0, 2016 - 1e-6)
+    low, high = parse_period("from September 2015 to 2016")
+    assert low == 2015 + 8 / 12 and high == 2017 - 1e-6
+    assert parse_period("unknown") is None
+
+
+def test_property_period_open_end():
+    assert property_period({"start_time": "2016", "end_time": "present"}) == (2016.0, math.inf)
+    assert property_period({"Start-Time": "2011", "End Time": "2015"}) == (2011.0, 2016 - 1e-6)
+    assert property_period({"color": "red"}) is None
+
+
+def test_value_matches():
+    assert value_matches("  Red ", "red")
+    assert value_matches("2015-09-01", "2015")
+    assert not value_matches("2016-01-01", "2015")
+
+
+def test_periods_overlap_boundary_years():
+    wanted = parse_period("2015-2016")
+    assert not periods_overlap(parse_period("2011-2015"), wanted)
+    assert not periods_overlap((2016.0, math.inf), wanted)
+    assert periods_overlap(parse_period("2015-2016"), wanted)
+    # a period within the wanted one, or the other way around, always overlaps
+    assert periods_overlap(parse_period("2015"), wanted)
+    assert periods_overlap(parse_period("2011-2015"), parse_period("2015"))
+    assert periods_overlap(parse_period("2010-2020"), wanted)
+    assert not periods_overlap(parse_period("2005-2010"), wanted)
+
+
+def test_properties_match():
+    properties = {"start_time": "2015", "end_time": "2016", "Role": "Interim"}
+    assert properties_match(properties, {"during": "2015-2016", "role": "interim"})
+    assert not properties_match(properties, {"role": "permanent"})
+    assert not properties_match(properties, {"during": "2016-2018"})
+    assert not properties_match({"role": "interim"}, {"during": "2015"})
+
+
+def test_candidates_are_a_superset_of_the_matches():
+    items = [relation("A", "r", "B", start_time=start, end_time=end, role=role) for start, end, role in (("2011", "2015", "x"), ("2015", "2016", "y"), ("2016", "present", "x"), ("1990", "1995", "x"))]
+    for id, item in enumerate(items):
+        item.id = id
+    index = PropertyIndex()
+    index.catch_up(items)
+    for filters in ({"during": "2015-2016"}, {"during": "2015"}, {"role": "x"}, {"role": "x", "during": "2000-2020"}, {"start_time": "2015"}):
+        matching = {item.id for item in items if properties_match(item.data_properties, filters)}
+        candidates = index.candidates(filters)
+        assert candidates is None or matching <= candidates, filters
+    assert index.lookup("ROLE", " x ") == [0, 2, 3]
+    assert index.candidates({"role": "x"}, limit=2) == {0}
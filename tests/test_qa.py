@@ -0,0 +1,124 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import qa
+import utils.gpt as gpt
+import utils.cache as cache_module
+from conftest import entity, relation
+from utils.cache import LRUCache
+from utils.call_policy import CallPolicy
+
+
+def test_sub_questions_run_concurrently(chancellors, monkeypatch):
+    graphs = []
+
+    def kg_qa(question, knowledge_graph):
+        graphs.append(knowledge_graph)
+        time.sleep(0.3)
+        return question.upper()
+
+    monkeypatch.setattr(qa, "kg_qa", kg_qa)
+    start = time.time()
+    answers = qa.answer_sub_questions(["a", "b", "c", "d"], chancellors, max_workers=4)
+    assert answers == ["A", "B", "C", "D"]
+    assert time.time() - start < 1.0
+    # all the sub-questions see the same snapshot
+    assert len({id(graph) for graph in graphs}) == 1 and graphs[0] is not chancellors
+
+
+def test_failed_and_slow_sub_questions_get_a_note(chancellors, monkeypatch):
+    def kg_qa(question, knowledge_graph):
+        if question == "fail":
+            raise ValueError("no such entity")
+        if question == "slow":
+            time.sleep(3)
+        return "ok"
+
+    monkeypatch.setattr(qa, "kg_qa", kg_qa)
+    start = time.time()
+    answers = qa.answer_sub_questions(["fail", "slow", "fast"], chancellors, timeout=0.5)
+    assert answers[0].startswith("No answer (failed") and "no such entity" in answers[0]
+    assert answers[1] == "No answer (timed out after 0.5 seconds)"
+    assert answers[2] == "ok"
+    assert time.time() - start < 2.5
+
+
+def test_gpt_calls_of_a_sub_question_stop_at_its_deadline(chancellors, monkeypatch):
+    timeouts = []
+    finished = threading.Event()
+
+    def create(timeout=None, **kwargs):
+        timeouts.append(timeout)
+        time.sleep(timeout)
+        raise TimeoutError("slow model")
+
+    def kg_qa(question, knowledge_graph):
+        try:
+            return qa.gpt_chat([{"role": "user", "content": question}], timeout=30)
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(gpt, "_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(gpt, "call_policy", CallPolicy(backoff=0.0))
+    monkeypatch.setattr(qa, "kg_qa", kg_qa)
+    answers = qa.answer_sub_questions(["slow"], chancellors, timeout=0.5)
+    assert answers[0].startswith("No answer")
+    assert finished.wait(1.0)
+    assert timeouts and max(timeouts) <= 0.5
+
+
+@pytest.fixture
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(qa, "answer_cache", LRUCache(maxsize=16))
+    monkeypatch.setattr(qa, "intermediate_cache", LRUCache(maxsize=16))
+
+
+def test_answers_are_cached_per_graph_version(chancellors, monkeypatch, fresh_caches):
+    calls = []
+    monkeypatch.setattr(qa, "_kg_qa", lambda question, knowledge_graph: calls.append(question) or "Barbara Wilson")
+
+    assert qa.kg_qa("Who is the Chancellor of UIUC?", chancellors) == "Barbara Wilson"
+    assert qa.kg_qa("who is the chancellor of UIUC", chancellors.snapshot()) == "Barbara Wilson"
+    assert len(calls) == 1
+
+    # a write changes the stamp, the cached answer is not used any more
+    chancellors.add_entity(entity("Carol Folt", ["person"]))
+    qa.kg_qa("Who is the Chancellor of UIUC?", chancellors)
+    assert len(calls) == 2
+
+
+def test_intermediates_are_cached_per_graph_version(chancellors, monkeypatch, fresh_caches):
+    searches = []
+    find_path = chancellors.find_path
+    monkeypatch.setattr(chancellors, "find_path", lambda e1, e2: searches.append((e1.name, e2.name)) or find_path(e1, e2))
+
+    wise = qa.resolve_entity(chancellors, "Phyllis Wise")
+    uiuc = qa.resolve_entity(chancellors, "UIUC")
+    assert [r.name for r in qa.cached_path(chancellors, wise, uiuc)] == ["Chancellor_of_Relation"]
+    assert [r.name for r in qa.cached_path(chancellors, wise, uiuc)] == ["Chancellor_of_Relation"]
+    assert qa.resolve_entity(chancellors, "Phyllis Wise") is wise
+    assert len(searches) == 1
+
+    chancellors.add_relation(relation("Phyllis Wise", "Lives_in_Relation", "UIUC"))
+    qa.cached_path(chancellors, wise, uiuc)
+    assert len(searches) == 2
+
+    # no path is cached too
+    stanford = qa.resolve_entity(chancellors, "Stanford University")
+    assert qa.cached_path(chancellors, stanford, wise) is None
+    assert qa.cached_path(chancellors, stanford, wise) is None
+    assert len(searches) == 3
+
+
+def test_lru_cache_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=4, ttl=10)
+    cache.put("a", 1)
+    now[0] += 5
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None and len(cache) == 0
@@ -0,0 +1,87 @@
+import io
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import qa_server
+import utils.gpt as gpt
+from utils.batching import Batcher
+from utils.vdb import VDB
+
+
+def test_serve_answers_every_line(chancellors, monkeypatch):
+    def answer_question(question, knowledge_graph):
+        if question == "boom":
+            raise ValueError("boom")
+        time.sleep(0.05)
+        return question[::-1]
+
+    monkeypatch.setattr(qa_server, "answer_question", answer_question)
+    lines = ['{"id": "a", "question": "abc"}\n', "\n", '{"question": "boom"}\n', "not json\n", '{"id": 7, "question": "xyz"}\n']
+    out = io.StringIO()
+    latencies = qa_server.serve(chancellors, lines, out, workers=4)
+
+    results = {result["id"]: result for result in map(json.loads, out.getvalue().splitlines())}
+    assert len(latencies) == 4
+    assert results["a"]["answer"] == "cba" and results[7]["answer"] == "zyx"
+    assert "boom" in results[2]["error"] and "error" in results[3]
+    assert all(result["latency"] >= 0 for result in results.values())
+
+
+def test_batcher_coalesces_concurrent_calls():
+    batches = []
+
+    def process(items):
+        batches.append(len(items))
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [item * 2 for item in items]
+
+    batcher = Batcher(process, max_batch=8, max_wait=0.05)
+    results = dict()
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.submit(i))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: 2 * i for i in range(8)}
+    assert len(batches) < 8 and batcher.stats()["items"] == 8
+    with pytest.raises(ValueError):
+        batcher.submit("bad")
+
+
+def test_batched_vdb_queries_match_direct_ones():
+    rng = np.random.default_rng(0)
+    vdb = VDB(None)
+    vectors = rng.standard_normal((100, 16))
+    vdb.insert_index({i: vector for i, vector in enumerate(vectors)})
+    expected = [vdb.query_best(vector, 0.5) for vector in vectors[:10]]
+    vdb.enable_batching(max_batch=4, max_wait=0.01)
+    results = [None] * 10
+
+    def query(i):
+        results[i] = vdb.query_best(vectors[i], 0.5)
+
+    threads = [threading.Thread(target=query, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [result["id"] for result in results] == [match["id"] for match in expected]
+    assert vdb.batcher.stats()["items"] == 10
+
+
+def test_batched_embeddings_make_one_request_per_engine(monkeypatch):
+    requests = []
+
+    def gpt3_embeddings(contents, engine="text-embedding-ada-002"):
+        requests.append((engine, list(contents)))
+        return [[float(len(content))] for content in contents]
+
+    monkeypatch.setattr(gpt, "gpt3_embeddings", gpt3_embeddings)
+    results = gpt.batched_embeddings([("a", "small"), ("bb", "large"), ("ccc", "small")])
+    assert results == [[1.0], [2.0], [3.0]]
+    assert sorted(requests) == [("large", ["bb"]), ("small", ["a", "ccc"])]
@@ -0,0 +1,55 @@
+from conftest import relation
+
+
+def names(results, variable="?x"):
+    return sorted(result[variable].name for result in results)
+
+
+def test_single_pattern(chancellors):
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC")])) == ["Barbara Wilson", "Phyllis Wise", "Robert Jones"]
+
+
+def test_relation_name_variations(chancellors):
+    assert names(chancellors.query([("?x", "chancellor of", "UIUC")])) == ["Barbara Wilson", "Phyllis Wise", "Robert Jones"]
+    assert names(chancellors.query([("?x", "Chancellor_of_Relation", "UIUC")])) == ["Barbara Wilson", "Phyllis Wise", "Robert Jones"]
+
+
+def test_join(chancellors):
+    results = chancellors.query([("?x", "Chancellor_of", "UIUC"), ("?x", "Studied_at", "?y")])
+    assert [(result["?x"].name, result["?y"].name) for result in results] == [("Barbara Wilson", "Stanford University")]
+
+
+def test_relation_variable(chancellors):
+    results = chancellors.query([("Barbara Wilson", "?r", "?y")])
+    assert sorted((result["?r"].name, result["?y"].name) for result in results) == [("Chancellor_of_Relation", "UIUC"), ("Studied_at_Relation", "Stanford University")]
+
+
+def test_property_filter(chancellors):
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC", {"Start Time": "2015"})])) == ["Barbara Wilson"]
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC", {"end_time": "Present"})])) == ["Robert Jones"]
+    assert chancellors.query([("?x", "Chancellor_of", "UIUC", {"start_time": "201"})]) == []
+
+
+def test_during_excludes_boundary_years(chancellors):
+    # the predecessor ended and the successor started in the boundary years of the period
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC", {"during": "2015-2016"})])) == ["Barbara Wilson"]
+
+
+def test_during_single_year_and_wide_period(chancellors):
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC", {"during": "2015"})])) == ["Barbara Wilson", "Phyllis Wise"]
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC", {"during": "2010-2020"})])) == ["Barbara Wilson", "Phyllis Wise", "Robert Jones"]
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC", {"during": "2018"})])) == ["Robert Jones"]
+    assert chancellors.query([("?x", "Chancellor_of", "UIUC", {"during": "2005"})]) == []
+
+
+def test_unknown_constant_has_no_results(chancellors):
+    assert chancellors.query([("?x", "Chancellor_of", "Massachusetts Institute of Technology")]) == []
+
+
+def test_limit(chancellors):
+    assert len(chancellors.query([("?x", "Chancellor_of", "UIUC")], limit=2)) == 2
+
+
+def test_sees_later_relations(chancellors):
+    chancellors.add_relation(relation("Robert Jones", "Studied_at_Relation", "Stanford University"))
+    assert names(chancellors.query([("?x", "Chancellor_of", "UIUC"), ("?x", "Studied_at", "Stanford University")])) == ["Barbara Wilson", "Robert Jones"]
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import utils.kg_gen as kg_gen
+from utils.cache import LRUCache, normalize_question
+
+
+@pytest.fixture
+def router(monkeypatch):
+    calls = []
+
+    def gpt_chat(messages, **kwargs):
+        calls.append(messages)
+        return "Here it is: " + json.dumps({
+            "type": "Entity", "sub_type": None, "is_number": False,
+            "statement": "[ENTITY] is the Chancellor of UIUC at 2015-2016.",
+            "entities": [{"name": "UIUC", "description": "a university", "types": ["organization"]}, {"description": "no name"}],
+        })
+
+    monkeypatch.setattr(kg_gen, "gpt_chat", gpt_chat)
+    monkeypatch.setattr(kg_gen, "router_cache", LRUCache())
+    return calls
+
+
+def test_route_question_parses_one_call(router):
+    decision = kg_gen.route_question("Who is the Chancellor of UIUC from 2015-2016?")
+    assert decision["type"] == "entity" and decision["sub_type"] is None and decision["is_number"] is False
+    assert decision["statement"].startswith("[ENTITY]")
+    entities = kg_gen.routed_entities(decision)
+    assert [(e.name, e.types) for e in entities] == [("UIUC", ["organization"])]
+    assert len(router) == 1
+
+
+def test_route_question_is_cached_by_normalized_question(router):
+    kg_gen.route_question("Who is the Chancellor of UIUC from 2015-2016?")
+    kg_gen.route_question("  who is the chancellor of UIUC   from 2015-2016 ")
+    assert len(router) == 1
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert normalize_question(" Who  is it? ") == "who is it"
+
+
+def test_routed_patterns():
+    assert kg_gen.routed_patterns([["?x", "Chancellor_of", "UIUC", {"start_time": 2015}]]) == [("?x", "Chancellor_of", "UIUC", {"start_time": "2015"})]
+    assert kg_gen.routed_patterns([["?x", "Chancellor_of", "UIUC"]]) == [("?x", "Chancellor_of", "UIUC", {})]
+    assert kg_gen.routed_patterns([["?x", "Chancellor_of"]]) is None
+    assert kg_gen.routed_patterns([]) is None and kg_gen.routed_patterns(None) is None
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from utils.vdb import VDB
+
+
+def _pair(rows: int=3000, dimension: int=16):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((rows, dimension)).astype(np.float32)
+    plain, sharded = VDB(None), VDB(None)
+    for vdb in (plain, sharded):
+        vdb.insert_index({i: vectors[i] for i in range(rows)})
+    sharded.enable_sharding(processes=2, num_shards=3, min_rows=100)
+    queries = [vectors[i] + 0.1 * rng.standard_normal(dimension) for i in (0, 1500, 2999)]
+    return plain, sharded, queries
+
+
+def _ids(matches):
+    return [match["id"] for match in matches]
+
+
+@pytest.fixture
+def vdbs():
+    plain, sharded, queries = _pair()
+    yield plain, sharded, queries
+    if sharded.sharded is not None:
+        sharded.sharded.close()
+
+
+def test_sharded_scans_match_the_in_process_ones(vdbs):
+    plain, sharded, queries = vdbs
+    for query in queries:
+        assert _ids(sharded.query_index(query, 10)) == _ids(plain.query_index(query, 10))
+        assert sharded.query_best(query, 0.5) == pytest.approx(plain.query_best(query, 0.5))
+        assert sorted(_ids(sharded.query_range(query, 0.6))) == sorted(_ids(plain.query_range(query, 0.6)))
+    assert _ids(sharded.query_best_batch(queries, 0.5)) == _ids(plain.query_best_batch(queries, 0.5))
+    assert sharded.sharded is not None
+
+
+def test_rows_added_after_the_pool_started_are_scored(vdbs):
+    plain, sharded, queries = vdbs
+    sharded.query_index(queries[0], 1)
+    extra = np.asarray(queries[1], dtype=np.float32)
+    for vdb in (plain, sharded):
+        vdb.insert_index({"extra": extra})
+    assert sharded.query_best(queries[1], 0.5)["id"] == "extra"
+    assert _ids(sharded.query_index(queries[1], 5)) == _ids(plain.query_index(queries[1], 5))
+    # a snapshot ignores rows beyond its size
+    snapshot = sharded.snapshot()
+    sharded.insert_index({"later": extra})
+    assert "later" not in _ids(snapshot.query_index(queries[1], 5))
@@ -0,0 +1,65 @@
+import threading
+
+from conftest import entity, make_graph, relation
+
+
+def test_snapshot_doesnt_see_later_writes(chancellors):
+    snapshot = chancellors.snapshot()
+    stamp = snapshot.stamp()
+    chancellors.add_entity(entity("Carol Folt", ["person"]))
+    chancellors.add_relation(relation("Carol Folt", "Chancellor_of_Relation", "UIUC", start_time="2009", end_time="2011"))
+    chancellors.add_relation(relation("Barbara Wilson", "Lives_in_Relation", "UIUC"))
+
+    assert len(snapshot.entity_list) == 5 and len(snapshot.relations) == 4
+    assert "Carol Folt" not in snapshot.entities
+    assert len(snapshot.entity_vdb) == 5
+    assert [r.name for r in snapshot.out_relations(snapshot.entities["Barbara Wilson"])] == ["Chancellor_of_Relation", "Studied_at_Relation"]
+    assert snapshot.version < chancellors.version
+    assert snapshot.stamp() == stamp and chancellors.stamp() != stamp
+
+    assert chancellors.find_entity("Carol Folt").name == "Carol Folt"
+    assert len(chancellors.out_relations(chancellors.entities["Barbara Wilson"])) == 3
+
+
+def test_snapshot_survives_compaction(chancellors):
+    snapshot = chancellors.snapshot()
+    chancellors.add_relation(relation("Barbara Wilson", "Lives_in_Relation", "UIUC"))
+    chancellors.compact()
+    assert len(snapshot.out_relations(snapshot.entities["Barbara Wilson"])) == 2
+
+
+def test_snapshot_is_read_only(chancellors):
+    snapshot = chancellors.snapshot()
+    try:
+        snapshot.add_entity(entity("Carol Folt"))
+    except Exception as oops:
+        assert "read-only" in str(oops)
+    else:
+        raise AssertionError("a snapshot accepted a write")
+    assert "Carol Folt" not in chancellors.entities
+
+
+def test_snapshots_stay_consistent_under_concurrent_writes():
+    graph = make_graph()
+    graph.add_entity(entity("Hub"))
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set() and i < 300:
+            graph.add_entity(entity(f"Node {i}"))
+            graph.add_relation(relation("Hub", "Links_Relation", f"Node {i}"))
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(50):
+            snapshot = graph.snapshot()
+            relations = snapshot.out_relations(snapshot.entities["Hub"])
+            # every relation the snapshot counts is visible, none added after it is
+            assert len(relations) == len(snapshot.relations)
+            assert all(snapshot.entities[r.tail_entity].id < len(snapshot.entity_list) for r in relations)
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,102 @@
+import json
+import threading
+
+import numpy as np
+
+import utils.vdb as vdb_module
+from utils.vdb import VDB
+
+
+def clustered_vdb(rows: int=VDB.COARSE_MIN_ROWS + 1000, dimension: int=32, seed: int=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((50, dimension))
+    vectors = (centers[rng.integers(0, len(centers), rows)] + 0.05 * rng.standard_normal((rows, dimension))).astype(np.float32)
+    vdb = VDB(None)
+    vdb.insert_index({i: vectors[i] for i in range(rows)})
+    queries = [center + 0.05 * rng.standard_normal(dimension) for center in centers[:10]]
+    return vdb, vectors, queries
+
+
+def test_range_and_best_on_a_small_database():
+    vdb = VDB(None)
+    vdb.insert_index({0: [1.0, 0.0], 1: [0.8, 0.6], 2: [0.0, 1.0]})
+    assert [match["id"] for match in vdb.query_range([1.0, 0.1], 0.5)] == ["0", "1"]
+    assert vdb.query_best([0.1, 1.0], 0.9)["id"] == "2"
+    assert vdb.query_best([1.0, -1.0], 0.9) is None
+    assert VDB(None).query_best([1.0, 0.0], 0.5) is None
+
+
+def test_pruned_queries_agree_with_a_full_scan():
+    vdb, vectors, queries = clustered_vdb()
+    unit = vectors / np.linalg.norm(vectors, axis=1)[:, None]
+    # rows inserted after the coarse index was built are scanned as well
+    extra = queries[0] / np.linalg.norm(queries[0])
+    for query in queries:
+        assert vdb._pruned_clusters(vdb._unit(query), 0.95, vdb.size) is not None
+        scores = unit @ (query / np.linalg.norm(query))
+        best = vdb.query_best(query, 0.95)
+        assert abs(best["score"] - scores.max()) < 1e-5
+        assert len(vdb.query_range(query, 0.95)) == int((scores >= 0.95).sum())
+    vdb.insert_index({"extra": extra})
+    assert vdb.query_best(queries[0], 0.95)["id"] == "extra"
+    assert "extra" in [match["id"] for match in vdb.query_range(queries[0], 0.999)]
+
+
+def test_queries_survive_concurrent_updates():
+    vdb, vectors, queries = clustered_vdb(seed=1)
+    errors = []
+    stop = threading.Event()
+
+    def writer():
+        # updating an existing id drops the coarse index
+        rng = np.random.default_rng(2)
+        while not stop.is_set():
+            vdb.insert_index({int(rng.integers(0, len(vectors))): vectors[0]})
+
+    def reader():
+        try:
+            for _ in range(20):
+                for query in queries:
+                    vdb.query_best(query, 0.95)
+                    vdb.query_range(query, 0.95)
+        except Exception as oops:
+            errors.append(oops)
+
+    writers = [threading.Thread(target=writer) for _ in range(2)]
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    stop.set()
+    for thread in writers:
+        thread.join()
+    assert errors == []
+
+
+def test_updates_dont_change_snapshots():
+    vdb = VDB(None)
+    vdb.insert_index({0: [1.0, 0.0], 1: [0.0, 1.0]})
+    assert vdb.query_best([1.0, 0.0], 0.9)["id"] == "0"
+    snapshot = vdb.snapshot()
+    vdb.insert_index({0: [0.0, 2.0]})
+    assert list(snapshot.query_id(0)) == [1.0, 0.0]
+    assert snapshot.query_best([1.0, 0.0], 0.9) == {"id": "0", "score": 1.0}
+    assert list(vdb.query_id(0)) == [0.0, 2.0]
+    assert vdb.query_best([1.0, 0.0], 0.9) is None
+
+
+def test_json_file_is_written_at_most_every_save_interval(tmp_path, monkeypatch):
+    path = tmp_path / "vdb.json"
+    monkeypatch.setattr(VDB, "SAVE_INTERVAL", 3600.0)
+    vdb = VDB(str(path))
+    vdb.insert_index({0: [1.0, 0.0]})
+    vdb.insert_index({1: [0.0, 1.0]})
+    assert json.loads(path.read_text()) == {}
+    vdb.flush()
+    assert json.loads(path.read_text()) == {"0": [1.0, 0.0], "1": [0.0, 1.0]}
+
+    # the inserts left unwritten are written at exit
+    vdb.insert_index({2: [1.0, 1.0]})
+    vdb_module._flush_all()
+    assert VDB(str(path), empty_db=False).ids == ["0", "1", "2"]
@@ -0,0 +1,52 @@
+import json
+
+from conftest import entity, make_graph, relation
+
+
+def _star(leaves: int):
+    graph = make_graph()
+    graph.add_entity(entity("Hub"))
+    for i in range(leaves):
+        graph.add_entity(entity(f"Leaf {i}"))
+        graph.add_relation(relation("Hub", "Links_Relation", f"Leaf {i}"))
+    graph.add_entity(entity("Island"))
+    return graph
+
+
+def test_visualization_is_bounded(tmp_path):
+    graph = _star(50)
+    graph.visualize(str(tmp_path / "graph.json"), max_nodes=10)
+    with open(tmp_path / "graph.json") as f:
+        rendered = json.load(f)
+    assert len(rendered["nodes"]) == 10
+    # the highest degree entity is always in the sample, every edge is between sampled nodes
+    assert "Hub" in [node["label"] for node in rendered["nodes"]]
+    ids = {node["id"] for node in rendered["nodes"]}
+    assert len(rendered["edges"]) == 9
+    assert all(edge["from"] in ids and edge["to"] in ids for edge in rendered["edges"])
+
+
+def test_neighbourhood_of_entities(chancellors, tmp_path):
+    chancellors.visualize(str(tmp_path / "graph.json"), entities=["Barbara Wilson"], hops=1, layout="circular")
+    with open(tmp_path / "graph.json") as f:
+        rendered = json.load(f)
+    assert sorted(node["label"] for node in rendered["nodes"]) == ["Barbara Wilson", "Stanford University", "UIUC"]
+    assert all("x" in node and "y" in node for node in rendered["nodes"])
+
+
+def test_html_output(chancellors, tmp_path):
+    chancellors.visualize(str(tmp_path / "graph.html"))
+    with open(tmp_path / "graph.html") as f:
+        html = f.read()
+    assert html.count("new vis.DataSet(") == 2
+    assert "Phyllis Wise" in html and html.rstrip().endswith("</html>")
+
+
+def test_names_cant_close_the_script_element(tmp_path):
+    graph = make_graph()
+    graph.add_entity(entity("</script><script>alert(1)</script>"))
+    graph.visualize(str(tmp_path / "graph.html"))
+    with open(tmp_path / "graph.html") as f:
+        html = f.read()
+    assert html.count("</script>") == 2
+    assert "<\\/script><script>alert(1)<\\/script>" in html
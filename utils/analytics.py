@@ -0,0 +1,187 @@
+"""
+Whole-graph analytics over CSR arrays of entity ids: in/out degree, weakly connected components and
+PageRank, computed with vectorized NumPy. A KnowledgeGraph caches one GraphAnalytics per version (see
+KnowledgeGraph.analytics), each metric being computed on first use.
+"""
+from typing import Optional, Tuple
+import numpy as np
+
+
+def edge_arrays(knowledge_graph) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Head and tail entity ids of every relation of the graph, read from the CSR edge store if it is built
+
+    Parameters:
+    knowledge_graph (KnowledgeGraph): the graph (or a snapshot)
+
+    Returns:
+    (np.ndarray, np.ndarray): head ids and tail ids, one per relation
+    """
+    num_relations = len(knowledge_graph.relations)
+    store = knowledge_graph.edge_store
+    if store is not None:
+        heads = [np.repeat(np.arange(store.num_nodes, dtype=np.int64), np.diff(store.indptr))]
+        tails = [store.tails.astype(np.int64)]
+        relation_ids = [store.relation_ids.astype(np.int64)]
+        for head, edges in list(store.overflow.items()):
+            heads.append(np.full(len(edges), head, dtype=np.int64))
+            tails.append(np.array([tail for tail, _ in edges], dtype=np.int64))
+            relation_ids.append(np.array([relation_id for _, relation_id in edges], dtype=np.int64))
+        heads, tails, relation_ids = np.concatenate(heads), np.concatenate(tails), np.concatenate(relation_ids)
+        # a snapshot only sees the relations it counts
+        visible = relation_ids < num_relations
+        return heads[visible], tails[visible]
+    entities = knowledge_graph.entities
+    heads = np.empty(num_relations, dtype=np.int64)
+    tails = np.empty(num_relations, dtype=np.int64)
+    for i in range(num_relations):
+        relation = knowledge_graph.relations[i]
+        heads[i] = entities[relation.head_entity].id
+        tails[i] = entities[relation.tail_entity].id
+    return heads, tails
+
+
+def to_csr(num_nodes: int, heads: np.ndarray, tails: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    CSR form of directed edges: the successors of node i are indices[indptr[i]:indptr[i + 1]]
+
+    Parameters:
+    num_nodes (int): number of nodes
+    heads (np.ndarray): source of each edge
+    tails (np.ndarray): target of each edge
+
+    Returns:
+    (np.ndarray, np.ndarray): indptr and indices
+    """
+    order = np.argsort(heads, kind='stable')
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(heads, minlength=num_nodes), out=indptr[1:])
+    return indptr, tails[order]
+
+
+def connected_components(num_nodes: int, heads: np.ndarray, tails: np.ndarray) -> np.ndarray:
+    """
+    Weakly connected components by min-label propagation with pointer jumping
+
+    Parameters:
+    num_nodes (int): number of nodes
+    heads (np.ndarray): source of each edge
+    tails (np.ndarray): target of each edge
+
+    Returns:
+    np.ndarray: component label of each node, the smallest node id of its component
+    """
+    labels = np.arange(num_nodes, dtype=np.int64)
+    while True:
+        previous = labels.copy()
+        edge_min = np.minimum(labels[heads], labels[tails])
+        np.minimum.at(labels, heads, edge_min)
+        np.minimum.at(labels, tails, edge_min)
+        # hook every label to the label of its label until they are roots
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def pagerank(num_nodes: int, heads: np.ndarray, tails: np.ndarray, damping: float=0.85, tolerance: float=1e-8, max_iterations: int=100) -> np.ndarray:
+    """
+    PageRank by power iteration, the rank of nodes without outgoing edges is spread over all nodes
+
+    Parameters:
+    num_nodes (int): number of nodes
+    heads (np.ndarray): source of each edge
+    tails (np.ndarray): target of each edge
+    damping (float): probability of following an edge rather than jumping to a random node
+    tolerance (float): stop when the L1 change of the ranks is below it
+    max_iterations (int): maximum number of iterations
+
+    Returns:
+    np.ndarray: rank of each node, summing to 1
+    """
+    if num_nodes == 0:
+        return np.zeros(0)
+    out_degree = np.bincount(heads, minlength=num_nodes).astype(np.float64)
+    dangling = out_degree == 0
+    inverse_degree = np.divide(1.0, out_degree, out=np.zeros(num_nodes), where=~dangling)
+    rank = np.full(num_nodes, 1.0 / num_nodes)
+    for _ in range(max_iterations):
+        spread = np.bincount(tails, weights=(rank * inverse_degree)[heads], minlength=num_nodes)
+        updated = damping * spread + (damping * rank[dangling].sum() + 1.0 - damping) / num_nodes
+        change = np.abs(updated - rank).sum()
+        rank = updated
+        if change < tolerance:
+            break
+    return rank
+
+
+class GraphAnalytics:
+    """
+    Degrees, components and PageRank of one version of a graph, computed lazily from its edge arrays
+    """
+    def __init__(self, knowledge_graph):
+        self.stamp: tuple = knowledge_graph.stamp()
+        self.num_nodes: int = len(knowledge_graph.entity_list)
+        self.heads, self.tails = edge_arrays(knowledge_graph)
+        self._csr: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._components: Optional[np.ndarray] = None
+        self._pagerank: Optional[np.ndarray] = None
+
+    @property
+    def csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (indptr, indices) of the successors of every entity
+        """
+        if self._csr is None:
+            self._csr = to_csr(self.num_nodes, self.heads, self.tails)
+        return self._csr
+
+    @property
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.csr[0])
+
+    @property
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.tails, minlength=self.num_nodes)
+
+    @property
+    def degree(self) -> np.ndarray:
+        return self.out_degree + self.in_degree
+
+    @property
+    def components(self) -> np.ndarray:
+        """
+        Weakly connected component of every entity, labelled by its smallest entity id
+        """
+        if self._components is None:
+            self._components = connected_components(self.num_nodes, self.heads, self.tails)
+        return self._components
+
+    @property
+    def num_components(self) -> int:
+        return len(np.unique(self.components))
+
+    @property
+    def pagerank(self) -> np.ndarray:
+        if self._pagerank is None:
+            self._pagerank = pagerank(self.num_nodes, self.heads, self.tails)
+        return self._pagerank
+
+    def by_importance(self) -> np.ndarray:
+        """
+        Entity ids by decreasing PageRank
+        """
+        return np.argsort(-self.pagerank, kind='stable')
+
+    def traversal_roots(self) -> np.ndarray:
+        """
+        Entity ids in the order a traversal following relations forwards should start from them to reach
+        every component: the entities no relation points to (nothing else reaches them) by decreasing
+        PageRank, then all the others by decreasing PageRank
+        """
+        order = self.by_importance()
+        sources = self.in_degree[order] == 0
+        return np.concatenate([order[sources], order[~sources]])
@@ -0,0 +1,72 @@
+"""
+Coalescing of concurrent calls: threads submit single items and block, a collector thread groups the
+items that arrive within a short window into one batch call (one embedding request, one matrix product)
+"""
+from typing import Any, Callable, List
+from concurrent.futures import Future, ThreadPoolExecutor
+import queue
+import threading
+import time
+
+
+class Batcher:
+    """
+    Groups items submitted concurrently into batches of at most max_batch items. A batch is sent when it
+    is full or max_wait seconds after its first item arrived. At most max_in_flight batches are processed
+    at the same time.
+    """
+    def __init__(self, process: Callable[[List[Any]], List[Any]], max_batch: int=64, max_wait: float=0.005, max_in_flight: int=4, name: str="batcher"):
+        self.process: Callable[[List[Any]], List[Any]] = process
+        self.max_batch: int = max_batch
+        self.max_wait: float = max_wait
+        self.name: str = name
+        # number of batches and items processed, for monitoring the average batch size
+        self.batches: int = 0
+        self.items: int = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=name)
+        self._collector = threading.Thread(target=self._collect, name=f"{name}-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, item: Any) -> Any:
+        """
+        Process one item as part of a batch, blocks until its result is available
+
+        Parameters:
+        item (Any): the item
+
+        Returns:
+        Any: its result
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: list) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = self.process([item for item, _ in batch])
+        except BaseException as oops:
+            for _, future in batch:
+                future.set_exception(oops)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {"name": self.name, "batches": self.batches, "items": self.items, "average_batch": self.items / max(self.batches, 1)}
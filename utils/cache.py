@@ -0,0 +1,72 @@
+"""
+Small in-memory caches shared by the question-answering code
+"""
+from typing import Any, Hashable, Optional
+from collections import OrderedDict
+import threading
+import time
+from utils.normalize import normalize_spaces
+
+
+def normalize_question(question: str) -> str:
+    """
+    Cache key of a question: lower case, single spaces, no surrounding punctuation
+
+    Parameters:
+    question (str): the question
+
+    Returns:
+    str: the normalized question
+    """
+    return normalize_spaces(question).strip(' ?!.')
+
+
+class LRUCache:
+    """
+    Thread-safe mapping that keeps the maxsize most recently used entries, each for at most ttl seconds
+    if a ttl is given
+    """
+    def __init__(self, maxsize: int=256, ttl: Optional[float]=None):
+        self.maxsize: int = maxsize
+        self.ttl: Optional[float] = ttl
+        # key -> (expiry time or None, value)
+        self.entries: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any=None) -> Any:
+        """
+        Value stored for the key, default if there is none
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if the cache is full
+        """
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl if self.ttl is not None else None, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
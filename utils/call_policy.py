@@ -0,0 +1,265 @@
+"""
+Latency-aware policy for remote calls (LLM completions, embeddings). Per key (the model), it keeps a
+window of recent latencies and derives from them:
+- the timeout of an attempt, a multiple of the p95 latency (the default timeout until enough calls were
+  seen), doubled at every retry;
+- the hedging delay: a call still running after the p95 latency (or a fixed delay) is sent a second
+  time, and whichever copy answers first is used. Hedges are capped to a fraction of the calls, so they
+  cost a few percent more requests while cutting the tail.
+Failed attempts are retried with jittered exponential backoff, except for errors a retry can't fix
+(bad request, authentication). A call given a deadline cuts its attempts short at the deadline and isn't
+retried past it.
+"""
+from typing import Any, Callable, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import random
+import threading
+import time
+import numpy as np
+
+
+class _KeyStats:
+    def __init__(self, window: int):
+        self.latencies: deque = deque(maxlen=window)
+        self.calls: int = 0
+        self.failures: int = 0
+        self.retries: int = 0
+        self.timeouts: int = 0
+        self.hedges: int = 0
+        self.hedge_wins: int = 0
+
+
+class CallPolicy:
+    """
+    Timeouts, hedging and retries of the calls made with call(), shared by all threads
+    """
+    def __init__(
+        self,
+        default_timeout: float=60.0,
+        min_timeout: float=5.0,
+        max_timeout: float=120.0,
+        timeout_factor: float=3.0,
+        timeout_quantile: float=95,
+        hedge_quantile: Optional[float]=95,
+        hedge_delay: Optional[float]=None,
+        hedge_budget: float=0.1,
+        max_retry: int=5,
+        backoff: float=0.5,
+        max_backoff: float=8.0,
+        window: int=256,
+        min_samples: int=20,
+        max_workers: int=64,
+        verbose: bool=False
+    ):
+        """
+        Parameters:
+        default_timeout (float): timeout of an attempt until min_samples latencies of its key were seen
+        min_timeout, max_timeout (float): bounds of the adaptive timeout
+        timeout_factor (float): the timeout is this multiple of the timeout_quantile latency
+        timeout_quantile (float): percentile of the latencies the timeout is based on
+        hedge_quantile (float or None): hedge calls running longer than this percentile of the latencies,
+            None disables hedging unless hedge_delay is given
+        hedge_delay (float or None): fixed hedging delay in seconds, overrides hedge_quantile
+        hedge_budget (float): at most this fraction of the calls of a key are hedged
+        max_retry (int): attempts before giving up
+        backoff, max_backoff (float): sleep before the first retry and maximum sleep, doubled every retry
+        window (int): number of recent latencies kept per key
+        min_samples (int): latencies needed before the timeout and hedging delay adapt
+        max_workers (int): threads running hedged calls
+        verbose (bool): print every failed attempt that is retried, they are only counted in stats() otherwise
+        """
+        self.default_timeout: float = default_timeout
+        self.min_timeout: float = min_timeout
+        self.max_timeout: float = max_timeout
+        self.timeout_factor: float = timeout_factor
+        self.timeout_quantile: float = timeout_quantile
+        self.hedge_quantile: Optional[float] = hedge_quantile
+        self.hedge_delay: Optional[float] = hedge_delay
+        self.hedge_budget: float = hedge_budget
+        self.max_retry: int = max_retry
+        self.backoff: float = backoff
+        self.max_backoff: float = max_backoff
+        self.window: int = window
+        self.min_samples: int = min_samples
+        self.max_workers: int = max_workers
+        self.verbose: bool = verbose
+        self._stats: Dict[str, _KeyStats] = dict()
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _key_stats(self, key: str) -> _KeyStats:
+        with self._lock:
+            if not key in self._stats:
+                self._stats[key] = _KeyStats(self.window)
+            return self._stats[key]
+
+    def _quantile(self, key: str, quantile: float) -> Optional[float]:
+        latencies = list(self._key_stats(key).latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        return float(np.percentile(latencies, quantile))
+
+    def timeout(self, key: str) -> float:
+        """
+        Timeout of a first attempt of a call of the key, in seconds
+        """
+        latency = self._quantile(key, self.timeout_quantile)
+        if latency is None:
+            return self.default_timeout
+        return min(max(latency * self.timeout_factor, self.min_timeout), self.max_timeout)
+
+    def hedging_delay(self, key: str) -> Optional[float]:
+        """
+        Seconds after which a call of the key is sent again, None if it isn't hedged
+        """
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if self.hedge_quantile is None:
+            return None
+        return self._quantile(key, self.hedge_quantile)
+
+    def _record(self, key: str, seconds: float, timed_out: bool=False) -> None:
+        stats = self._key_stats(key)
+        with self._lock:
+            stats.latencies.append(seconds)
+            if timed_out:
+                stats.timeouts += 1
+
+    def _timed(self, key: str, request: Callable[[float], Any], timeout: float) -> Any:
+        start = time.monotonic()
+        try:
+            result = request(timeout)
+        except Exception:
+            elapsed = time.monotonic() - start
+            if elapsed >= timeout:
+                # a timeout is a latency of at least timeout, keeping it lets the timeout grow
+                self._record(key, elapsed, timed_out=True)
+            raise
+        self._record(key, time.monotonic() - start)
+        return result
+
+    def _take_hedge(self, key: str) -> bool:
+        stats = self._key_stats(key)
+        with self._lock:
+            if stats.hedges + 1 > self.hedge_budget * stats.calls:
+                return False
+            stats.hedges += 1
+            return True
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hedged-call")
+            return self._pool
+
+    def _attempt(self, key: str, request: Callable[[float], Any], timeout: float) -> Any:
+        """
+        One attempt, hedged if it runs longer than the hedging delay
+        """
+        delay = self.hedging_delay(key)
+        if delay is None or delay >= timeout:
+            return self._timed(key, request, timeout)
+
+        pool = self._executor()
+        deadline = time.monotonic() + timeout
+        primary = pool.submit(self._timed, key, request, timeout)
+        done, _ = wait([primary], timeout=delay)
+        pending = {primary}
+        hedge = None
+        if len(done) == 0 and self._take_hedge(key):
+            hedge = pool.submit(self._timed, key, request, timeout)
+            pending.add(hedge)
+            deadline += delay
+        error = None
+        while len(pending) != 0:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if len(done) == 0:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        stats = self._key_stats(key)
+                        with self._lock:
+                            stats.hedge_wins += 1
+                    # the other copy can't be interrupted, it finishes in the background
+                    return future.result()
+                error = future.exception()
+        if error is not None and len(pending) == 0:
+            raise error
+        raise TimeoutError(f"no response within {timeout:.1f} seconds")
+
+    @staticmethod
+    def retryable(error: Exception) -> bool:
+        """
+        Whether a retry can fix the error: client errors (HTTP 4xx) other than timeouts, conflicts and
+        rate limits can't
+        """
+        status = getattr(error, 'status_code', None)
+        return not (isinstance(status, int) and 400 <= status < 500 and not status in (408, 409, 429))
+
+    def call(self, key: str, request: Callable[[float], Any], timeout: Optional[float]=None, deadline: Optional[float]=None) -> Any:
+        """
+        Make a call with the policy of its key
+
+        Parameters:
+        key (str): what the latencies are tracked by, e.g. the model
+        request (Callable[[float], Any]): makes one request given its timeout in seconds
+        timeout (float or None): timeout of the first attempt, None adapts it to the latencies of the key
+        deadline (float or None): time.monotonic() time after which no attempt runs
+
+        Returns:
+        Any: result of the first request that succeeded
+
+        Raises:
+        TimeoutError: the last attempt timed out, or the deadline passed
+        Exception: the error of the last attempt, or the first error that can't be retried
+        """
+        stats = self._key_stats(key)
+        with self._lock:
+            stats.calls += 1
+        attempt = 0
+        while True:
+            attempt_timeout = min((timeout if timeout is not None else self.timeout(key)) * 2 ** attempt, max(self.max_timeout, timeout or 0))
+            if deadline is not None:
+                if deadline <= time.monotonic():
+                    with self._lock:
+                        stats.failures += 1
+                    raise TimeoutError(f"deadline passed after {attempt} attempts")
+                attempt_timeout = min(attempt_timeout, deadline - time.monotonic())
+            try:
+                return self._attempt(key, request, attempt_timeout)
+            except Exception as oops:
+                attempt += 1
+                if attempt >= self.max_retry or not self.retryable(oops):
+                    with self._lock:
+                        stats.failures += 1
+                    raise
+                with self._lock:
+                    stats.retries += 1
+                if self.verbose:
+                    print(f'Error calling {key} (attempt {attempt}/{self.max_retry}):', repr(oops))
+                time.sleep(min(self.backoff * 2 ** (attempt - 1), self.max_backoff) * random.uniform(0.5, 1.0))
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Per key: number of calls, failures, retried attempts, timed out requests, hedges and hedges that
+        answered first, and the current p50/p95 latency, timeout and hedging delay
+        """
+        result = dict()
+        for key in list(self._stats):
+            stats = self._stats[key]
+            latencies = list(stats.latencies)
+            result[key] = {
+                'calls': stats.calls,
+                'failures': stats.failures,
+                'retries': stats.retries,
+                'timeouts': stats.timeouts,
+                'hedges': stats.hedges,
+                'hedge_wins': stats.hedge_wins,
+                'p50': float(np.percentile(latencies, 50)) if latencies else None,
+                'p95': float(np.percentile(latencies, 95)) if latencies else None,
+                'timeout': self.timeout(key),
+                'hedging_delay': self.hedging_delay(key),
+            }
+        return result
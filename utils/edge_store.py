@@ -0,0 +1,124 @@
+"""
+Array-backed adjacency storage for the knowledge graph, edges are kept in CSR (compressed sparse row)
+form over the integer ids of entities instead of one python list per entity
+"""
+from typing import Dict, List
+import numpy as np
+
+
+class CSREdgeStore:
+    """
+    Class to hold directed edges head -> tail in CSR format. Row i of the store holds all the edges whose
+    head entity has id i, each edge records the id of its tail entity and the id of its relation.
+    Edges appended after the store is built go to a small overflow table until the next compaction.
+    """
+    def __init__(self, indptr: np.ndarray, tails: np.ndarray, relation_ids: np.ndarray):
+        self.indptr: np.ndarray = indptr
+        self.tails: np.ndarray = tails
+        self.relation_ids: np.ndarray = relation_ids
+        self.overflow: Dict[int, List[tuple]] = dict()
+        self.overflow_count: int = 0
+
+    @classmethod
+    def from_edges(cls, num_nodes: int, heads: List[int], tails: List[int], relation_ids: List[int]) -> 'CSREdgeStore':
+        """
+        Build the store from parallel lists of edges
+
+        Parameters:
+        num_nodes (int): number of entities, ids must be in range [0, num_nodes)
+        heads (list[int]): id of the head entity of each edge
+        tails (list[int]): id of the tail entity of each edge
+        relation_ids (list[int]): id of the relation of each edge
+
+        Returns:
+        CSREdgeStore: the store
+        """
+        heads = np.asarray(heads, dtype=np.int32)
+        tails = np.asarray(tails, dtype=np.int32)
+        relation_ids = np.asarray(relation_ids, dtype=np.int32)
+
+        # stable sort keeps the insertion order of edges inside each row
+        order = np.argsort(heads, kind='stable')
+        counts = np.bincount(heads, minlength=num_nodes)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(indptr, tails[order], relation_ids[order])
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    def __len__(self) -> int:
+        return len(self.tails) + self.overflow_count
+
+    def append(self, head: int, tail: int, relation_id: int) -> None:
+        """
+        Add one edge to the store without rebuilding the arrays
+
+        Parameters:
+        head (int): id of the head entity
+        tail (int): id of the tail entity
+        relation_id (int): id of the relation
+        """
+        self.overflow.setdefault(head, []).append((tail, relation_id))
+        self.overflow_count += 1
+
+    def neighbours(self, head: int) -> List[int]:
+        """
+        All the relation ids going out of an entity, in insertion order
+
+        Parameters:
+        head (int): id of the head entity
+
+        Returns:
+        list[int]: ids of the outgoing relations
+        """
+        result = []
+        if head < self.num_nodes:
+            result = self.relation_ids[self.indptr[head]:self.indptr[head + 1]].tolist()
+        if head in self.overflow:
+            result += [relation_id for _, relation_id in self.overflow[head]]
+        return result
+
+    def successors(self, head: int) -> List[int]:
+        """
+        All the tail entity ids of the edges going out of an entity, in insertion order
+
+        Parameters:
+        head (int): id of the head entity
+
+        Returns:
+        list[int]: ids of the tail entities
+        """
+        result = []
+        if head < self.num_nodes:
+            result = self.tails[self.indptr[head]:self.indptr[head + 1]].tolist()
+        if head in self.overflow:
+            result += [tail for tail, _ in self.overflow[head]]
+        return result
+
+    def compact(self, num_nodes: int) -> 'CSREdgeStore':
+        """
+        Merge the overflow table into the CSR arrays
+
+        Parameters:
+        num_nodes (int): current number of entities
+
+        Returns:
+        CSREdgeStore: a new store without overflow
+        """
+        heads = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr)).tolist()
+        tails = self.tails.tolist()
+        relation_ids = self.relation_ids.tolist()
+        for head, edges in self.overflow.items():
+            for tail, relation_id in edges:
+                heads.append(head)
+                tails.append(tail)
+                relation_ids.append(relation_id)
+        return CSREdgeStore.from_edges(num_nodes, heads, tails, relation_ids)
+
+    def nbytes(self) -> int:
+        """
+        Memory used by the CSR arrays in bytes (not counting the overflow table)
+        """
+        return self.indptr.nbytes + self.tails.nbytes + self.relation_ids.nbytes
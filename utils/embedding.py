@@ -0,0 +1,101 @@
+"""
+Embedding providers of the vector databases. Each VDB records the name of the provider its vectors come
+from, and the similarity threshold used to decide that two names match is calibrated per provider.
+"""
+from typing import Callable, Dict
+import re
+import zlib
+import numpy as np
+
+
+class EmbeddingProvider:
+    """
+    A way of turning text into vectors, with the cosine similarity above which two texts are considered
+    the same entity or relation
+    """
+    def __init__(self, name: str, embed: Callable[[str], list], threshold: float):
+        self.name: str = name
+        self.embed: Callable[[str], list] = embed
+        self.threshold: float = threshold
+
+
+def openai_embedding(content: str) -> list[float]:
+    # looked up at call time so that the cache and batching of utils.gpt apply
+    from utils import gpt
+    return gpt.gpt3_embedding(content=content)
+
+
+class HashingEmbedding:
+    """
+    Local embedding of short names: character 2-4-grams and words are hashed into a fixed number of
+    signed buckets. Names differing by case, underscores, punctuation or a few characters get close
+    vectors, computing one takes microseconds and needs no network. Meant for entity and relation names,
+    not for long texts.
+    """
+    def __init__(self, dimension: int=512, ngrams: tuple=(2, 3, 4), word_weight: float=2.0):
+        self.dimension: int = dimension
+        self.ngrams: tuple = ngrams
+        self.word_weight: float = word_weight
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = text.replace('_', ' ').lower()
+        # every relation name ends with _Relation, it would make all of them look alike
+        text = re.sub(r'\s+relation\s*$', '', text)
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def _add(self, vector: np.ndarray, feature: str, weight: float) -> None:
+        code = zlib.crc32(feature.encode('utf-8'))
+        vector[code % self.dimension] += weight if code & 0x80000000 else -weight
+
+    def __call__(self, content: str) -> list[float]:
+        text = self.normalize(content)
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        padded = f' {text} '
+        for n in self.ngrams:
+            for i in range(len(padded) - n + 1):
+                self._add(vector, padded[i:i + n], 1.0)
+        for word in text.split():
+            self._add(vector, 'w:' + word, self.word_weight)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # empty name, any fixed unit vector
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+
+# calibrated on name pairs: "Barbara Wilson"/"Wilson, Barbara" score 0.80, "Is_chancellor_of_Relation"/
+# "Chancellor_of_Relation" 0.89, while "Tiger Wang"/"Tiger Wong" and "Entity 12"/"Entity 13" score 0.68
+HASHING_THRESHOLD = 0.78
+
+PROVIDERS: Dict[str, EmbeddingProvider] = {
+    'openai': EmbeddingProvider('openai', openai_embedding, 0.90),
+    'hashing': EmbeddingProvider('hashing', HashingEmbedding(), HASHING_THRESHOLD),
+}
+
+
+def register_embedding(name: str, embed: Callable[[str], list], threshold: float) -> None:
+    """
+    Make an embedding provider available to vector databases under a name
+
+    Parameters:
+    name (str): name of the provider
+    embed (Callable[[str], list]): text -> vector
+    threshold (float): cosine similarity above which two texts match
+    """
+    PROVIDERS[name] = EmbeddingProvider(name, embed, threshold)
+
+
+def get_embedding(name: str) -> EmbeddingProvider:
+    """
+    The embedding provider registered under a name
+
+    Parameters:
+    name (str): name of the provider
+
+    Returns:
+    EmbeddingProvider: the provider
+    """
+    if not name in PROVIDERS:
+        raise Exception(f"unknown embedding provider {name}, available: {sorted(PROVIDERS)}")
+    return PROVIDERS[name]
@@ -0,0 +1,131 @@
+"""
+Entity resolution at insert time: an alias table for exact hits, and random-hyperplane LSH over entity
+vectors to find candidate duplicates without scanning the whole entity vector database
+"""
+from typing import Dict, List, Optional, Set
+import numpy as np
+from utils.vdb import VDB
+
+
+class EntityResolver:
+    """
+    Resolves a new entity to an existing one of the graph. Every row of the entity VDB is hashed into
+    num_tables LSH tables by the signs of num_bits random hyperplanes, so a vector only has to be compared
+    with the rows sharing one of its buckets. Rows are hashed lazily, the first time the resolver is used
+    after new vectors were inserted. Unless a threshold is given, two entities match from the threshold of
+    the embedding provider of the entity VDB, which is calibrated per provider.
+
+    The hyperplanes go through the mean of the first indexed vectors instead of the origin, since text
+    embeddings all point in a similar direction and buckets would be very unbalanced otherwise.
+    """
+    MAX_OFFSET_ROWS = 1024
+
+    def __init__(self, threshold: Optional[float]=None, num_tables: int=12, num_bits: int=10, seed: int=0):
+        # None: the threshold of the entity VDB's embedding provider
+        self.threshold: Optional[float] = threshold
+        self.num_tables: int = num_tables
+        self.num_bits: int = num_bits
+        self.seed: int = seed
+        # alias name -> canonical entity name
+        self.aliases: Dict[str, str] = dict()
+        self.planes: Optional[np.ndarray] = None
+        self.offset: Optional[np.ndarray] = None
+        self.offset_rows: int = 0
+        self.buckets: List[Dict[int, List[int]]] = [dict() for _ in range(num_tables)]
+        self.indexed_rows: int = 0
+
+    def canonical(self, name: str) -> str:
+        """
+        Name of the canonical entity for a name, the name itself if it is not a known alias
+
+        Parameters:
+        name (str): entity name
+
+        Returns:
+        str: the canonical name
+        """
+        return self.aliases.get(name, name)
+
+    def add_alias(self, alias: str, canonical: str) -> None:
+        """
+        Record that alias refers to the entity named canonical
+
+        Parameters:
+        alias (str): the other name
+        canonical (str): name of the entity in the graph
+        """
+        canonical = self.canonical(canonical)
+        if alias != canonical:
+            self.aliases[alias] = canonical
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        LSH bucket of each vector in each table, shape (len(vectors), num_tables)
+        """
+        bits = ((vectors - self.offset) @ self.planes.T > 0).reshape(len(vectors), self.num_tables, self.num_bits)
+        return bits.astype(np.int64) @ (1 << np.arange(self.num_bits, dtype=np.int64))
+
+    def _catch_up(self, vdb: VDB) -> None:
+        """
+        Hash the rows of the VDB inserted since the last call
+        """
+        if vdb.size == self.indexed_rows:
+            return
+        if self.planes is None:
+            rng = np.random.default_rng(self.seed)
+            self.planes = rng.standard_normal((self.num_tables * self.num_bits, vdb.vectors.shape[1])).astype(np.float32)
+        if self.offset_rows < self.MAX_OFFSET_ROWS and vdb.size >= 2 * self.offset_rows:
+            # re-center the hyperplanes while the database is small, hashing it again is cheap
+            self.offset_rows = min(vdb.size, self.MAX_OFFSET_ROWS)
+            self.offset = np.asarray(vdb.vectors[:self.offset_rows], dtype=np.float32).mean(axis=0)
+            self.buckets = [dict() for _ in range(self.num_tables)]
+            self.indexed_rows = 0
+        vectors = np.asarray(vdb.vectors[self.indexed_rows:vdb.size], dtype=np.float32)
+        for i, codes in enumerate(self._codes(vectors)):
+            for table, code in enumerate(codes):
+                self.buckets[table].setdefault(int(code), []).append(self.indexed_rows + i)
+        self.indexed_rows = vdb.size
+
+    def candidates(self, vector, vdb: VDB) -> Set[int]:
+        """
+        Rows of the VDB that share at least one LSH bucket with the vector
+
+        Parameters:
+        vector (list[float]): the query vector
+        vdb (VDB): the entity vector database
+
+        Returns:
+        set[int]: candidate rows
+        """
+        self._catch_up(vdb)
+        if self.planes is None:
+            return set()
+        result = set()
+        codes = self._codes(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        for table, code in enumerate(codes):
+            result.update(self.buckets[table].get(int(code), ()))
+        return result
+
+    def resolve(self, vector, vdb: VDB) -> Optional[str]:
+        """
+        Find the existing entity most similar to the vector, if its cosine similarity reaches the threshold
+        (the threshold of the VDB's embedding provider if none was given)
+
+        Parameters:
+        vector (list[float]): vector of the new entity
+        vdb (VDB): the entity vector database
+
+        Returns:
+        Optional[str]: id of the matching entity in the VDB
+        """
+        rows = sorted(self.candidates(vector, vdb))
+        if len(rows) == 0:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        matrix = np.asarray(vdb.vectors[rows], dtype=np.float32)
+        scores = matrix @ vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector))
+        best = int(np.argmax(scores))
+        threshold = self.threshold if self.threshold is not None else vdb.threshold
+        if scores[best] < threshold:
+            return None
+        return vdb.ids[rows[best]]
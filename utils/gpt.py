@@ -1,11 +1,120 @@
-from openai import OpenAI
 import os
-from time import time, sleep
-import signal
-from dotenv import load_dotenv
+import sys
+import threading
+from contextlib import contextmanager
+from time import monotonic, time
+import numpy as np
+from utils.cache import LRUCache
+from utils.call_policy import CallPolicy
+
+# built on the first LLM or embedding call: importing openai and reading .env take most of the start-up
+# time of a short job that may not need them (local embeddings, cached answers, graph tools)
+_client = None
+_client_lock = threading.Lock()
+# per thread, the time.monotonic() deadline set by call_deadline
+_local = threading.local()
+
+# timeouts, hedging and retries of the chat and embedding calls, adapted to the latencies of each model
+call_policy = CallPolicy()
+
+
+class GPTError(Exception):
+    """
+    A chat or embedding call failed after its retries, or with an error a retry can't fix
+    """
+
+
+class GPTTimeoutError(GPTError):
+    """
+    The last attempt of a chat or embedding call timed out
+    """
+
+
+@contextmanager
+def call_deadline(seconds: float):
+    """
+    The chat and embedding calls made by this thread inside the block time out at most seconds from now,
+    and raise GPTTimeoutError without a request once that time has passed. Nested deadlines only shorten it
+    """
+    previous = getattr(_local, 'deadline', None)
+    deadline = monotonic() + seconds
+    _local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def _call(model: str, request, timeout=None):
+    """
+    call_policy.call with the deadline of the thread, and the failures turned into GPTError/GPTTimeoutError
+    """
+    try:
+        return call_policy.call(model, request, timeout, deadline=getattr(_local, 'deadline', None))
+    except Exception as oops:
+        # programming errors (TypeError, KeyError...) are not failures of the call, they go through as is
+        if not _is_call_error(oops):
+            raise
+        # the client times out with openai.APITimeoutError, the hedged waits with TimeoutError
+        if isinstance(oops, TimeoutError) or type(oops).__name__ == 'APITimeoutError':
+            raise GPTTimeoutError(f"{model}: {oops}") from oops
+        raise GPTError(f"{model}: {oops!r}") from oops
+
+
+def _is_call_error(error: Exception) -> bool:
+    """
+    Whether the error comes from the request: an openai error, a transport error (OSError, which covers
+    ConnectionError) or a timeout
+    """
+    if isinstance(error, (TimeoutError, OSError)):
+        return True
+    # openai is only imported once the client is built, an error can only be one of its errors after that
+    openai = sys.modules.get('openai')
+    return openai is not None and isinstance(error, openai.OpenAIError)
+
+# set by long-running services to send the single embeddings of concurrent callers in batches
+embedding_batcher = None
+# recent embeddings keyed by (engine, content), the same names are embedded again and again (relation
+# names while building a graph, entity names of a question and of its subgraph)
+embedding_cache = LRUCache(maxsize=4096)
+
+
+def get_client():
+    """
+    The OpenAI client, created on first use with the API key from the environment or the .env file
+
+    Returns:
+    OpenAI: the client, shared by all threads
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from dotenv import load_dotenv
+                from openai import OpenAI
+                load_dotenv()
+                # retries are made by call_policy, with its own timeouts
+                _client = OpenAI(api_key = os.getenv("PROF_OPENAI_API_KEY"), max_retries=0)
+    return _client
+
+
+def gpt3_embeddings(contents: list[str], engine='text-embedding-ada-002') -> list[list[float]]:
+    """
+    Wrapper of OpenAI text embedding call for several documents in one request
+
+    Parameters:
+    contents (list[str]): the input documents to be embedded
+    engine (str): engine to use
+
+    Returns:
+    list[list[float]]: the text embedding vector of each document, in order
+
+    Raises:
+    GPTError: the call failed (GPTTimeoutError if it timed out)
+    """
+    response = _call(engine, lambda timeout: get_client().embeddings.create(input=contents, model=engine, timeout=timeout))
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-load_dotenv()
-client = OpenAI(api_key = os.getenv("PROF_OPENAI_API_KEY"))
 
 def gpt3_embedding(content, engine='text-embedding-ada-002') -> list[float]:
     """
@@ -18,60 +127,66 @@ def gpt3_embedding(content, engine='text-embedding-ada-002') -> list[float]:
     Returns:
     list[float]: the text embedding vector
     """
-    response = client.Embedding.create(input=content,engine=engine)
-    vector = response['data'][0]['embedding']
+    cached = embedding_cache.get((engine, content))
+    if cached is not None:
+        return cached.tolist()
+    if embedding_batcher is not None:
+        vector = embedding_batcher.submit((content, engine))
+    else:
+        vector = gpt3_embeddings([content], engine=engine)[0]
+    embedding_cache.put((engine, content), np.asarray(vector, dtype=np.float32))
     return vector
 
 
-def gpt_chat(messages: list[dict], model="gpt-3.5-turbo-1106", temperature=0.0, max_tokens=1024, stop=None, n=1, log=False) -> str:
+def batched_embeddings(items: list[tuple]) -> list[list[float]]:
     """
-    Wrapper of OpenAI ChatCompletion call, allow 5 retries maximum. If no response after 60s, will cut the 
-    connection and retry
+    Batch function for a Batcher of (content, engine) pairs, one request per engine
+    """
+    results = [None] * len(items)
+    by_engine = dict()
+    for i, (content, engine) in enumerate(items):
+        by_engine.setdefault(engine, []).append(i)
+    for engine, indices in by_engine.items():
+        for i, vector in zip(indices, gpt3_embeddings([items[i][0] for i in indices], engine=engine)):
+            results[i] = vector
+    return results
+
+
+def gpt_chat(messages: list[dict], model="gpt-3.5-turbo-1106", temperature=0.0, max_tokens=1024, stop=None, n=1, log=False, timeout=None) -> str:
+    """
+    Wrapper of OpenAI ChatCompletion call. Attempts time out after a multiple of the recent p95 latency of
+    the model, a call slower than that p95 is sent a second time and the first answer is used, failed
+    attempts are retried (see utils.call_policy). The timeout is enforced by the HTTP client, so this can
+    be called from any thread.
 
     Parameters:
     messages (list[dict]): Input messages, e.g. [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
     log (bool): whether or not to store the logs of GPT, default to be False
+    timeout (float or None): seconds to wait for the first attempt, None adapts it to the model's latencies
 
     Returns:
     str: the response from GPT
+
+    Raises:
+    GPTError: the call failed after its retries (GPTTimeoutError if the last attempt timed out)
     """
+    def request(seconds: float) -> str:
+        completion = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stop=stop,
+            n=n,
+            timeout=seconds
+        )
+        return completion.choices[0].message.content
 
-    def handler(signum, frame):
-        raise Exception('Function call timed out!')
-
-    max_retry = 5
-    retry = 0
-    while True:
-        # Set the signal handler
-        signal.signal(signal.SIGALRM, handler)
-        # Set a 50 second alarm
-        signal.alarm(60)
-
-        try:
-            completion = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stop=stop,
-                n=n
-            )
-            gpt_response = completion.choices[0].message.content
-            if log:
-                filename = '%s_gpt.txt' % time()
-                if not os.path.exists('gpt_logs'):
-                    os.makedirs('gpt_logs')
-                with open('gpt_logs/%s' % filename, 'w') as f:
-                    f.write(str(messages) + '\n\n==========\n\n' + gpt_response)
-            return gpt_response
-        except Exception as oops:
-            # handles timeout or error
-            retry += 1
-            if retry >= max_retry:
-                # if used up the 5 retries, throw error
-                return "GPT 3.5/4 error: %s" % oops
-            print('Error communicating with OpenAI:', oops)
-            sleep(1)
-        finally:
-            # Cancel the alarm
-            signal.alarm(0)
\ No newline at end of file
+    gpt_response = _call(model, request, timeout)
+    if log:
+        filename = '%s_gpt.txt' % time()
+        if not os.path.exists('gpt_logs'):
+            os.makedirs('gpt_logs')
+        with open('gpt_logs/%s' % filename, 'w') as f:
+            f.write(str(messages) + '\n\n==========\n\n' + gpt_response)
+    return gpt_response
@@ -1,8 +1,18 @@
-from typing import Union, List
+from typing import Union, List, Dict, Iterable, Optional
 import ast
+import functools
+import json
 import re
-from utils.gpt import gpt_chat
-from KnowledgeGraph import KGRelation, KGEntity
+from utils.gpt import gpt_chat, GPTError
+from utils.cache import LRUCache, normalize_question
+from utils.prompt import pack_sentences, sentence_spans, split_sentences, truncate_tokens
+from KnowledgeGraph import KGRelation, KGEntity, relation_key
+
+# tokens of source text sent with each validation, triplet, description and attribute call: only the
+# sentences mentioning the entities of the call are sent, in order, until the budget is spent
+text_token_budget = 1000
+# tokens the model may spend on the mention -> name map of a chunk in entity_disambiguation
+disambiguation_max_tokens = 256
 
 
 def split_text(input: str, window_size: int=6000, overlap: Union[int, None]=1500, delimiter: str='\n') -> List[str]:
@@ -140,23 +150,115 @@ def format_list_answer(s: str) -> str:
         return None
 
 
-def entity_disambiguation(text: str) -> str:
+@functools.lru_cache(maxsize=64)
+def _alias_pattern(names: tuple) -> re.Pattern:
+    # longest first: at a position, the alternation takes the first alternative that matches
+    return re.compile("(?<!\\w)(?:" + "|".join(re.escape(name) for name in names) + ")(?!\\w)")
+
+
+def replace_aliases(text: str, aliases: Dict[str, str], keep: Iterable[str]=()) -> str:
+    """
+    Replace the whole-word occurrences of every alias by its name, in a single pass over the text. At
+    each position the longest match wins and the names themselves (and the keep names) are matched too and
+    left as they are, so that an alias 'Wang' is not replaced inside 'Tiger Wang'
+
+    Parameters:
+    aliases (dict[str, str]): mention -> name to write instead
+    keep (Iterable[str]): other names that must not be rewritten
+
+    Returns:
+    str: the text with the aliases replaced
+    """
+    mapping = {name: name for name in keep}
+    mapping.update((name, name) for name in aliases.values())
+    mapping.update(aliases)
+    mapping.pop("", None)
+    if all(alias == name for alias, name in mapping.items()):
+        return text
+    pattern = _alias_pattern(tuple(sorted(mapping, key=len, reverse=True)))
+    return pattern.sub(lambda match: mapping[match.group(0)], text)
+
+
+def _resolver_aliases(names: List[str], aliases: Dict[str, str]) -> Dict[str, str]:
+    """
+    The other names of the entities of a chunk known to the entity resolver, each mapped to the name the
+    chunk uses, so that the sentences mentioning them are found for the chunk's entity
+    """
+    by_canonical = dict()
+    for alias, canonical in list(aliases.items()):
+        by_canonical.setdefault(canonical, []).append(alias)
+    result = dict()
+    for name in names:
+        canonical = aliases.get(name, name)
+        for other in [canonical] + by_canonical.get(canonical, []):
+            if not other in names:
+                result.setdefault(other, name)
+    return result
+
+
+def entity_disambiguation(text: str, entities: Optional[List[KGEntity]]=None, aliases: Optional[Dict[str, str]]=None, ask_model: bool=True) -> str:
     """
     Given a chunk of text, replace all the pronouns, abbreviations, acronyms, and last names with the 
-    names to which they refer to in the context of the paragraph.
+    names to which they refer to in the context of the paragraph. The model only answers with the map of
+    the mentions to the names (a few tens of tokens instead of the whole chunk written again), the
+    replacements are made here, so none of the text is lost. Pronouns whose referent changes along the text
+    are mapped per sentence.
 
     Parameters:
     text (str): the input document
+    entities (list[KGEntity] or None): the entities extracted from the chunk, the mentions must refer to one
+    of them (any name is accepted if None)
+    aliases (dict[str, str] or None): alias -> canonical name table of an EntityResolver, the other names of
+    the entities of the chunk are replaced without asking the model
+    ask_model (bool): ask the model for the pronouns, abbreviations... else only use aliases
     
     Returns:
-    str: the result text
+    str: the result text, the text itself if the model call failed
     """
-    system_prompt : str = 'Given a chunk of text, replace all the pronouns, abbreviations, acronyms, and last names with the names to which they refer to in the context of the paragraph. For example: "Tiger Wang is an excellent student at UIUC, he is also the Co-founder of Geni. At 2019, Wang founded Geni with his friends." Should become "Tiger Wang is an excellent student at UIUC, Tiger Wang is also the Co-founder of Geni. At 2019, Tiger Wang founded Geni with Tiger Wang\'s friends."'
-    prompt : str = f"Given Text:\n{text}"
+    names = [entity.name for entity in entities] if entities is not None else []
+    mapping = _resolver_aliases(names, aliases) if aliases else dict()
+    by_sentence = dict()
+    # numbered like utils.prompt.split_sentences numbers them
+    spans = sentence_spans(text)
+
+    if ask_model and len(spans) != 0:
+        system_prompt : str = 'Given the numbered sentences of a text, find all the pronouns, abbreviations, acronyms, and last names referring to a named entity. Output only a JSON object mapping each of these mentions, exactly as written in the text, to the name to which it refers in the context of the paragraph. A mention that refers to different names in different sentences (typically a pronoun) is prefixed with the number of the sentence. For example: "[1] Tiger Wang is an excellent student at UIUC, he is also the Co-founder of Geni. [2] At 2019, Wang founded Geni with his friends." Should give {"1:he": "Tiger Wang", "Wang": "Tiger Wang", "2:his": "Tiger Wang\'s"}'
+        prompt : str = " ".join(f"[{i + 1}] {text[start:end].strip()}." for i, (start, end) in enumerate(spans))
+        if len(names) != 0:
+            prompt += f"\n\nNames: {names}"
 
-    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
-    response = gpt_chat(messages=messages, model="gpt-3.5-turbo-1106", max_tokens=2048)
-    return response
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
+        try:
+            response = gpt_chat(messages=messages, model="gpt-3.5-turbo-1106", max_tokens=disambiguation_max_tokens)
+            answer = ast.literal_eval(format_json_answer(response))
+        except (GPTError, ValueError, SyntaxError) as oops:
+            print(f"Disambiguation failed, the text is left as it is: {oops}")
+            answer = dict()
+        print("Disambiguation:", answer)
+
+        for mention, name in (answer.items() if isinstance(answer, dict) else []):
+            if not isinstance(mention, str) or not isinstance(name, str):
+                continue
+            # a mention can only be rewritten as one of the entities of the chunk (or its possessive)
+            if len(names) != 0 and not name in names and not (name.endswith("'s") and name[:-2] in names):
+                continue
+            sentence, _, scoped = mention.partition(":")
+            if scoped and sentence.strip().isdigit():
+                if 0 < int(sentence) <= len(spans) and scoped.strip() != name:
+                    by_sentence.setdefault(int(sentence) - 1, dict())[scoped.strip()] = name
+            elif mention != name and not mention in names:
+                mapping[mention] = name
+
+    if len(by_sentence) == 0:
+        return replace_aliases(text, mapping, keep=names)
+    parts = []
+    previous = 0
+    for i, (start, end) in enumerate(spans):
+        parts.append(text[previous:start])
+        parts.append(replace_aliases(text[start:end], {**mapping, **by_sentence.get(i, dict())}, keep=names))
+        previous = end
+    parts.append(text[previous:])
+    return "".join(parts)
 
 
 def entity_extract(text: str, entity_question: bool=False) -> List[KGEntity]:
@@ -194,16 +296,21 @@ def entity_extract(text: str, entity_question: bool=False) -> List[KGEntity]:
 
     for entity_name in result:
         # entity validation, split into 2 parts since I found it hard for GPT to output True/False in 1 step
-        phrase = phrase_selection(entity_name, text)
+        phrase = pack_sentences(text, text_token_budget, [entity_name], model="gpt-4-1106-preview")
 
         # validation part
         messages = [{"role": "system", "content": ""}, {"role": "user", "content": f"In the following text chunk \"{phrase}\", is \"{entity_name}\" a distinct entity or an attribute of a relation"}]
-        response = gpt_chat(messages=messages, model = "gpt-4-1106-preview", max_tokens=1024)
-        print("validation: ", response)
+        try:
+            response = gpt_chat(messages=messages, model = "gpt-4-1106-preview", max_tokens=1024)
+            print("validation: ", response)
 
-        # convert the answer to True/False
-        messages = [{"role": "system", "content": ""}, {"role": "user", "content": f"Does the response \"{response}\" mean \"{entity_name}\" is a distinct entity? If so, output True, else False. Only output True/False and nothing else"}]
-        response = gpt_chat(messages=messages, model = "gpt-3.5-turbo-1106", max_tokens=1024)
+            # convert the answer to True/False
+            messages = [{"role": "system", "content": ""}, {"role": "user", "content": f"Does the response \"{response}\" mean \"{entity_name}\" is a distinct entity? If so, output True, else False. Only output True/False and nothing else"}]
+            response = gpt_chat(messages=messages, model = "gpt-3.5-turbo-1106", max_tokens=1024)
+        except GPTError as oops:
+            # the entity is left out rather than failing the whole chunk
+            print(f"Validation of {entity_name} failed: {oops}")
+            continue
         print(response)
         is_distinct_entity = ast.literal_eval(response)
 
@@ -214,7 +321,12 @@ def entity_extract(text: str, entity_question: bool=False) -> List[KGEntity]:
             next_prompt: str = f"Entity: {result[entity_name]}\nText: {phrase}"
             next_messages = [{"role": "system", "content": next_system_prompt}, {"role": "user", "content": next_prompt}]
             
-            next_response = gpt_chat(messages=next_messages, model = "gpt-4-1106-preview", max_tokens=1024)
+            try:
+                next_response = gpt_chat(messages=next_messages, model = "gpt-4-1106-preview", max_tokens=1024)
+            except GPTError as oops:
+                # added without attributes rather than failing the whole chunk
+                print(f"Attribute extraction of {entity_name} failed: {oops}")
+                next_response = ""
             print("Attributes: ", next_response)
             try:
                 attributes = ast.literal_eval(format_json_answer(next_response))
@@ -269,10 +381,14 @@ def mention_recognition(entity_list: List[str], text_chunk: str) -> List[str]:
     return other_entities
 
 
-def predicate_extract(text: str, entities: List[KGEntity], entity_question: bool=False) -> List[KGRelation]:
+def predicate_extract(text: str, entities: List[KGEntity], entity_question: bool=False, seen: Optional[Dict[tuple, KGRelation]]=None) -> List[KGRelation]:
     """
     Extract all the triples of [head_entity, relation, tail_entity] in the given text chunk, as well as 
     data properties corresponding to that relation, and put them together into KGRelation object.
+    The text is split into overlapping windows, so the same triplet is often extracted more than once: a
+    triplet whose canonical key (see relation_key) was already extracted skips its description call, only
+    the sentences of its window that the first extraction didn't have are merged into its source, and
+    its attributes are extracted from them if it has none yet.
 
     Parameters:
     text (str): the input chunk of text
@@ -280,13 +396,69 @@ def predicate_extract(text: str, entities: List[KGEntity], entity_question: bool
     entity_question (bool): This parameter is only used in the question-answering part, since there is a
     special entity [ENTITY] in the QA part that represent the unknown entity of our interest, and the prompt
     also need to be changed a little bit for GPT to understand what [ENTITY] is
+    seen (dict or None): canonical triplet key -> relation of the triplets already extracted, pass the
+    same dict to every call on one document to skip the triplets repeated across its chunks
 
     Returns:
-    list[KGRelation]: the result list of relations
+    list[KGRelation]: the result list of relations. A repeat of a triplet extracted by an earlier call
+    comes back as a relation holding only what it adds, for add_relation to merge it
     """
+    if seen is None:
+        seen = dict()
+    # key -> relation returned by this call for it, not in any graph yet so repeats are merged into it
+    returned = dict()
     entity_name_list = [entity.name for entity in entities]
     text_chunks = split_text(text, 3000, 750, '.')
     
+    def relation_attributes(head: str, relation: str, tail: str, text: str) -> dict:
+        """
+        Helper function, extracts the data properties of a relation from the text about it, {} if there
+        are none or the call fails
+        """
+        next_system_prompt: str = "You are an expert in linguistics and knowledge graph. You are given a relation, and a text chunk. You will help extract the attributes of the relation. Do not add any external information outside of the given text chunk. Your output should be a well-formatted JSON that has all property names and their respective values in this format: {'property_name': 'value'}\n\nFor example given:\nHead Entity of Relation: Barbara Wilson\nRelation: Chancellor_of_Relation\nTail Entity of Relation: UIUC\nText: Barbara Wilson is the Chancellor of UIUC from 2015 to 2016\n\nThis 'Chancellor_of_Relation' should have attributes for example 'start_time' and 'end_time'; so, you should output:\n{'start_time': '2015', 'end_time': '2016'}\n\nNote: Only include attribute of the relation, do not include attribute of the entities.\n\nFor example, for the sentence \"Philip is 25 years old, and he is the teacher of Isaac\", 25 years old is the attribute of the entity \"Philip\", not attribute of the relation \"teacher_of\"."
+        
+        next_prompt: str = f"Head Entity: {head}\nRelation: {relation}\nTail Entity: {tail}\nText: {text}\n\n" + ("(treat [Entity] as an actual entity)" if entity_question else "")
+        next_messages = [{"role": "system", "content": next_system_prompt}, {"role": "user", "content": next_prompt}]
+        
+        try:
+            next_response = gpt_chat(messages=next_messages, model = "gpt-4-1106-preview", max_tokens=1024)
+        except GPTError as oops:
+            # added without attributes rather than failing the whole chunk
+            print(f"Attribute extraction of {[head, relation, tail]} failed: {oops}")
+            next_response = ""
+        print("Relation attributes: ", next_response)
+        try:
+            attributes = ast.literal_eval(format_json_answer(next_response))
+        except:
+            attributes = {}
+        return attributes
+
+    def merge_repeat(key: tuple, head: str, relation: str, tail: str, text_chunk: str) -> Optional[KGRelation]:
+        """
+        Helper function, what the window of a repeated triplet adds to its first extraction: the sentences
+        with both entities that its source doesn't have, and their attributes if it has none yet. They are
+        merged into the relation if this call returns it already, else returned as a relation to merge
+
+        Returns:
+        Optional[KGRelation]: the relation to merge, None if there is nothing to add or it was merged
+        """
+        existing, target = seen[key], returned.get(key)
+        known = existing.source if target is None or target is existing else existing.source + " " + target.source
+        sentences = [sentence for sentence in split_sentences(pack_sentences(text_chunk, text_token_budget, [head, tail], require_all=True, model="gpt-4-1106-preview")) if not sentence in known]
+        if len(sentences) == 0:
+            return None
+        source = " ".join(sentence + "." for sentence in sentences)
+        attributes = dict()
+        if len(existing.data_properties) == 0 and (target is None or len(target.data_properties) == 0):
+            attributes = relation_attributes(head, relation, tail, source)
+        if target is None:
+            returned[key] = KGRelation(name=existing.name, head_entity=existing.head_entity, tail_entity=existing.tail_entity, data_properties=attributes, description="", source=source)
+            return returned[key]
+        for name, value in attributes.items():
+            target.data_properties.setdefault(name, value)
+        target.source += " " + source
+        return None
+
     def relation_extraction(entity: str, entity_list: List[str], text_chunk: str) -> List[KGRelation]:
         """
         Helper function, used to extract relation with given entity as the head entity
@@ -301,12 +473,19 @@ def predicate_extract(text: str, entities: List[KGEntity], entity_question: bool
         """
         result_relations: list[KGRelation] = []
         
-        # extract all the triplets in the text chunk
+        # extract all the triplets in the sentences of the text chunk that mention the target entity (the
+        # pronouns referring to it were replaced by entity_disambiguation)
         system_prompt: str = "You are an expert in linguistics and knowledge graph. You are given a target entity, a list of entities, and a text chunk. You help extract relations between the target entity and each of the entities in the list. Do not add any external information outside of the text to the relations. Your output should be a list of triplets in this 2d-list format: [['Head_entity', 'relation', 'Tail_entity'], ...]"
-        prompt: str = f"Target Entity: {entity}\nEntities: {entity_list}\nText: {text_chunk}\n\n" + ("(treat [Entity] as an actual entity)" if entity_question else "")
+        text = pack_sentences(text_chunk, text_token_budget, [entity], model="gpt-4-1106-preview")
+        prompt: str = f"Target Entity: {entity}\nEntities: {entity_list}\nText: {text}\n\n" + ("(treat [Entity] as an actual entity)" if entity_question else "")
 
         messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
-        response = gpt_chat(messages=messages, model = "gpt-4-1106-preview", max_tokens=2048)
+        try:
+            response = gpt_chat(messages=messages, model = "gpt-4-1106-preview", max_tokens=2048)
+        except GPTError as oops:
+            # the other windows of the text may still give these relations
+            print(f"Relation extraction of {entity} failed: {oops}")
+            return result_relations
         print("Relations", response)
         
         triplets: List = ast.literal_eval(format_list_answer(response))
@@ -329,42 +508,43 @@ def predicate_extract(text: str, entities: List[KGEntity], entity_question: bool
                 tail = ''
             elif len(triplet) == 3: head, relation, tail = triplet
 
+            key = relation_key(head, relation, tail)
+            if key in seen:
+                # already extracted from an overlapping window, only what this window adds is kept
+                print("Duplicate relation merged: ", triplet)
+                repeat = merge_repeat(key, head, relation, tail, text_chunk)
+                if repeat is not None:
+                    result_relations.append(repeat)
+                continue
+
             # possible_sentences will contains only sentences that has both head and tail entities
-            sentences = re.split('[.?!;]', text_chunk)
-            sentences = [sentence.strip() for sentence in sentences]
-            possible_sentences = ""
-            for sentence in sentences:
-                if head in sentence and tail in sentence:
-                    possible_sentences += sentence + '. '
+            possible_sentences = pack_sentences(text_chunk, text_token_budget, [head, tail], require_all=True, model="gpt-3.5-turbo-1106")
             
             this_system_prompt: str = "You are an expert in linguistics and knowledge graph. You are given a head entity, relation, tail entity, and a text chunk. You help extract the only relevant text that may describe that relation between head entity and tail entity. Do not add any external information outside of the given text chunk. Your output should has a brief description of the relation and the excerpt about the relation in this format: {'description': 'brief description', 'source': 'excerpt abut the relation'}"
 
             this_prompt: str = f"Head Entity: {head}\nRelation: {relation}\nTail Entity: {tail}\nText: {possible_sentences}\n\n" + ("(treat [Entity] as an actual entity)" if entity_question else "")
 
             messages = [{"role": "system", "content": this_system_prompt}, {"role": "user", "content": this_prompt}]
-            response = gpt_chat(messages=messages, model = "gpt-3.5-turbo-1106", max_tokens=1024)
+            try:
+                response = gpt_chat(messages=messages, model = "gpt-3.5-turbo-1106", max_tokens=1024)
+            except GPTError as oops:
+                # not marked as seen, an overlapping window can extract it again
+                print(f"Description of {triplet} failed: {oops}")
+                continue
             print("Relation description:", response)
             this_result = ast.literal_eval(format_json_answer(response))
 
-            relation_text_chunk = this_result["source"]
+            relation_text_chunk = truncate_tokens(this_result["source"], text_token_budget, model="gpt-4-1106-preview")
             
             # extract data properties of relation
-            next_system_prompt: str = "You are an expert in linguistics and knowledge graph. You are given a relation, and a text chunk. You will help extract the attributes of the relation. Do not add any external information outside of the given text chunk. Your output should be a well-formatted JSON that has all property names and their respective values in this format: {'property_name': 'value'}\n\nFor example given:\nHead Entity of Relation: Barbara Wilson\nRelation: Chancellor_of_Relation\nTail Entity of Relation: UIUC\nText: Barbara Wilson is the Chancellor of UIUC from 2015 to 2016\n\nThis 'Chancellor_of_Relation' should have attributes for example 'start_time' and 'end_time'; so, you should output:\n{'start_time': '2015', 'end_time': '2016'}\n\nNote: Only include attribute of the relation, do not include attribute of the entities.\n\nFor example, for the sentence \"Philip is 25 years old, and he is the teacher of Isaac\", 25 years old is the attribute of the entity \"Philip\", not attribute of the relation \"teacher_of\"."
-            
-            next_prompt: str = f"Head Entity: {head}\nRelation: {relation}\nTail Entity: {tail}\nText: {relation_text_chunk}\n\n" + ("(treat [Entity] as an actual entity)" if entity_question else "")
-            next_messages = [{"role": "system", "content": next_system_prompt}, {"role": "user", "content": next_prompt}]
-            
-            next_response = gpt_chat(messages=next_messages, model = "gpt-4-1106-preview", max_tokens=1024)
-            print("Relation attributes: ", next_response)
-            try:
-                attributes = ast.literal_eval(format_json_answer(next_response))
-            except:
-                attributes = {}
+            attributes = relation_attributes(head, relation, tail, relation_text_chunk)
 
             triplet[1] = f'{triplet[1].replace(" ", "_")}_Relation'
             
             relation_to_add = KGRelation(name=triplet[1], head_entity=triplet[0], tail_entity=triplet[2], data_properties=attributes, description=this_result["description"], source=this_result["source"])
             print("Relation to add: ", relation_to_add)
+            seen[key] = relation_to_add
+            returned[key] = relation_to_add
             result_relations.append(relation_to_add)
 
         return result_relations
@@ -376,5 +556,89 @@ def predicate_extract(text: str, entities: List[KGEntity], entity_question: bool
             other_entities.remove(entity)
             phrases : str = phrase_selection(entity, text_chunk)
             mentioned_list : List[str] = mention_recognition(other_entities, phrases)
+            if len(mentioned_list) == 0:
+                # no other entity is mentioned with this one, there is no relation to extract
+                continue
             result += relation_extraction(entity, mentioned_list, text_chunk)
     return result
+
+
+# router decisions, keyed by normalized question
+router_cache = LRUCache(maxsize=256)
+
+def route_question(question: str) -> dict:
+    """
+    Classify a question for the QA engine with a single GPT call, replacing the chain of calls that
+    determined the question type, whether attributes are of an entity or a relation, whether a number is
+    asked, the statement form of the question, and the entities it mentions. Decisions are cached.
+
+    Parameters:
+    question (str): the question
+
+    Returns:
+    dict: {'type': 'entity' | 'relation' | 'attribute' | 'other',
+           'sub_type': 'entity' | 'relation' | None (whose attributes are asked, for attribute questions),
+           'is_number': bool (whether the number of entities is asked),
+           'statement': str (question about a single entity as a statement, the entity asked replaced with [ENTITY]),
+           'entities': [{'name': str, 'description': str, 'types': list[str]}],
+           'patterns': list of (head, relation, tail, properties) triple patterns, or None (see KnowledgeGraph.query),
+           'answer': the variable of the patterns asked for, or None,
+           'attribute': the attribute asked by attribute questions, or None}
+    """
+    key = normalize_question(question)
+    decision = router_cache.get(key)
+    if decision is not None:
+        return decision
+
+    system_prompt = "You are an expert in linguistics and knowledge graph. You will be given a question for a QA engine based on a knowledge graph. Analyse it and output a well-formatted JSON with these keys:\n\"type\": whether the answer to this question would be a distinct \"entity\", a \"relation\" between two entities, or an \"attribute\" of an entity/relationship, \"other\" if none of these.\n\"sub_type\": for attribute questions, \"entity\" if the attributes of an entity are asked, \"relation\" if the attributes of a relation between two entities are asked; null otherwise.\n\"is_number\": true if the question asks for the number of entities, else false.\n\"statement\": for entity questions, the question about a single entity (\"Where are all the restaurants in this town?\" becomes about \"the restaurant\", \"How many presidents were there between 2010-2020?\" becomes \"Who is a president between 2010-2020?\") converted into a statement where the entity asked is replaced with [ENTITY], e.g. \"Who is the Chancellor of UIUC at 2015-2016?\" becomes \"[ENTITY] is the Chancellor of UIUC at 2015-2016.\"; null otherwise.\n\"entities\": the distinct entities mentioned in the question, as a list of {\"name\": name, \"description\": brief description, \"types\": [\"type1\", ...]}. For compound entities such as \"Chancellor of UIUC\", \"UIUC\" is the entity and \"Chancellor of\" is a relation. Attributes and date ranges are not entities.\n\"patterns\": for entity questions and questions about the attributes of a relation, the question as triple patterns over the knowledge graph: a list of [head, relation, tail, {attribute: value}] where head, relation and tail are names or variables such as \"?x\" (relation names look like \"Chancellor_of\") and the optional attributes must hold for the relation, \"during\" being the period it must overlap, e.g. \"Who is the Chancellor of UIUC from 2015-2016?\" gives [[\"?x\", \"Chancellor_of\", \"UIUC\", {\"during\": \"2015-2016\"}]] and \"When did Barbara Wilson become the Chancellor of UIUC?\" gives [[\"Barbara Wilson\", \"?r\", \"UIUC\"]]; null if the question can't be written this way.\n\"answer\": the variable of the patterns the question asks for, e.g. \"?x\"; null otherwise.\n\"attribute\": for attribute questions, the name of the attribute asked such as \"start_time\"; null otherwise.\n\nOnly output the JSON."
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": f"Question: {question}"}]
+    response = gpt_chat(messages=messages, model="gpt-4-1106-preview", max_tokens=1024)
+    print("Router: ", response)
+
+    try:
+        result = json.loads(response[response.find('{'): response.rfind('}') + 1])
+    except ValueError:
+        # Python-style dict with single quotes
+        result = ast.literal_eval(format_json_answer(response))
+
+    decision = {
+        'type': str(result.get('type') or 'other').lower(),
+        'sub_type': str(result['sub_type']).lower() if result.get('sub_type') else None,
+        'is_number': bool(result.get('is_number')),
+        'statement': result.get('statement'),
+        'entities': [entity for entity in result.get('entities') or [] if isinstance(entity, dict) and entity.get('name')],
+        'patterns': routed_patterns(result.get('patterns')),
+        'answer': result.get('answer') if isinstance(result.get('answer'), str) and result['answer'].startswith('?') else None,
+        'attribute': str(result['attribute']) if result.get('attribute') else None,
+    }
+    router_cache.put(key, decision)
+    return decision
+
+
+def routed_patterns(patterns) -> Optional[List[tuple]]:
+    """
+    Triple patterns of a routed question as (head, relation, tail, properties) tuples, None if the model
+    gave none or they are malformed
+    """
+    if not isinstance(patterns, list) or len(patterns) == 0:
+        return None
+    result = []
+    for pattern in patterns:
+        if not isinstance(pattern, (list, tuple)) or not len(pattern) in (3, 4) or not all(isinstance(term, str) and term for term in pattern[:3]):
+            return None
+        properties = pattern[3] if len(pattern) == 4 and isinstance(pattern[3], dict) else {}
+        result.append((pattern[0], pattern[1], pattern[2], {str(key): str(value) for key, value in properties.items()}))
+    return result
+
+
+def routed_entities(decision: dict) -> List[KGEntity]:
+    """
+    KGEntity objects for the entities mentioned in a routed question
+
+    Parameters:
+    decision (dict): result of route_question
+
+    Returns:
+    list[KGEntity]: the mentioned entities
+    """
+    return [KGEntity(name=entity['name'], data_properties={}, description=entity.get('description', ''), types=list(entity.get('types') or []), relations=[]) for entity in decision['entities']]
@@ -0,0 +1,111 @@
+"""
+JSON lines export of a KnowledgeGraph, written and read one record at a time so that neither side holds
+the whole dump in memory. It is the exchange format between hosts: an ingestion host writes the records
+added or changed since the last checkpoint (KnowledgeGraph.diff), a QA host applies them to its own graph
+(KnowledgeGraph.import_jsonl).
+
+    {"kind": "header", "format": "ukg-jsonl", "version": 42, "since": 17}
+    {"kind": "entity", "id": 3, "name": "UIUC", "description": "...", "types": [...], "data_properties": {...}, "aliases": [...], "vector": "<base64>"}
+    {"kind": "relation", "id": 7, "name": "Located_in_Relation", "head": "UIUC", "tail": "Illinois", "description": "...", "source": "...", "data_properties": {...}, "vector": "<base64>"}
+
+Entities come before relations, so the entities of a relation are known when it is read. Vectors are the
+little-endian float32 bytes of the embedding, base64 encoded.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional
+import base64
+import gzip
+import json
+import numpy as np
+
+from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+
+FORMAT_NAME = 'ukg-jsonl'
+
+
+def encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype='<f4').tobytes()).decode('ascii')
+
+
+def decode_vector(encoded: Optional[str]) -> Optional[list[float]]:
+    if encoded is None:
+        return None
+    return np.frombuffer(base64.b64decode(encoded), dtype='<f4').tolist()
+
+
+def _aliases_by_name(knowledge_graph: KnowledgeGraph) -> Dict[str, List[str]]:
+    aliases = dict()
+    if knowledge_graph.resolver is not None:
+        for alias, name in list(knowledge_graph.resolver.aliases.items()):
+            aliases.setdefault(name, []).append(alias)
+    return aliases
+
+
+def _changed(versions, count: int, since_version: int) -> np.ndarray:
+    # copy the versions first, a numpy view of the array would stop writers from appending to it
+    return np.nonzero(np.frombuffer(versions[:count], dtype=np.int64) > since_version)[0]
+
+
+def graph_records(knowledge_graph: KnowledgeGraph, since_version: int, vectors: bool=True) -> Iterator[dict]:
+    """
+    Header, then the entities and relations of the graph whose last write is after since_version
+
+    Parameters:
+    knowledge_graph (KnowledgeGraph): the graph, a snapshot if it is being written to
+    since_version (int): version of the checkpoint, -1 for everything
+    vectors (bool): include the embeddings
+
+    Returns:
+    Iterator[dict]: the records
+    """
+    yield {"kind": "header", "format": FORMAT_NAME, "version": knowledge_graph.version, "since": since_version}
+    aliases = _aliases_by_name(knowledge_graph)
+    for id in _changed(knowledge_graph.entity_versions, len(knowledge_graph.entity_list), since_version):
+        entity = knowledge_graph.get_entity(id)
+        record = {"kind": "entity", "id": entity.id, "name": entity.name, "description": entity.description, "types": list(entity.types), "data_properties": entity.data_properties, "aliases": aliases.get(entity.name, [])}
+        if vectors:
+            record["vector"] = encode_vector(knowledge_graph.entity_vdb.query_id(entity.id))
+        yield record
+    for id in _changed(knowledge_graph.relation_versions, len(knowledge_graph.relations), since_version):
+        relation = knowledge_graph.get_relation(id)
+        record = {"kind": "relation", "id": relation.id, "name": relation.name, "head": relation.head_entity, "tail": relation.tail_entity, "description": relation.description, "source": relation.source, "data_properties": relation.data_properties}
+        if vectors:
+            record["vector"] = encode_vector(knowledge_graph.relation_vdb.query_id(relation.id))
+        yield record
+
+
+def entity_from_record(record: dict) -> KGEntity:
+    return KGEntity(name=record["name"], data_properties=dict(record["data_properties"]), description=record["description"], types=list(record["types"]), relations=[])
+
+
+def relation_from_record(record: dict) -> KGRelation:
+    return KGRelation(name=record["name"], head_entity=record["head"], tail_entity=record["tail"], data_properties=dict(record["data_properties"]), description=record["description"], source=record["source"])
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def write_jsonl(path: str, records: Iterable[dict]) -> None:
+    """
+    Write records to a JSON lines file (gzip compressed if the path ends with .gz), one per line
+    """
+    with _open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record, default=str))
+            f.write('\n')
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    """
+    Records of a file written by write_jsonl, one at a time
+    """
+    with _open(path, 'r') as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if i == 0 and (record.get("kind") != "header" or record.get("format") != FORMAT_NAME):
+                raise Exception(f"{path} is not a knowledge graph JSON lines export")
+            yield record
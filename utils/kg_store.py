@@ -0,0 +1,375 @@
+"""
+Versioned columnar on-disk format of a KnowledgeGraph (a "bundle"), replaces pickling the whole object graph.
+
+A bundle is a directory holding a manifest.json and one .npy file per column:
+    names.*                  string table, entity names (row i = entity id i) followed by names only used by relations
+    entity.*                 entity columns, data_properties and types are stored as JSON blobs
+    relation.*               relation columns, head/tail are indices into the name table
+    adjacency.*              CSR adjacency over entity ids, so the relations of one entity can be read alone
+    {entity,relation}.version   version of the last write to each entity/relation (see KnowledgeGraph.diff)
+    {entity,relation,types}_vdb.*   ids and float32 vectors of the 3 vector databases
+    resolver.json            settings and alias table of the entity resolver (only if the graph has one)
+
+Every column can be memory-mapped, so a lazily loaded graph only decodes the entities, relations and
+vectors a question actually touches.
+"""
+from typing import Callable, Iterable, Iterator, List, Optional
+from collections.abc import MutableMapping, Sequence
+import bisect
+import json
+import os
+import pickle
+import shutil
+import sys
+import threading
+import numpy as np
+
+from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+from utils.edge_store import CSREdgeStore
+from utils.entity_resolution import EntityResolver
+from utils.vdb import VDB
+
+FORMAT_NAME = 'ukg-columnar'
+FORMAT_VERSION = 1
+
+
+def _load_array(path: str, mmap: bool) -> np.ndarray:
+    if not mmap:
+        return np.load(path)
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # empty arrays can't be memory-mapped
+        return np.load(path)
+
+
+def _save_strings(path: str, name: str, values: Iterable[str]) -> None:
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(os.path.join(path, f'{name}.offsets.npy'), offsets)
+    np.save(os.path.join(path, f'{name}.data.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+class StringColumn(Sequence):
+    """
+    Column of strings stored as one UTF-8 blob and an offsets array, rows are decoded on access
+    """
+    def __init__(self, path: str, name: str, mmap: bool=True, intern: bool=False):
+        self.offsets: np.ndarray = _load_array(os.path.join(path, f'{name}.offsets.npy'), mmap)
+        self.data: np.ndarray = _load_array(os.path.join(path, f'{name}.data.npy'), mmap)
+        self.intern: bool = intern
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        value = bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+        return sys.intern(value) if self.intern else value
+
+
+class JSONColumn(StringColumn):
+    """
+    Column of JSON blobs, rows are parsed on access
+    """
+    def __getitem__(self, i: int):
+        return json.loads(super().__getitem__(i))
+
+
+class LazyRows(Sequence):
+    """
+    List-like table whose rows are built on first access and then cached, so object identity is kept.
+    New rows can be appended like on a list. Building a row is locked, so concurrent readers of the same
+    row get the same object.
+    """
+    def __init__(self, count: int, build: Callable[[int], object]):
+        self._items: list = [None] * count
+        self._build: Callable[[int], object] = build
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        item = self._items[i]
+        if item is None:
+            i = range(len(self._items))[i]
+            with self._lock:
+                item = self._items[i]
+                if item is None:
+                    item = self._build(i)
+                    self._items[i] = item
+        return item
+
+    def __iter__(self) -> Iterator:
+        for i in range(len(self._items)):
+            yield self[i]
+
+    def append(self, item) -> None:
+        self._items.append(item)
+
+
+class LazyNameIndex(MutableMapping):
+    """
+    Name -> entity map of a lazily loaded graph. Names stored in the bundle are found by binary search
+    over a sorted permutation of the name column, entities added after loading go to a plain dict.
+    """
+    def __init__(self, names: StringColumn, order: np.ndarray, entity_list: LazyRows):
+        self._names: StringColumn = names
+        self._order: np.ndarray = order
+        self._entity_list: LazyRows = entity_list
+        self._added: dict = dict()
+
+    def _find(self, name: str) -> Optional[int]:
+        sorted_names = _SortedView(self._names, self._order)
+        position = bisect.bisect_left(sorted_names, name)
+        if position < len(sorted_names) and sorted_names[position] == name:
+            return int(self._order[position])
+        return None
+
+    def __getitem__(self, name: str) -> KGEntity:
+        if name in self._added:
+            return self._added[name]
+        entity_id = self._find(name)
+        if entity_id is None:
+            raise KeyError(name)
+        return self._entity_list[entity_id]
+
+    def __contains__(self, name) -> bool:
+        return name in self._added or self._find(name) is not None
+
+    def __setitem__(self, name: str, entity: KGEntity) -> None:
+        if self._find(name) is not None:
+            raise KeyError(f'{name} is already stored in the bundle')
+        self._added[name] = entity
+
+    def __delitem__(self, name: str) -> None:
+        del self._added[name]
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self._order)):
+            yield self._names[i]
+        yield from self._added
+
+    def __len__(self) -> int:
+        return len(self._order) + len(self._added)
+
+
+class _SortedView(Sequence):
+    def __init__(self, names: StringColumn, order: np.ndarray):
+        self.names = names
+        self.order = order
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, i: int) -> str:
+        return self.names[int(self.order[i])]
+
+
+def save_bundle(knowledge_graph: KnowledgeGraph, path: str) -> None:
+    """
+    Write the knowledge graph and its vector databases into a bundle directory. The bundle is written
+    next to the target and then moved into place, so readers never see a half-written bundle.
+
+    Parameters:
+    knowledge_graph (KnowledgeGraph): the graph to save
+    path (str): the bundle directory
+    """
+    path = path.rstrip('/')
+    tmp_path = f'{path}.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    entities = list(knowledge_graph.entity_list)
+    relations = list(knowledge_graph.relations)
+    np.save(os.path.join(tmp_path, 'entity.version.npy'), np.array(knowledge_graph.entity_versions[:len(entities)], dtype=np.int64))
+    np.save(os.path.join(tmp_path, 'relation.version.npy'), np.array(knowledge_graph.relation_versions[:len(relations)], dtype=np.int64))
+
+    # name table: entity names first so entity id == row, then names only referenced by relations
+    names = [entity.name for entity in entities]
+    name_codes = {name: code for code, name in enumerate(names)}
+    for relation in relations:
+        for name in (relation.head_entity, relation.tail_entity):
+            if name not in name_codes:
+                name_codes[name] = len(names)
+                names.append(name)
+    _save_strings(tmp_path, 'names', names)
+    np.save(os.path.join(tmp_path, 'entity.name_order.npy'), np.array(sorted(range(len(entities)), key=names.__getitem__), dtype=np.int64))
+
+    _save_strings(tmp_path, 'entity.description', (entity.description for entity in entities))
+    _save_strings(tmp_path, 'entity.types', (json.dumps(list(entity.types)) for entity in entities))
+    _save_strings(tmp_path, 'entity.data_properties', (json.dumps(entity.data_properties, default=str) for entity in entities))
+
+    # relation names repeat a lot, so they are dictionary-encoded
+    relation_names = dict()
+    for relation in relations:
+        relation_names.setdefault(relation.name, len(relation_names))
+    _save_strings(tmp_path, 'relation.name_dict', relation_names.keys())
+    np.save(os.path.join(tmp_path, 'relation.name.npy'), np.array([relation_names[relation.name] for relation in relations], dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'relation.head.npy'), np.array([name_codes[relation.head_entity] for relation in relations], dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'relation.tail.npy'), np.array([name_codes[relation.tail_entity] for relation in relations], dtype=np.int32))
+    _save_strings(tmp_path, 'relation.description', (relation.description for relation in relations))
+    _save_strings(tmp_path, 'relation.source', (relation.source for relation in relations))
+    _save_strings(tmp_path, 'relation.data_properties', (json.dumps(relation.data_properties, default=str) for relation in relations))
+
+    heads, tails, relation_ids = [], [], []
+    for entity in entities:
+        for relation in knowledge_graph.out_relations(entity):
+            heads.append(entity.id)
+            tails.append(name_codes[relation.tail_entity])
+            relation_ids.append(relation.id)
+    adjacency = CSREdgeStore.from_edges(len(entities), heads, tails, relation_ids)
+    np.save(os.path.join(tmp_path, 'adjacency.indptr.npy'), adjacency.indptr)
+    np.save(os.path.join(tmp_path, 'adjacency.tails.npy'), adjacency.tails)
+    np.save(os.path.join(tmp_path, 'adjacency.relation_ids.npy'), adjacency.relation_ids)
+
+    vdbs = dict()
+    for name, vdb in (('entity_vdb', knowledge_graph.entity_vdb), ('relation_vdb', knowledge_graph.relation_vdb), ('types_vdb', knowledge_graph.types_vdb)):
+        ids, vectors = vdb.to_arrays()
+        _save_strings(tmp_path, f'{name}.ids', ids)
+        np.save(os.path.join(tmp_path, f'{name}.vectors.npy'), np.asarray(vectors, dtype=np.float32))
+        vdbs[name] = {'count': len(ids), 'dimension': int(vectors.shape[1]), 'embedding': vdb.embedding}
+
+    resolver = knowledge_graph.resolver
+    if resolver is not None:
+        # LSH buckets are not saved, they are rebuilt from the entity vectors when the resolver is used
+        with open(os.path.join(tmp_path, 'resolver.json'), 'w') as f:
+            json.dump({'threshold': resolver.threshold, 'num_tables': resolver.num_tables, 'num_bits': resolver.num_bits, 'seed': resolver.seed, 'aliases': resolver.aliases}, f)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'num_entities': len(entities),
+        'num_relations': len(relations),
+        'num_names': len(names),
+        'graph_version': knowledge_graph.version,
+        'types': sorted(knowledge_graph.types),
+        'vdbs': vdbs,
+    }
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(path):
+        old_path = f'{path}.old'
+        os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(tmp_path, path)
+
+
+def load_bundle(path: str, lazy: bool=True) -> KnowledgeGraph:
+    """
+    Load a knowledge graph from a bundle directory
+
+    Parameters:
+    path (str): the bundle directory
+    lazy (bool): if True, columns are memory-mapped and entities/relations are only built when they are
+    accessed, else the whole graph is built in memory right away
+
+    Returns:
+    KnowledgeGraph: the graph, its vector databases are in memory only (not written to JSON files)
+    """
+    with open(os.path.join(path, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_NAME:
+        raise Exception(f"{path} is not a knowledge graph bundle")
+    if manifest['version'] > FORMAT_VERSION:
+        raise Exception(f"bundle version {manifest['version']} is newer than supported version {FORMAT_VERSION}")
+
+    column = lambda name: _load_array(os.path.join(path, f'{name}.npy'), lazy)
+    names = StringColumn(path, 'names', lazy, intern=True)
+    entity_description = StringColumn(path, 'entity.description', lazy)
+    entity_types = JSONColumn(path, 'entity.types', lazy)
+    entity_data_properties = JSONColumn(path, 'entity.data_properties', lazy)
+    relation_name_dict = StringColumn(path, 'relation.name_dict', lazy, intern=True)
+    relation_name = column('relation.name')
+    relation_head = column('relation.head')
+    relation_tail = column('relation.tail')
+    relation_description = StringColumn(path, 'relation.description', lazy)
+    relation_source = StringColumn(path, 'relation.source', lazy)
+    relation_data_properties = JSONColumn(path, 'relation.data_properties', lazy)
+
+    def build_entity(i: int) -> KGEntity:
+        entity = KGEntity(name=names[i], data_properties=entity_data_properties[i], description=entity_description[i], types=entity_types[i], relations=[] if not lazy else ())
+        entity.id = i
+        return entity
+
+    def build_relation(i: int) -> KGRelation:
+        relation = KGRelation(name=relation_name_dict[int(relation_name[i])], head_entity=names[int(relation_head[i])], tail_entity=names[int(relation_tail[i])], data_properties=relation_data_properties[i], description=relation_description[i], source=relation_source[i])
+        relation.id = i
+        return relation
+
+    knowledge_graph = KnowledgeGraph.__new__(KnowledgeGraph)
+    knowledge_graph._init_sync_state()
+    knowledge_graph._init_indexes()
+
+    def load_versions() -> None:
+        # bundles written before versions were recorded have everything at version 0
+        knowledge_graph.version = manifest.get('graph_version', 0)
+        for name, versions in (('entity', knowledge_graph.entity_versions), ('relation', knowledge_graph.relation_versions)):
+            if os.path.exists(os.path.join(path, f'{name}.version.npy')):
+                del versions[:]
+                versions.frombytes(np.asarray(column(f'{name}.version'), dtype=np.int64).tobytes())
+        knowledge_graph._pad_versions()
+    knowledge_graph.types = set(manifest['types'])
+    knowledge_graph.resolver = None
+    if os.path.exists(os.path.join(path, 'resolver.json')):
+        with open(os.path.join(path, 'resolver.json'), 'r') as f:
+            settings = json.load(f)
+        aliases = settings.pop('aliases')
+        knowledge_graph.resolver = EntityResolver(**settings)
+        knowledge_graph.resolver.aliases = aliases
+    for name in ('entity_vdb', 'relation_vdb', 'types_vdb'):
+        ids = StringColumn(path, f'{name}.ids', lazy)
+        vectors = column(f'{name}.vectors')
+        embedding = manifest['vdbs'][name].get('embedding', 'openai')
+        setattr(knowledge_graph, name, VDB.from_arrays(ids if lazy else list(ids), vectors if lazy else np.array(vectors), embedding=embedding))
+
+    if lazy:
+        knowledge_graph.entity_list = LazyRows(manifest['num_entities'], build_entity)
+        knowledge_graph.relations = LazyRows(manifest['num_relations'], build_relation)
+        knowledge_graph.entities = LazyNameIndex(names, column('entity.name_order'), knowledge_graph.entity_list)
+        knowledge_graph.edge_store = CSREdgeStore(column('adjacency.indptr'), column('adjacency.tails'), column('adjacency.relation_ids'))
+        load_versions()
+        return knowledge_graph
+
+    knowledge_graph.entities = dict()
+    knowledge_graph.entity_list = []
+    knowledge_graph.relations = []
+    knowledge_graph.edge_store = None
+    for i in range(manifest['num_entities']):
+        knowledge_graph._register_entity(build_entity(i))
+    for i in range(manifest['num_relations']):
+        knowledge_graph._register_relation(build_relation(i))
+    load_versions()
+    return knowledge_graph
+
+
+def load_knowledge_graph(path: str, lazy: bool=True) -> KnowledgeGraph:
+    """
+    Load a knowledge graph saved either as a bundle directory or (older format) as a pickle file
+
+    Parameters:
+    path (str): bundle directory or pickle file
+    lazy (bool): lazy loading, only used for bundles
+
+    Returns:
+    KnowledgeGraph: the graph
+    """
+    if os.path.isdir(path):
+        return load_bundle(path, lazy=lazy)
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+if __name__ == '__main__':
+    # migration: python -m utils.kg_store kg_save/knowledge_graph.pkl kg_save/knowledge_graph.ukg
+    if len(sys.argv) != 3:
+        print("Usage: python -m utils.kg_store <input .pkl or bundle> <output bundle>")
+        sys.exit(1)
+    save_bundle(load_knowledge_graph(sys.argv[1], lazy=False), sys.argv[2])
@@ -0,0 +1,163 @@
+"""
+String index over entity and relation names: a map of normalized names and a character-trigram inverted
+index. Most lookups that miss the exact name are trivial variations (case, punctuation, underscores,
+typos, and for relation names _Relation suffixes and plurals), the index resolves those with a Jaccard
+score in microseconds so that an embedding call is only needed when it can't decide. Names that are close
+in characters but differ by a number, an ordinal, a plural or a word ("Queen Elizabeth I"/"Queen Elizabeth
+II", "2015 Annual Report"/"2016 Annual Report", "Serena Williams"/"Serena William",
+"Chancellor_of"/"Vice_Chancellor_of") are never matched by their score, embeddings decide.
+"""
+from typing import Callable, Dict, List, Optional, Sequence
+from collections import Counter
+from array import array
+import re
+import threading
+from utils.normalize import normalize_name
+
+# words that tell two otherwise identical names apart
+ORDINAL_WORDS = frozenset(('first', 'second', 'third', 'fourth', 'fifth', 'sixth', 'seventh', 'eighth', 'ninth', 'tenth', 'junior', 'senior', 'jr', 'sr'))
+_ROMAN = re.compile(r'^[ivxlcdm]+$')
+
+
+def trigrams(normalized: str) -> set:
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def distinguishing(a: str, b: str) -> bool:
+    """
+    Whether two normalized names differ by something other than spelling: a word added or removed, a
+    differing word holding a digit, an ordinal or a roman numeral, or a word in plural in one name and in
+    singular in the other. Such names are never the same name written differently, however high their
+    trigram score
+    """
+    a_words, b_words = a.split(), b.split()
+    if len(a_words) != len(b_words):
+        return True
+    differing = set(a_words) ^ set(b_words)
+    for word in differing:
+        if any(c.isdigit() for c in word) or word in ORDINAL_WORDS or _ROMAN.match(word):
+            return True
+        if word + 's' in differing:
+            return True
+    return False
+
+
+def jaccard(a: set, b: set) -> float:
+    if len(a) == 0 and len(b) == 0:
+        return 1.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class NameIndex:
+    """
+    Index of the names of a growing sequence of items (entities or relations), item i having id i, the
+    names compared after normalize (normalize_label for relation names). Items added since the last
+    lookup are indexed lazily. A lookup returns the id of the item whose normalized name is the
+    same, or whose trigram Jaccard score is at least threshold and clearly above the second best (and that
+    is not distinguishing from it), None when this is ambiguous and embeddings should decide.
+
+    Trigrams shared by more than max_postings names are too common to tell names apart, they are not
+    used to find candidates.
+    """
+    def __init__(self, threshold: float=0.8, margin: float=0.1, max_postings: int=2000, max_candidates: int=32, normalize: Callable[[str], str]=normalize_name):
+        self.normalize: Callable[[str], str] = normalize
+        self.threshold: float = threshold
+        self.margin: float = margin
+        self.max_postings: int = max_postings
+        self.max_candidates: int = max_candidates
+        self.exact: Dict[str, List[int]] = dict()
+        # trigram -> ids, as compact arrays since there are about ten per name
+        self.postings: Dict[str, array] = dict()
+        self.normalized: List[str] = []
+        # lookups answered by the index, so without an embedding call, and lookups left to embeddings
+        self.exact_hits: int = 0
+        self.trigram_hits: int = 0
+        self.fallbacks: int = 0
+        self._lock = threading.Lock()
+
+    def catch_up(self, items: Sequence, name: Callable=lambda item: item.name) -> None:
+        """
+        Index the items of the sequence that are not indexed yet
+
+        Parameters:
+        items (Sequence): the items, item i has id i
+        name (Callable): item -> its name
+        """
+        if len(self.normalized) >= len(items):
+            return
+        with self._lock:
+            for id in range(len(self.normalized), len(items)):
+                normalized = self.normalize(name(items[id]))
+                self.exact.setdefault(normalized, []).append(id)
+                for gram in trigrams(normalized):
+                    self.postings.setdefault(gram, array('q')).append(id)
+                self.normalized.append(normalized)
+
+    def lookup(self, name: str, limit: Optional[int]=None) -> Optional[int]:
+        """
+        Id of the item the name refers to, if the string index can tell
+
+        Parameters:
+        name (str): the name to look up
+        limit (int or None): only ids below limit are considered (items visible in a snapshot)
+
+        Returns:
+        Optional[int]: the id, None if embeddings should decide
+        """
+        limit = len(self.normalized) if limit is None else min(limit, len(self.normalized))
+        normalized = self.normalize(name)
+        ids = [id for id in self.exact.get(normalized, ()) if id < limit]
+        if len(ids) == 1:
+            self.exact_hits += 1
+            return ids[0]
+        if len(ids) > 1:
+            self.fallbacks += 1
+            return None
+
+        query = trigrams(normalized)
+        shared = Counter()
+        for gram in query:
+            posting = self.postings.get(gram, ())
+            if len(posting) <= self.max_postings:
+                shared.update(posting)
+        scored = []
+        for id, _ in shared.most_common(self.max_candidates):
+            if id < limit:
+                scored.append((jaccard(query, trigrams(self.normalized[id])), id))
+        scored.sort(reverse=True)
+        if len(scored) != 0 and scored[0][0] >= self.threshold and (len(scored) == 1 or scored[1][0] <= scored[0][0] - self.margin) \
+                and not distinguishing(normalized, self.normalized[scored[0][1]]):
+            self.trigram_hits += 1
+            return scored[0][1]
+        self.fallbacks += 1
+        return None
+
+    def match(self, a: str, b: str) -> bool:
+        """
+        Whether two names are the same up to trivial variations. False means the string index can't
+        tell, not that they differ: embeddings should decide
+
+        Parameters:
+        a (str): a name
+        b (str): another name
+
+        Returns:
+        bool: True if they match
+        """
+        a, b = self.normalize(a), self.normalize(b)
+        if a == b:
+            self.exact_hits += 1
+            return True
+        if jaccard(trigrams(a), trigrams(b)) >= self.threshold and not distinguishing(a, b):
+            self.trigram_hits += 1
+            return True
+        self.fallbacks += 1
+        return False
+
+    def stats(self) -> dict:
+        """
+        Counters of the lookups, avoided_embeddings is the number of embedding calls saved
+        """
+        return {"names": len(self.normalized), "exact_hits": self.exact_hits, "trigram_hits": self.trigram_hits, "avoided_embeddings": self.exact_hits + self.trigram_hits, "fallbacks": self.fallbacks}
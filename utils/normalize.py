@@ -0,0 +1,55 @@
+"""
+Normalization of names and texts used as keys: relation dedup keys, name index entries, type index
+entries, property keys, cache keys of questions. They all build on the functions here so that the same
+name gets the same key everywhere.
+"""
+import re
+
+
+def normalize_spaces(text: str) -> str:
+    """
+    Lower case, runs of whitespace as single spaces, no surrounding spaces
+    """
+    return ' '.join(str(text).lower().split())
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lower case, runs of whitespace, underscores and punctuation as single spaces, no surrounding spaces
+    """
+    return re.sub(r'[\W_]+', ' ', str(text).lower()).strip()
+
+
+def normalize_name(name: str) -> str:
+    """
+    Entity names: lower case, underscores and punctuation as spaces. Words are kept as they are, since
+    "Williams" and "William" or "News" and "New" are different entities
+
+    Parameters:
+    name (str): entity name
+
+    Returns:
+    str: the normalized name
+    """
+    return normalize_text(name)
+
+
+def normalize_label(name: str) -> str:
+    """
+    Relation names and entity types: normalize_name, no _Relation suffix, words in singular
+
+    Parameters:
+    name (str): relation name or type
+
+    Returns:
+    str: the normalized name
+    """
+    name = normalize_name(name)
+    if name.endswith(' relation'):
+        name = name[:-len(' relation')]
+    words = []
+    for word in name.split():
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return ' '.join(words)
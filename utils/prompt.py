@@ -0,0 +1,256 @@
+"""
+Token-budgeted prompt building. The variable part of a prompt (sentences of a text, entities or relations
+of an answer) is packed in order until a token budget is spent, the item that overflows is truncated if
+enough of the budget is left for it to be useful and dropped otherwise, and the number of items left out
+is noted. Tokens are counted with tiktoken when it is installed, else estimated from the length of the
+text.
+
+Entities and relations are rendered compactly for prompts: no ids, no relation lists and no source
+excerpts, only what a model needs to phrase an answer.
+"""
+from typing import Dict, Iterable, List, Optional
+import functools
+import re
+import threading
+
+# tokens of a part below which it is dropped rather than truncated
+MIN_TRUNCATED_TOKENS = 16
+# average characters per token of English text, for the estimate without tiktoken
+CHARS_PER_TOKEN = 4
+# what ends a sentence for split_sentences and sentence_spans
+SENTENCE_END = '.?!;'
+
+_encodings = dict()
+_encodings_lock = threading.Lock()
+
+
+def _encoding(model: str):
+    """
+    tiktoken encoding of the model, None if tiktoken is not installed
+    """
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                import tiktoken
+            except ImportError:
+                _encodings[model] = None
+            else:
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        return _encodings[model]
+
+
+def count_tokens(text: str, model: str="gpt-4") -> int:
+    """
+    Number of tokens of the text for the model
+
+    Parameters:
+    text (str): the text
+    model (str): model the text is sent to
+
+    Returns:
+    int: the token count, estimated if tiktoken is not installed
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, budget: int, model: str="gpt-4") -> str:
+    """
+    The text cut to at most budget tokens, at a word boundary if there is one close to the cut, with an
+    ellipsis marking the cut
+
+    Parameters:
+    text (str): the text
+    budget (int): maximum number of tokens
+    model (str): model the text is sent to
+
+    Returns:
+    str: the text itself if it fits, else its beginning
+    """
+    if count_tokens(text, model) <= budget:
+        return text
+    if budget <= 1:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        cut = text[:(budget - 1) * CHARS_PER_TOKEN]
+    else:
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:budget - 1])
+    space = cut.rfind(" ")
+    if space > len(cut) * 3 // 4:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+
+class PromptBuilder:
+    """
+    Parts of a prompt added in order of importance under a token budget. Required parts are always kept
+    (and count against the budget), optional ones are kept while they fit.
+
+        builder = PromptBuilder(budget=1000)
+        builder.add(f"Question: {question}\\n", required=True)
+        builder.add_items((render_entity(entity) for entity in entities), prefix="Answer in knowledge graph: ")
+        prompt = builder.build()
+    """
+    def __init__(self, budget: int, model: str="gpt-4"):
+        self.budget: int = budget
+        self.model: str = model
+        self.used: int = 0
+        self.parts: List[str] = []
+        # optional parts and items that didn't fit, whole or in part
+        self.dropped: int = 0
+        self.truncated: int = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(self.budget - self.used, 0)
+
+    def _append(self, text: str, tokens: Optional[int]=None) -> None:
+        self.parts.append(text)
+        self.used += tokens if tokens is not None else count_tokens(text, self.model)
+
+    def add(self, text: str, required: bool=False) -> bool:
+        """
+        Add a part of the prompt
+
+        Parameters:
+        text (str): the part
+        required (bool): keep it whatever the budget left, else it is truncated or dropped if it doesn't fit
+
+        Returns:
+        bool: whether the part was added whole
+        """
+        tokens = count_tokens(text, self.model)
+        if required or tokens <= self.remaining:
+            self._append(text, tokens)
+            return True
+        if self.remaining >= MIN_TRUNCATED_TOKENS:
+            self._append(truncate_tokens(text, self.remaining, self.model))
+            self.truncated += 1
+        else:
+            self.dropped += 1
+        return False
+
+    def add_items(self, items: Iterable[str], separator: str="\n", prefix: str="", suffix: str="", reserve: int=0) -> int:
+        """
+        Add a list of items (sentences, rendered entities...) in order while they fit, followed by a note of
+        how many were left out
+
+        Parameters:
+        items (Iterable[str]): the items, most important first
+        separator (str): put between two items
+        prefix (str): put before the items, always kept
+        suffix (str): put after the items, always kept
+        reserve (int): tokens to leave for the parts added after the items
+
+        Returns:
+        int: number of items added (the last one possibly truncated)
+        """
+        self.add(prefix, required=True)
+        budget = self.budget
+        self.budget -= reserve + count_tokens(suffix, self.model)
+        items = iter(items)
+        added = 0
+        left_out = 0
+        for item in items:
+            truncated = self.truncated
+            if self.add(item if added == 0 else separator + item):
+                added += 1
+                continue
+            # the item is truncated or dropped, the next ones don't fit anyway
+            if self.truncated > truncated:
+                added += 1
+            else:
+                left_out += 1
+            left_out += sum(1 for _ in items)
+            break
+        self.budget = budget
+        if left_out != 0:
+            self.add(f"{separator}({left_out} more left out)", required=True)
+        self.add(suffix, required=True)
+        return added
+
+    def build(self) -> str:
+        return "".join(self.parts)
+
+
+@functools.lru_cache(maxsize=64)
+def split_sentences(text: str) -> tuple:
+    """
+    Sentences of a text, split like phrase_selection does. The same chunk is packed for every entity and
+    triplet extracted from it, so the last splits are cached
+    """
+    return tuple(sentence.strip() for sentence in re.split(f'[{SENTENCE_END}]', text) if sentence.strip())
+
+
+def sentence_spans(text: str) -> List[tuple]:
+    """
+    (start, end) of the sentences of a text in the text, the i-th span holding the i-th sentence of
+    split_sentences (before stripping)
+    """
+    return [match.span() for match in re.finditer(f'[^{SENTENCE_END}]+', text) if match.group(0).strip()]
+
+
+def pack_sentences(text: str, budget: int, terms: Iterable[str]=(), require_all: bool=False, model: str="gpt-4") -> str:
+    """
+    The sentences of a text that mention the terms (all the sentences if no term is given), in order,
+    under a token budget
+
+    Parameters:
+    text (str): the text
+    budget (int): maximum number of tokens
+    terms (Iterable[str]): names a sentence must contain to be kept
+    require_all (bool): a sentence must contain all of the terms, else one of them is enough
+    model (str): model the text is sent to
+
+    Returns:
+    str: the kept sentences, each followed by '. '
+    """
+    terms = [term for term in terms if term]
+    sentences = split_sentences(text)
+    if require_all:
+        for term in terms:
+            sentences = [sentence for sentence in sentences if term in sentence]
+    elif len(terms) != 0:
+        sentences = [sentence for sentence in sentences if any(term in sentence for term in terms)]
+    builder = PromptBuilder(budget, model)
+    for sentence in sentences:
+        if not builder.add(sentence + '. '):
+            break
+    return builder.build().strip()
+
+
+def _render_properties(data_properties: Dict[str, str]) -> str:
+    return ", ".join(f"{key}: {value}" for key, value in data_properties.items())
+
+
+def render_entity(entity) -> str:
+    """
+    One-line rendering of an entity for prompts: name, types, description and attributes
+    """
+    text = entity.name
+    if entity.types:
+        text += f" ({', '.join(entity.types)})"
+    if entity.description:
+        text += f": {entity.description.strip()}"
+    if entity.data_properties:
+        text += f" [{_render_properties(entity.data_properties)}]"
+    return text
+
+
+def render_relation(relation) -> str:
+    """
+    One-line rendering of a relation for prompts: the triplet, its attributes and description
+    """
+    name = relation.name[:-len("_Relation")] if relation.name.endswith("_Relation") else relation.name
+    text = f"{relation.head_entity} -[{name.replace('_', ' ')}]-> {relation.tail_entity}"
+    if relation.data_properties:
+        text += f" [{_render_properties(relation.data_properties)}]"
+    if relation.description:
+        text += f": {relation.description.strip()}"
+    return text
@@ -0,0 +1,336 @@
+"""
+Secondary indexes over the data_properties of entities or relations: a hash index of exact (normalized)
+values per property key, and an interval tree over the period each item holds, taken from its
+start_time/end_time-style properties. They answer attribute-filtered and time-scoped lookups locally.
+
+Times are years, year-months or dates ("2015", "2015-09", "2015-09-01", "September 2015") mapped to
+fractional years; a period is the span from the first to the last time of a text ("2015-2016").
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+import re
+import threading
+import numpy as np
+from utils.normalize import normalize_spaces, normalize_text
+
+# property keys giving the start, the end, or both (a single point in time) of the period of an item
+START_KEYS = ('start_time', 'start_date', 'start', 'start_year', 'from', 'since', 'begin', 'began')
+END_KEYS = ('end_time', 'end_date', 'end', 'end_year', 'to', 'until', 'ended')
+POINT_KEYS = ('time', 'date', 'year', 'point_in_time')
+# values of an end property meaning the period is not over
+OPEN_ENDS = ('present', 'now', 'current', 'ongoing', 'today')
+
+MONTHS = {month: i + 1 for i, month in enumerate(('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'))}
+_DATE = re.compile(r'\b(\d{4})(?:[-/.](\d{1,2})(?:[-/.](\d{1,2}))?)?\b|\b([a-z]{3})[a-z]*\.?\s+(?:(\d{1,2}),?\s+)?(\d{4})\b')
+
+
+def normalize_key(key: str) -> str:
+    return normalize_text(key).replace(' ', '_')
+
+
+def normalize_value(value) -> str:
+    return normalize_spaces(value)
+
+
+def parse_times(text) -> List[Tuple[float, float]]:
+    """
+    The times written in a text, each as the (first, last) instant it covers in fractional years:
+    "2015" covers the whole year, "2015-09" a month
+
+    Parameters:
+    text (str): the text
+
+    Returns:
+    list[(float, float)]: the times, in order of appearance
+    """
+    times = []
+    for match in _DATE.finditer(str(text).lower()):
+        if match.group(1) is not None:
+            year, month, day = int(match.group(1)), match.group(2), match.group(3)
+        else:
+            if not match.group(4) in MONTHS:
+                continue
+            year, month, day = int(match.group(6)), MONTHS[match.group(4)], match.group(5)
+        month = int(month) if month is not None else None
+        day = int(day) if day is not None else None
+        if month is None:
+            times.append((float(year), year + 1 - 1e-6))
+        elif not 1 <= month <= 12:
+            continue
+        elif day is None or not 1 <= day <= 31:
+            low = year + (month - 1) / 12
+            times.append((low, low + 1 / 12 - 1e-6))
+        else:
+            low = year + (month - 1) / 12 + (day - 1) / 372
+            times.append((low, low + 1 / 372 - 1e-6))
+    return times
+
+
+def parse_period(text) -> Optional[Tuple[float, float]]:
+    """
+    The period a text refers to, from the start of its first time to the end of its last one
+
+    Parameters:
+    text (str): e.g. "2015", "2015-2016", "from September 2015 to 2016"
+
+    Returns:
+    Optional[(float, float)]: the period, None if the text holds no time
+    """
+    times = parse_times(text)
+    if len(times) == 0:
+        return None
+    return (times[0][0], max(high for _, high in times))
+
+
+def property_period(properties: Dict[str, str]) -> Optional[Tuple[float, float]]:
+    """
+    The period an entity or relation holds according to its properties: from its start time to its end
+    time, unbounded on a side that is missing or open ("present")
+
+    Parameters:
+    properties (Dict[str, str]): data_properties
+
+    Returns:
+    Optional[(float, float)]: the period, None if no property gives a time
+    """
+    low, high = None, None
+    for key, value in properties.items():
+        key = normalize_key(key)
+        if key in START_KEYS:
+            period = parse_period(value)
+            if period is not None:
+                low = period[0] if low is None else min(low, period[0])
+        elif key in END_KEYS:
+            if normalize_value(value) in OPEN_ENDS:
+                high = math.inf
+                continue
+            period = parse_period(value)
+            if period is not None:
+                high = period[1] if high is None else max(high, period[1])
+        elif key in POINT_KEYS:
+            period = parse_period(value)
+            if period is not None:
+                low = period[0] if low is None else min(low, period[0])
+                high = period[1] if high is None else max(high, period[1])
+    if low is None and high is None:
+        return None
+    return (low if low is not None else -math.inf, high if high is not None else math.inf)
+
+
+def value_matches(value, wanted) -> bool:
+    """
+    Whether a property value matches the value of a filter: the same up to case and spaces, or both are
+    times and the value lies in the filter's period ("2015" matches "2015-09-01")
+    """
+    if normalize_value(value) == normalize_value(wanted):
+        return True
+    period, wanted_period = parse_period(value), parse_period(wanted)
+    return period is not None and wanted_period is not None and wanted_period[0] <= period[0] and period[1] <= wanted_period[1]
+
+
+def periods_overlap(period: Tuple[float, float], wanted: Tuple[float, float]) -> bool:
+    """
+    Whether the period of an item overlaps the wanted one by more than a boundary year. Periods given in
+    years share their boundary year with the next one (a chancellor from 2011 to 2015, the next one from
+    2015 to 2016), so an overlap of at most a year made of the last year of one period and the first year
+    of the other doesn't count, unless one of the periods lies within it ("during 2015" still matches
+    2011-2015)
+
+    Parameters:
+    period ((float, float)): period of the item
+    wanted ((float, float)): period of the filter
+
+    Returns:
+    bool: True if the item holds during the wanted period
+    """
+    low, high = max(period[0], wanted[0]), min(period[1], wanted[1])
+    if high < low:
+        return False
+    if (low, high) == period or (low, high) == wanted or high - low > 1:
+        return True
+    touching = (low == wanted[0] and high == period[1]) or (low == period[0] and high == wanted[1])
+    return not touching
+
+
+class IntervalTree:
+    """
+    Static interval tree: intervals sorted by start in arrays, seen as an implicit balanced binary tree
+    (the node of a range is its middle) where each node knows the largest end of its range
+    """
+    def __init__(self, ids: Sequence[int], lows: Sequence[float], highs: Sequence[float]):
+        order = np.argsort(np.asarray(lows, dtype=np.float64), kind='stable')
+        self.ids: np.ndarray = np.asarray(ids, dtype=np.int64)[order]
+        self.lows: np.ndarray = np.asarray(lows, dtype=np.float64)[order]
+        self.highs: np.ndarray = np.asarray(highs, dtype=np.float64)[order]
+        self.max_highs: np.ndarray = np.empty(len(self.ids), dtype=np.float64)
+        self._build(0, len(self.ids))
+
+    def _build(self, start: int, end: int) -> float:
+        if start >= end:
+            return -math.inf
+        middle = (start + end) // 2
+        self.max_highs[middle] = max(self.highs[middle], self._build(start, middle), self._build(middle + 1, end))
+        return self.max_highs[middle]
+
+    def overlapping(self, low: float, high: float) -> List[int]:
+        """
+        Ids of the intervals overlapping [low, high]
+        """
+        result = []
+        stack = [(0, len(self.ids))]
+        while len(stack) != 0:
+            start, end = stack.pop()
+            if start >= end:
+                continue
+            middle = (start + end) // 2
+            if self.max_highs[middle] < low:
+                # nothing in this range ends after the query starts
+                continue
+            stack.append((start, middle))
+            if self.lows[middle] <= high:
+                if self.highs[middle] >= low:
+                    result.append(int(self.ids[middle]))
+                # the right part starts later, it can only overlap if this one starts before the query ends
+                stack.append((middle + 1, end))
+        return result
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class PropertyIndex:
+    """
+    Exact-value and period indexes over the data_properties of a growing sequence of items (entities or
+    relations), item i having id i. Items added since the last lookup are indexed lazily, items whose
+    properties change (merges) are re-indexed with update(). The interval tree is rebuilt on the first
+    lookup after the periods changed.
+    """
+    def __init__(self):
+        # normalized key -> normalized value -> ids
+        self.values: Dict[str, Dict[str, List[int]]] = dict()
+        # id -> period of the items that have one
+        self.periods: Dict[int, Tuple[float, float]] = dict()
+        self.count: int = 0
+        self._tree: Optional[IntervalTree] = None
+        self._lock = threading.Lock()
+
+    def _add(self, id: int, properties: Dict[str, str]) -> None:
+        for key, value in properties.items():
+            ids = self.values.setdefault(normalize_key(key), dict()).setdefault(normalize_value(value), [])
+            if len(ids) == 0 or ids[-1] != id:
+                ids.append(id)
+        period = property_period(properties)
+        if period is not None and self.periods.get(id) != period:
+            self.periods[id] = period
+            self._tree = None
+
+    def catch_up(self, items: Sequence) -> None:
+        """
+        Index the items of the sequence that are not indexed yet
+
+        Parameters:
+        items (Sequence): the items, item i has id i
+        """
+        if self.count >= len(items):
+            return
+        with self._lock:
+            for id in range(self.count, len(items)):
+                self._add(id, items[id].data_properties)
+            self.count = max(self.count, len(items))
+
+    def update(self, item) -> None:
+        """
+        Re-index an item whose properties changed, if it was indexed already
+        """
+        with self._lock:
+            if item.id is not None and item.id < self.count:
+                self._add(item.id, item.data_properties)
+
+    def lookup(self, key: str, value, limit: Optional[int]=None) -> List[int]:
+        """
+        Ids of the items whose property key has the value (up to case and spaces)
+
+        Parameters:
+        key (str): property key
+        value (str): property value
+        limit (int or None): only ids below limit are returned (items visible in a snapshot)
+
+        Returns:
+        list[int]: the ids
+        """
+        ids = self.values.get(normalize_key(key), dict()).get(normalize_value(value), ())
+        return [id for id in ids if limit is None or id < limit]
+
+    def overlapping(self, low: float, high: float, limit: Optional[int]=None) -> List[int]:
+        """
+        Ids of the items whose period overlaps [low, high]
+
+        Parameters:
+        low (float): start of the period, in fractional years
+        high (float): end of the period
+        limit (int or None): only ids below limit are returned
+
+        Returns:
+        list[int]: the ids, in increasing order
+        """
+        tree = self._tree
+        if tree is None:
+            with self._lock:
+                if self._tree is None:
+                    periods = list(self.periods.items())
+                    self._tree = IntervalTree([id for id, _ in periods], [period[0] for _, period in periods], [period[1] for _, period in periods])
+                tree = self._tree
+        return sorted(id for id in tree.overlapping(low, high) if limit is None or id < limit)
+
+    def candidates(self, filters: Dict[str, str], limit: Optional[int]=None) -> Optional[set]:
+        """
+        Ids of the items that may pass the filters (see properties_match), from the exact-value index for
+        plain values and from the interval tree for "during" and time values of start/end keys; None if
+        no filter can use an index
+
+        Parameters:
+        filters (Dict[str, str]): property key -> wanted value
+        limit (int or None): only ids below limit are returned
+
+        Returns:
+        Optional[set]: ids of a superset of the matching items, the smallest the indexes give
+        """
+        result = None
+        for key, wanted in filters.items():
+            key = normalize_key(key)
+            period = parse_period(wanted)
+            if key == 'during' or (period is not None and key in START_KEYS + END_KEYS + POINT_KEYS):
+                if period is None:
+                    return set()
+                ids = set(self.overlapping(period[0], period[1], limit))
+            elif period is None:
+                ids = set(self.lookup(key, wanted, limit))
+            else:
+                # a time value of another key, only checked on the items themselves
+                continue
+            result = ids if result is None else result & ids
+        return result
+
+
+def properties_match(properties: Dict[str, str], filters: Dict[str, str]) -> bool:
+    """
+    Whether data_properties pass the filters: every filtered key has a matching value (see value_matches),
+    and the period of the properties overlaps the one of the special key "during" (see periods_overlap)
+
+    Parameters:
+    properties (Dict[str, str]): data_properties of an entity or relation
+    filters (Dict[str, str]): property key -> wanted value
+
+    Returns:
+    bool: True if all the filters pass
+    """
+    normalized = {normalize_key(key): value for key, value in properties.items()}
+    for key, wanted in filters.items():
+        key = normalize_key(key)
+        if key == 'during':
+            period, wanted_period = property_period(properties), parse_period(wanted)
+            if period is None or wanted_period is None or not periods_overlap(period, wanted_period):
+                return False
+        elif not key in normalized or not value_matches(normalized[key], wanted):
+            return False
+    return True
@@ -0,0 +1,229 @@
+"""
+Conjunctive queries over a KnowledgeGraph: a list of triple patterns whose heads, relations and tails
+are either constants or variables ("?x"), optionally filtering the attributes of the relation (see
+utils.property_index, "during" filters on the period of the relation). They are evaluated over the
+adjacency of the graph, an index of relations by name and by tail and the property indexes, joining the
+patterns in order of selectivity, without any LLM call.
+
+    graph.query([("?x", "Chancellor_of", "UIUC", {"during": "2015-2016"}), ("?x", "?r", "?y")])
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Union
+from array import array
+import threading
+
+from utils.normalize import normalize_label
+from utils.property_index import properties_match
+
+if TYPE_CHECKING:
+    from KnowledgeGraph import KnowledgeGraph, KGEntity, KGRelation
+
+
+def is_variable(term) -> bool:
+    return isinstance(term, str) and term.startswith('?')
+
+
+class TriplePattern:
+    """
+    (head, relation, tail) where each term is a name or a variable. Variables of the head and tail bind
+    to entities, a variable of the relation binds to the relation itself. properties are attribute values
+    the relation must have.
+    """
+    def __init__(self, head: str, relation: str, tail: str, properties: Optional[Dict[str, str]]=None):
+        self.head: str = head
+        self.relation: str = relation
+        self.tail: str = tail
+        self.properties: Dict[str, str] = dict(properties or {})
+
+    @staticmethod
+    def coerce(pattern: Union[TriplePattern, Sequence]) -> TriplePattern:
+        """
+        A pattern given as a (head, relation, tail) or (head, relation, tail, properties) sequence
+        """
+        if isinstance(pattern, TriplePattern):
+            return pattern
+        if not len(pattern) in (3, 4):
+            raise Exception(f"a triple pattern has 3 terms and optional properties, got {pattern!r}")
+        return TriplePattern(*pattern)
+
+    def variables(self) -> set:
+        return {term for term in (self.head, self.relation, self.tail) if is_variable(term)}
+
+    def __repr__(self):
+        return f"TriplePattern({self.head!r}, {self.relation!r}, {self.tail!r}, {self.properties!r})"
+
+
+class RelationIndex:
+    """
+    Relation ids by normalized relation name and by tail entity name, the head side being the adjacency
+    of the graph. Relations are append-only with dense ids, the ones added since the last query are
+    indexed lazily.
+    """
+    def __init__(self):
+        self.by_name: Dict[str, array] = dict()
+        self.by_tail: Dict[str, array] = dict()
+        self.count: int = 0
+        self._lock = threading.Lock()
+
+    def catch_up(self, relations: Sequence) -> None:
+        if self.count >= len(relations):
+            return
+        with self._lock:
+            for id in range(self.count, len(relations)):
+                relation = relations[id]
+                self.by_name.setdefault(normalize_label(relation.name), array('q')).append(id)
+                self.by_tail.setdefault(relation.tail_entity, array('q')).append(id)
+            self.count = max(self.count, len(relations))
+
+
+class _Step:
+    """
+    A pattern with its constants resolved: entities for the head and tail, the set of relation ids its
+    relation name matches and a superset of the ids of the relations passing its property filters
+    """
+    def __init__(self, pattern: TriplePattern, head: Optional[KGEntity], tail: Optional[KGEntity], relation_ids: Optional[set], property_ids: Optional[set]):
+        self.pattern = pattern
+        self.head = head
+        self.tail = tail
+        self.relation_ids = relation_ids
+        self.property_ids = property_ids
+
+
+class QueryEngine:
+    """
+    Evaluation of a list of triple patterns over one graph (or snapshot)
+    """
+    def __init__(self, graph: KnowledgeGraph):
+        self.graph = graph
+        self.index: RelationIndex = graph.relation_index
+        self.index.catch_up(graph.relations)
+        self.limit: int = len(graph.relations)
+
+    def _relation_ids(self, name: str) -> set:
+        """
+        Ids of the relations with the given name, up to trivial variations, or else similar to it in
+        embedding space
+        """
+        ids = self.index.by_name.get(normalize_label(name))
+        if ids is not None:
+            return {id for id in ids if id < self.limit}
+        vdb = self.graph.relation_vdb
+        return {int(match['id']) for match in vdb.query_range(vdb.embed(name), vdb.threshold)}
+
+    def _tail_relations(self, entity: KGEntity) -> list:
+        relations = self.graph.relations
+        return [relations[id] for id in self.index.by_tail.get(entity.name, ()) if id < self.limit]
+
+    def _candidates(self, step: _Step, head: Optional[KGEntity], tail: Optional[KGEntity]) -> list:
+        """
+        Relations that may match the step, read from the smallest of the available indexes
+        """
+        options = []
+        if head is not None:
+            options.append(self.graph.out_relations(head))
+        if tail is not None:
+            options.append(self._tail_relations(tail))
+        id_sets = [ids for ids in (step.relation_ids, step.property_ids) if ids is not None]
+        options += id_sets
+        if len(options) == 0:
+            return self.graph.relations
+        smallest = min(options, key=len)
+        if any(smallest is ids for ids in id_sets):
+            return [self.graph.get_relation(id) for id in sorted(smallest)]
+        return smallest
+
+    def _estimate(self, step: _Step) -> int:
+        """
+        Number of relations the step matches at most, counting its constants only
+        """
+        sizes = [len(self.graph.relations)]
+        if step.head is not None:
+            sizes.append(len(self.graph.out_relations(step.head)))
+        if step.tail is not None:
+            sizes.append(len(self.index.by_tail.get(step.tail.name, ())))
+        if step.relation_ids is not None:
+            sizes.append(len(step.relation_ids))
+        if step.property_ids is not None:
+            sizes.append(len(step.property_ids))
+        return min(sizes)
+
+    def _order(self, steps: List[_Step]) -> List[_Step]:
+        """
+        Join order: the most selective step first, then always the most selective step sharing a variable
+        with the ones already joined (a step sharing none would multiply the bindings)
+        """
+        estimates = {id(step): self._estimate(step) for step in steps}
+        remaining = list(steps)
+        bound = set()
+        ordered = []
+        while len(remaining) != 0:
+            connected = [step for step in remaining if step.pattern.variables() & bound]
+            step = min(connected or remaining, key=lambda step: estimates[id(step)])
+            remaining.remove(step)
+            ordered.append(step)
+            bound |= step.pattern.variables()
+        return ordered
+
+    def _extend(self, step: _Step, binding: dict) -> list:
+        """
+        Bindings extending the given one with the matches of the step
+        """
+        pattern = step.pattern
+        head = binding.get(pattern.head) if is_variable(pattern.head) else step.head
+        tail = binding.get(pattern.tail) if is_variable(pattern.tail) else step.tail
+        bound_relation = binding.get(pattern.relation) if is_variable(pattern.relation) else None
+        candidates = [bound_relation] if bound_relation is not None else self._candidates(step, head, tail)
+
+        results = []
+        for relation in candidates:
+            if relation.id >= self.limit:
+                continue
+            if step.relation_ids is not None and not relation.id in step.relation_ids:
+                continue
+            if head is not None and relation.head_entity != head.name:
+                continue
+            if tail is not None and relation.tail_entity != tail.name:
+                continue
+            if step.property_ids is not None and not relation.id in step.property_ids:
+                continue
+            if len(pattern.properties) != 0 and not properties_match(relation.data_properties, pattern.properties):
+                continue
+            extended = dict(binding)
+            if head is None:
+                extended[pattern.head] = self.graph.entities[relation.head_entity]
+            if tail is None:
+                if pattern.tail == pattern.head and relation.tail_entity != relation.head_entity:
+                    continue
+                extended[pattern.tail] = self.graph.entities[relation.tail_entity]
+            if is_variable(pattern.relation):
+                extended[pattern.relation] = relation
+            results.append(extended)
+        return results
+
+    def run(self, patterns: Sequence, limit: Optional[int]=None) -> List[dict]:
+        steps = []
+        for pattern in patterns:
+            pattern = TriplePattern.coerce(pattern)
+            terms = dict()
+            for term in (pattern.head, pattern.tail):
+                if not is_variable(term) and not term in terms:
+                    terms[term] = self.graph.find_entity(term)
+                    if terms[term] is None:
+                        # a constant that is not in the graph, nothing can match
+                        return []
+            relation_ids = None if is_variable(pattern.relation) else self._relation_ids(pattern.relation)
+            property_ids = self.graph.filtered_relation_ids(pattern.properties) if len(pattern.properties) != 0 else None
+            if (relation_ids is not None and len(relation_ids) == 0) or (property_ids is not None and len(property_ids) == 0):
+                return []
+            steps.append(_Step(pattern, terms.get(pattern.head), terms.get(pattern.tail), relation_ids, property_ids))
+
+        bindings = [dict()]
+        for step in self._order(steps):
+            extended = []
+            for binding in bindings:
+                extended += self._extend(step, binding)
+            bindings = extended
+            if len(bindings) == 0:
+                break
+        return bindings if limit is None else bindings[:limit]
@@ -0,0 +1,135 @@
+"""
+Multi-process scoring of a large vector matrix. The rows are split into shards scored in parallel by a
+pool of worker processes. The matrix and its norms are shared with the workers and never copied per
+query:
+- a memory-mapped matrix (a loaded bundle) is opened from its file by every worker;
+- an in-memory one is copied once into shared memory.
+Each worker returns the top rows of its shards, and the parent merges them.
+"""
+from typing import List, Optional, Tuple
+import os
+import weakref
+import numpy as np
+
+# matrix and norms of the worker process, attached once by _attach
+_matrix: Optional[np.ndarray] = None
+_norms: Optional[np.ndarray] = None
+_segments: list = []
+
+
+def _open(source: tuple, shape: tuple) -> np.ndarray:
+    kind, location, offset = source
+    if kind == 'file':
+        return np.memmap(location, dtype=np.float32, mode='r', offset=offset, shape=shape)
+    from multiprocessing import shared_memory
+    segment = shared_memory.SharedMemory(name=location)
+    # keep the segment open as long as the array is used
+    _segments.append(segment)
+    return np.ndarray(shape, dtype=np.float32, buffer=segment.buf, offset=offset)
+
+
+def _attach(matrix_source: tuple, norms_source: tuple, size: int, dimension: int) -> None:
+    global _matrix, _norms
+    _matrix = _open(matrix_source, (size, dimension))
+    _norms = _open(norms_source, (size,))
+
+
+def _score_shard(start: int, end: int, queries: np.ndarray, count: int, threshold: Optional[float]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    For each unit query, the count best rows of the shard [start, end), or all the rows scoring at least
+    threshold if it is given, as (rows, scores)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.nan_to_num((_matrix[start:end] @ queries.T) / _norms[start:end, None], nan=-1.0)
+    result = []
+    for j in range(len(queries)):
+        column = scores[:, j]
+        if threshold is not None:
+            rows = np.nonzero(column >= threshold)[0]
+        elif count < len(column):
+            rows = np.argpartition(-column, count - 1)[:count]
+        else:
+            rows = np.arange(len(column))
+        result.append((rows + start, column[rows]))
+    return result
+
+
+class ShardedScorer:
+    """
+    Scores unit queries against the first size rows of a matrix with a pool of worker processes, one
+    shard of rows per worker by default. Rows added to the matrix later are not seen, the VDB scores them
+    itself and rebuilds the scorer once they are many.
+    """
+    def __init__(self, vectors: np.ndarray, norms: np.ndarray, size: int, processes: Optional[int]=None, num_shards: Optional[int]=None):
+        # imported here, most processes never shard and these imports slow down their start
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context, shared_memory
+        self.size: int = size
+        self.dimension: int = vectors.shape[1]
+        self.processes: int = processes or os.cpu_count() or 1
+        num_shards = num_shards or self.processes
+        bounds = np.linspace(0, size, num_shards + 1).astype(np.int64)
+        self.shards: List[Tuple[int, int]] = [(int(bounds[i]), int(bounds[i + 1])) for i in range(num_shards) if bounds[i] < bounds[i + 1]]
+        segments = []
+
+        def share(array: np.ndarray) -> tuple:
+            if isinstance(array, np.memmap) and array.filename is not None and array.dtype == np.float32 and array.flags.c_contiguous:
+                # the workers map the same file (its first size rows), nothing is copied
+                return ('file', array.filename, array.offset)
+            segment = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, dtype=np.float32, buffer=segment.buf)[:] = array
+            segments.append(segment)
+            return ('shm', segment.name, 0)
+
+        matrix_source = share(vectors if isinstance(vectors, np.memmap) else vectors[:size])
+        norms_source = share(np.ascontiguousarray(norms[:size], dtype=np.float32))
+        # workers are spawned (not forked) since the parent runs threads
+        self.pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=get_context('spawn'), initializer=_attach, initargs=(matrix_source, norms_source, size, self.dimension))
+        self._finalizer = weakref.finalize(self, ShardedScorer._release, self.pool, segments)
+
+    @staticmethod
+    def _release(pool, segments: list) -> None:
+        pool.shutdown(wait=True, cancel_futures=True)
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+    def close(self) -> None:
+        """
+        Stop the workers and free the shared memory
+        """
+        self._finalizer()
+
+    def _run(self, queries: np.ndarray, count: int, threshold: Optional[float]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        futures = [self.pool.submit(_score_shard, start, end, queries, count, threshold) for start, end in self.shards]
+        parts = [future.result() for future in futures]
+        merged = []
+        for j in range(len(queries)):
+            rows = np.concatenate([part[j][0] for part in parts])
+            scores = np.concatenate([part[j][1] for part in parts])
+            merged.append((rows, scores))
+        return merged
+
+    def top(self, queries: np.ndarray, count: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        The count best rows of each unit query, as (rows, scores) best first
+        """
+        result = []
+        for rows, scores in self._run(queries, count, None):
+            if count < len(scores):
+                keep = np.argpartition(-scores, count - 1)[:count]
+                rows, scores = rows[keep], scores[keep]
+            order = np.argsort(-scores, kind='stable')
+            result.append((rows[order], scores[order]))
+        return result
+
+    def above(self, queries: np.ndarray, threshold: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        The rows scoring at least threshold with each unit query, as (rows, scores) best first
+        """
+        result = []
+        for rows, scores in self._run(queries, 0, threshold):
+            order = np.argsort(-scores, kind='stable')
+            result.append((rows[order], scores[order]))
+        return result
@@ -1,34 +1,221 @@
 """
-Implementation of a vector database, not used in the final version
+Implementation of a vector database
 """
-from utils.similarity import cosine_similarity
+from typing import Optional, Dict, List
+import atexit
 import json
 import os
+import threading
+import time
+import weakref
+import numpy as np
+from utils.batching import Batcher
+from utils.embedding import EmbeddingProvider, get_embedding
+from utils.sharding import ShardedScorer
+
+# databases with inserts not written to their JSON file yet, written at exit
+_unsaved = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all() -> None:
+    for vdb in list(_unsaved):
+        try:
+            vdb.flush()
+        except OSError as oops:
+            # e.g. the directory of a throwaway graph is already gone
+            print(f"Could not write {vdb.vdb_file}: {oops}")
+
 
 class VDB:
     """
-    Class to manage a vector database, currently one vector database is stored in one JSON file
+    Class to manage a vector database. Vectors are kept in memory as one float32 matrix (row i belongs to
+    ids[i]), if vdb_file is given the inserts are also written to that JSON file, at most every
+    SAVE_INTERVAL seconds (see flush). Ids can be given as int or str, they are stored as strings since
+    JSON keys are always strings.
+    Inserts are serialized by a lock. Readers don't lock: rows are only appended and a full matrix is
+    replaced (never resized in place) when it grows or a row is updated, so a reader always sees a
+    consistent prefix.
+    Norms of the rows are computed once and kept, and large databases get a coarse cluster index that
+    lets threshold queries skip whole clusters. With enable_sharding, scans of the whole matrix are split
+    into shards scored by a pool of worker processes (see utils.sharding).
+    The embedding is the name of the provider (see utils.embedding) the vectors come from, it embeds the
+    queries and gives the similarity threshold for matching names.
     """
-    def __init__(self, vdb_file: str, empty_db=True):
-        self.vdb_file = vdb_file
+    # number of rows from which threshold queries build a coarse index
+    COARSE_MIN_ROWS = 20000
+    # fraction of the rows above which scanning the candidate clusters is slower than one matrix product
+    COARSE_MAX_SCAN = 0.3
+    # number of rows from which full scans are sharded across worker processes, once sharding is enabled
+    SHARD_MIN_ROWS = 1000000
+    # seconds between two writes of the whole JSON file, the inserts in between are written by the next
+    # one, by flush() or at exit
+    SAVE_INTERVAL = 10.0
+
+    def __init__(self, vdb_file: Optional[str], empty_db=True, embedding: str='openai'):
+        self.vdb_file: Optional[str] = vdb_file
+        self.embedding: str = embedding
+        self.provider: EmbeddingProvider = get_embedding(embedding)
+        self.ids: List[str] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.size: int = 0
+        self.norms: Optional[np.ndarray] = None
+        self._normed: int = 0
+        self.coarse: Optional[CoarseIndex] = None
+        # coalesces concurrent query_best calls, see enable_batching
+        self.batcher = None
+        # settings of enable_sharding, and the worker pool scoring the rows once it is started
+        self.sharding: Optional[dict] = None
+        self.sharded: Optional[ShardedScorer] = None
+        self._rows: Optional[Dict[str, int]] = dict()
+        self.read_only: bool = False
+        self._lock: threading.RLock = threading.RLock()
+        self._saved_at: float = time.monotonic()
+        self._dirty: bool = False
+        if vdb_file is None:
+            return
         if empty_db:
             self.empty_db()
+        else:
+            self.load()
+
+    @classmethod
+    def from_arrays(cls, ids: List[str], vectors: np.ndarray, vdb_file: Optional[str]=None, embedding: str='openai') -> 'VDB':
+        """
+        Create a vector database from ids and a matrix (which can be memory-mapped), nothing is written
+        to disk
+
+        Parameters:
+        ids (list[str]): id of each row of the matrix, any sequence of strings works
+        vectors (np.ndarray): matrix of shape (len(ids), dimension)
+        vdb_file (str or None): JSON file to write new inserts through to
+        embedding (str): name of the embedding provider of the vectors
+
+        Returns:
+        VDB: the vector database
+        """
+        vdb = cls(None, embedding=embedding)
+        vdb.vdb_file = vdb_file
+        vdb.ids = ids
+        vdb.vectors = vectors if len(ids) != 0 else None
+        vdb.size = len(ids)
+        # the id -> row map is only built when an id is looked up
+        vdb._rows = None
+        return vdb
+
+    def embed(self, content: str) -> list[float]:
+        """
+        Embed a text with the provider of this database, so that it can be compared with its vectors
+
+        Parameters:
+        content (str): the text
+
+        Returns:
+        list[float]: its vector
+        """
+        return self.provider.embed(content)
+
+    @property
+    def threshold(self) -> float:
+        """
+        Cosine similarity from which two texts embedded by the provider of this database match
+        """
+        return self.provider.threshold
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _row(self, id) -> int:
+        id = str(id)
+        if self._rows is None:
+            # ids are usually the integer ids of the graph in insertion order, try that before building the map
+            if id.isdigit() and int(id) < self.size and self.ids[int(id)] == id:
+                return int(id)
+            self._rows = {id: row for row, id in enumerate(self.ids)}
+        row = self._rows[id]
+        if row >= self.size:
+            # inserted after this snapshot was taken
+            raise KeyError(id)
+        return row
+
+    def __contains__(self, id) -> bool:
+        try:
+            self._row(id)
+        except KeyError:
+            return False
+        return True
+
+    def snapshot(self) -> 'VDB':
+        """
+        Read-only view of the rows currently in the database, later inserts are not visible through it
+
+        Returns:
+        VDB: the view
+        """
+        view = VDB(None, embedding=self.embedding)
+        with self._lock:
+            view.ids, view.vectors, view.size, view._rows = self.ids, self.vectors, self.size, self._rows
+            view.norms, view._normed, view.coarse = self.norms, min(self._normed, self.size), self.coarse
+            view.sharding, view.sharded = self.sharding, self.sharded
+        view.read_only = True
+        return view
+
+    def to_arrays(self) -> tuple:
+        """
+        Returns:
+        (list[str], np.ndarray): ids and the matrix of vectors, row i belongs to ids[i]
+        """
+        if self.vectors is None:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return list(self.ids), self.vectors[:self.size]
 
     # query the vector of the id
-    def query_id(self, id: str) -> list[float]:
+    def query_id(self, id: str) -> np.ndarray:
         """
         query the vector of the id
 
         Parameters:
-        id (str): id of interest
+        id (str or int): id of interest
 
         Returns:
-        list[float]: vector corresponding to id
+        np.ndarray: vector corresponding to id
         """
-        with open(self.vdb_file, 'r') as infile:
-            data = json.load(infile)
-        return data[id]
-        
+        return self.vectors[self._row(id)]
+
+
+    def _norms(self, size: int) -> np.ndarray:
+        """
+        Norms of the first size rows, computing the ones not known yet
+        """
+        if self._normed < size:
+            with self._lock:
+                vectors = self.vectors
+                norms = self.norms
+                if norms is None or len(norms) < size:
+                    grown = np.zeros(max(size, len(vectors)), dtype=np.float32)
+                    if norms is not None:
+                        grown[:self._normed] = norms[:self._normed]
+                    norms = grown
+                norms[self._normed:size] = np.linalg.norm(vectors[self._normed:size], axis=1)
+                self.norms = norms
+                self._normed = size
+        return self.norms[:size]
+
+    def _scores(self, input_vector, rows: Optional[np.ndarray]=None, size: Optional[int]=None) -> np.ndarray:
+        """
+        Cosine similarity of a unit vector with the given rows (or the first size rows)
+        """
+        size = self.size if size is None else size
+        norms = self._norms(size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if rows is None:
+                return self.vectors[:size] @ input_vector / norms
+            return self.vectors[rows] @ input_vector / norms[rows]
+
+    @staticmethod
+    def _unit(input_vector) -> np.ndarray:
+        input_vector = np.asarray(input_vector, dtype=np.float32)
+        return input_vector / np.linalg.norm(input_vector)
 
     def query_index(self, input_vector: list[float], count: int=15) -> list[dict]:
         """
@@ -39,18 +226,285 @@ class VDB:
         count (int): number of vectors want
 
         Returns:
-         [{'id': str, 'score': float}]: a list of id's and their cosine similarity with input
+         [{'id': str, 'score': float}]: a list of id's (as strings) and their cosine similarity with input
         """
-        with open(self.vdb_file, 'r') as infile:
-            data = json.load(infile)
-        
-        scores = list()
-        for id, vector in data.items():
-            score = cosine_similarity(input_vector, vector)
-            #print(score)
-            scores.append({'id': id, 'score': score})
-        ordered = sorted(scores, key=lambda d: d['score'], reverse=True)
-        return ordered[0:count]
+        size = self.size
+        if size == 0:
+            return []
+        sharded = self._sharded_top(self._unit(input_vector)[None], count, size)
+        if sharded is not None:
+            rows, scores = sharded[0]
+            return [{'id': self.ids[row], 'score': float(score)} for row, score in zip(rows, scores)]
+        scores = np.nan_to_num(self._scores(self._unit(input_vector), size=size), nan=-1.0)
+        if count < size:
+            # only the top count rows are sorted
+            top = np.argpartition(-scores, count - 1)[:count]
+        else:
+            top = np.arange(size)
+        ordered = top[np.argsort(-scores[top], kind='stable')]
+        return [{'id': self.ids[row], 'score': float(scores[row])} for row in ordered]
+
+    def query_best_batch(self, input_vectors: list, threshold: float, chunk: int=65536) -> list[Optional[dict]]:
+        """
+        query_best for several vectors with one pass over the matrix
+
+        Parameters:
+        input_vectors (list[list[float]]): the vectors to compare to
+        threshold (float): minimum cosine similarity
+        chunk (int): number of rows scored at a time
+
+        Returns:
+        list[Optional[{'id': str, 'score': float}]]: best match of each vector
+        """
+        size = self.size
+        if size == 0 or len(input_vectors) == 0:
+            return [None] * len(input_vectors)
+        queries = np.asarray(input_vectors, dtype=np.float32)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        sharded = self._sharded_top(queries, 1, size)
+        if sharded is not None:
+            return [{'id': self.ids[rows[0]], 'score': float(scores[0])} if len(rows) != 0 and scores[0] >= threshold else None for rows, scores in sharded]
+        norms = self._norms(size)
+        best_rows = np.zeros(len(queries), dtype=np.int64)
+        best_scores = np.full(len(queries), -np.inf, dtype=np.float32)
+        for start in range(0, size, chunk):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = np.nan_to_num((self.vectors[start:min(start + chunk, size)] @ queries.T) / norms[start:min(start + chunk, size), None], nan=-1.0)
+            rows = np.argmax(scores, axis=0)
+            top = scores[rows, np.arange(len(queries))]
+            better = top > best_scores
+            best_rows[better], best_scores[better] = rows[better] + start, top[better]
+        return [{'id': self.ids[row], 'score': float(score)} if score >= threshold else None for row, score in zip(best_rows, best_scores)]
+
+    def enable_batching(self, max_batch: int=64, max_wait: float=0.002) -> None:
+        """
+        Coalesce query_best calls made concurrently by several threads into query_best_batch calls
+
+        Parameters:
+        max_batch (int): maximum number of queries in a batch
+        max_wait (float): seconds a query waits for others to join its batch
+        """
+        def process(items: list) -> list:
+            results = [None] * len(items)
+            by_threshold = dict()
+            for i, (_, threshold) in enumerate(items):
+                by_threshold.setdefault(threshold, []).append(i)
+            for threshold, indices in by_threshold.items():
+                for i, result in zip(indices, self.query_best_batch([items[i][0] for i in indices], threshold)):
+                    results[i] = result
+            return results
+        self.batcher = Batcher(process, max_batch=max_batch, max_wait=max_wait, max_in_flight=1, name="vdb")
+
+    def _coarse_index(self, size: int) -> Optional['CoarseIndex']:
+        """
+        The coarse index for threshold queries, (re)built once the database is large enough and when it
+        covers less than half of the rows
+        """
+        coarse = self.coarse
+        if size < self.COARSE_MIN_ROWS:
+            return None
+        if coarse is None or coarse.size * 2 < size:
+            if self.read_only:
+                return coarse
+            with self._lock:
+                vectors = np.asarray(self.vectors[:size], dtype=np.float32)
+                coarse = CoarseIndex(vectors / self._norms(size)[:, None])
+                self.coarse = coarse
+        return coarse
+
+    def _pruned_clusters(self, unit: np.ndarray, threshold: float, size: int) -> Optional[tuple]:
+        """
+        The coarse index used and the clusters of it that may hold a row reaching the threshold with their
+        upper bounds, by decreasing bound, or None if there is no index or it can't prune enough to beat
+        one pass over the matrix. Writers may drop or replace self.coarse meanwhile, the clusters must only
+        be read through the returned index.
+        """
+        coarse = self._coarse_index(size)
+        if coarse is None:
+            return None
+        bounds = coarse.bounds(unit)
+        clusters = np.nonzero(bounds >= threshold)[0]
+        if coarse.count(clusters) > self.COARSE_MAX_SCAN * size:
+            return None
+        clusters = clusters[np.argsort(-bounds[clusters], kind='stable')]
+        return coarse, clusters, bounds[clusters]
+
+    @staticmethod
+    def _members(coarse: 'CoarseIndex', cluster: int, size: int) -> np.ndarray:
+        # an index built by another thread can hold rows beyond the size this query sees
+        rows = coarse.members(cluster)
+        return rows[rows < size] if coarse.size > size else rows
+
+    def enable_sharding(self, processes: Optional[int]=None, num_shards: Optional[int]=None, min_rows: Optional[int]=None) -> None:
+        """
+        Score full scans of the matrix with a pool of worker processes once it has min_rows rows. The
+        pool is started by the first query that needs it, and restarted when the rows it doesn't cover
+        (added since) are as many as the ones it does.
+
+        Parameters:
+        processes (int or None): number of worker processes, all the cores by default
+        num_shards (int or None): number of shards of rows, one per process by default
+        min_rows (int or None): rows from which scans are sharded, SHARD_MIN_ROWS by default
+        """
+        self.sharding = {'processes': processes, 'num_shards': num_shards, 'min_rows': self.SHARD_MIN_ROWS if min_rows is None else min_rows}
+
+    def _sharded_scorer(self, size: int) -> Optional[ShardedScorer]:
+        sharded = self.sharded
+        if self.sharding is None or size < self.sharding['min_rows']:
+            return None
+        # a snapshot starts its own pool if it has none, but doesn't replace the one it shares
+        if sharded is None or (sharded.size * 2 < size and not self.read_only):
+            with self._lock:
+                if self.sharded is None or (self.sharded.size * 2 < size and not self.read_only):
+                    # the previous pool is stopped once no reader (or snapshot) uses it anymore
+                    self.sharded = ShardedScorer(self.vectors, self._norms(size), size, self.sharding['processes'], self.sharding['num_shards'])
+                sharded = self.sharded
+        return sharded
+
+    def _sharded_merge(self, unit_queries: np.ndarray, results: list, size: int, scorer_size: int, keep) -> list:
+        """
+        Drop the rows of the scorer beyond size (a snapshot), add the scores of the rows it doesn't cover
+        yet, and keep the best ones with keep(scores) -> positions
+        """
+        merged = []
+        tail = None
+        if scorer_size < size:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                tail = np.nan_to_num(self.vectors[scorer_size:size] @ unit_queries.T / self._norms(size)[scorer_size:size, None], nan=-1.0)
+        for j, (rows, scores) in enumerate(results):
+            visible = rows < size
+            rows, scores = rows[visible], scores[visible]
+            if tail is not None:
+                rows = np.concatenate([rows, np.arange(scorer_size, size)])
+                scores = np.concatenate([scores, tail[:, j]])
+            positions = keep(scores)
+            order = positions[np.argsort(-scores[positions], kind='stable')]
+            merged.append((rows[order], scores[order]))
+        return merged
+
+    def _sharded_top(self, unit_queries: np.ndarray, count: int, size: int) -> Optional[list]:
+        """
+        The count best (rows, scores) of each unit query from the worker pool, None if scans are not sharded
+        """
+        scorer = self._sharded_scorer(size)
+        if scorer is None:
+            return None
+        results = scorer.top(unit_queries, count + max(0, scorer.size - size))
+        return self._sharded_merge(unit_queries, results, size, scorer.size, lambda scores: np.argsort(-scores, kind='stable')[:count])
+
+    def _sharded_above(self, unit: np.ndarray, threshold: float, size: int) -> Optional[tuple]:
+        """
+        (rows, scores) reaching the threshold from the worker pool, None if scans are not sharded
+        """
+        scorer = self._sharded_scorer(size)
+        if scorer is None:
+            return None
+        results = scorer.above(unit[None], threshold)
+        return self._sharded_merge(unit[None], results, size, scorer.size, lambda scores: np.nonzero(scores >= threshold)[0])[0]
+
+    def query_range(self, input_vector: list[float], threshold: float) -> list[dict]:
+        """
+        All the vectors whose cosine similarity with the input is at least threshold
+
+        Parameters:
+        input_vector (list[float]): the vector to compare to
+        threshold (float): minimum cosine similarity
+
+        Returns:
+        [{'id': str, 'score': float}]: id's (as strings) and scores, most similar first
+        """
+        size = self.size
+        if size == 0:
+            return []
+        unit = self._unit(input_vector)
+        pruned = self._pruned_clusters(unit, threshold, size)
+        sharded = self._sharded_above(unit, threshold, size) if pruned is None else None
+        if sharded is not None:
+            rows, scores = sharded
+            return [{'id': self.ids[row], 'score': float(score)} for row, score in zip(rows, scores)]
+        if pruned is None:
+            rows = np.arange(size)
+            scores = self._scores(unit, size=size)
+        else:
+            coarse, clusters, _ = pruned
+            # rows added after the index was built are always scanned
+            rows = np.concatenate([self._members(coarse, cluster, size) for cluster in clusters] + [np.arange(coarse.size, size)])
+            scores = self._scores(unit, rows, size)
+        keep = scores >= threshold
+        rows, scores = rows[keep], scores[keep]
+        ordered = np.argsort(-scores, kind='stable')
+        return [{'id': self.ids[rows[i]], 'score': float(scores[i])} for i in ordered]
+
+    def query_best(self, input_vector: list[float], threshold: float) -> Optional[dict]:
+        """
+        The most similar vector, if its cosine similarity with the input is at least threshold
+
+        Parameters:
+        input_vector (list[float]): the vector to compare to
+        threshold (float): minimum cosine similarity
+
+        Returns:
+        Optional[{'id': str, 'score': float}]: id (as string) and score of the best match
+        """
+        if self.batcher is not None:
+            return self.batcher.submit((input_vector, threshold))
+        size = self.size
+        if size == 0:
+            return None
+        unit = self._unit(input_vector)
+        pruned = self._pruned_clusters(unit, threshold, size)
+        sharded = self._sharded_top(unit[None], 1, size) if pruned is None else None
+        if sharded is not None:
+            rows, scores = sharded[0]
+            if len(rows) == 0 or scores[0] < threshold:
+                return None
+            return {'id': self.ids[rows[0]], 'score': float(scores[0])}
+        if pruned is None:
+            candidates = [np.arange(size)]
+        else:
+            coarse, clusters, cluster_bounds = pruned
+            candidates = [np.arange(coarse.size, size)] + [self._members(coarse, cluster, size) for cluster in clusters]
+            bounds = [np.inf] + list(cluster_bounds)
+        best_row, best_score = None, threshold
+        for i, rows in enumerate(candidates):
+            if pruned is not None and bounds[i] < best_score:
+                # clusters come by decreasing bound, none of the remaining ones can do better
+                break
+            if len(rows) == 0:
+                continue
+            if pruned is None:
+                scores = self._scores(unit, size=size)
+            else:
+                scores = self._scores(unit, rows, size)
+            scores = np.nan_to_num(scores, nan=-1.0)
+            top = int(np.argmax(scores))
+            if scores[top] >= best_score:
+                best_row, best_score = int(rows[top]), float(scores[top])
+        if best_row is None:
+            return None
+        return {'id': self.ids[best_row], 'score': best_score}
+
+    def query_best_among(self, input_vector: list[float], ids: list, threshold: float) -> Optional[dict]:
+        """
+        query_best restricted to the vectors of the given ids, only those rows are scored
+
+        Parameters:
+        input_vector (list[float]): the vector to compare to
+        ids (list[str or int]): ids of the candidates, the ones not in the database are ignored
+        threshold (float): minimum cosine similarity
+
+        Returns:
+        Optional[{'id': str, 'score': float}]: id (as string) and score of the best match
+        """
+        size = self.size
+        rows = np.fromiter((self._row(id) for id in ids if id in self), dtype=np.int64)
+        if len(rows) == 0:
+            return None
+        scores = np.nan_to_num(self._scores(self._unit(input_vector), rows, size), nan=-1.0)
+        top = int(np.argmax(scores))
+        if scores[top] < threshold:
+            return None
+        return {'id': self.ids[rows[top]], 'score': float(scores[top])}
 
 
     def insert_index(self, in_data: {str: list[float]}) -> None:
@@ -58,23 +512,190 @@ class VDB:
         Insert data into the vector database
 
         Parameters:
-        in_data ({str: list[float]}): Dictionary maps id to the vector
+        in_data ({str: list[float]}): Dictionary maps id (str or int) to the vector
+        """
+        if self.read_only:
+            raise Exception("this vector database is a read-only snapshot")
+        with self._lock:
+            self._insert(in_data)
+            if self.vdb_file is not None:
+                self._dirty = True
+                if time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+                    self.save()
+                else:
+                    _unsaved.add(self)
+
+    def _insert(self, in_data: {str: list[float]}) -> None:
+        copied = False
+        for id, vector in in_data.items():
+            id = str(id)
+            vector = np.asarray(vector, dtype=np.float32)
+            if id in self:
+                row = self._row(id)
+                if not copied:
+                    # snapshots share the matrix and the norms, the updated rows go into copies of them
+                    self.vectors = np.array(self.vectors)
+                    self.norms = np.array(self.norms) if self.norms is not None else None
+                    copied = True
+                self.vectors[row] = vector
+                if row < self._normed:
+                    self.norms[row] = np.linalg.norm(vector)
+                self.coarse, self.sharded = None, None
+                continue
+            if not isinstance(self.ids, list):
+                self.ids = list(self.ids)
+            if self._rows is None:
+                self._rows = {id: row for row, id in enumerate(self.ids)}
+            if self.vectors is None:
+                self.vectors = np.zeros((16, len(vector)), dtype=np.float32)
+            elif self.size == len(self.vectors) or not self.vectors.flags.writeable:
+                # grow the matrix (and copy it out of a read-only memory map)
+                grown = np.zeros((max(16, 2 * self.size), self.vectors.shape[1]), dtype=np.float32)
+                grown[:self.size] = self.vectors[:self.size]
+                self.vectors = grown
+            self.vectors[self.size] = vector
+            self.ids.append(id)
+            self._rows[id] = self.size
+            # size is bumped last, readers never see a row before it is written
+            self.size += 1
+
+    def rekey(self, id_map: dict) -> None:
+        """
+        Rename the ids of the database, ids not in the map are dropped
+
+        Parameters:
+        id_map (dict): maps old id to new id
+        """
+        with self._lock:
+            kept = [(str(new_id), self._row(old_id)) for old_id, new_id in id_map.items() if old_id in self]
+            ids = [new_id for new_id, _ in kept]
+            if len(kept) == 0:
+                self.empty_db()
+                return
+            vectors = self.vectors[[row for _, row in kept]]
+            self.ids, self.vectors, self.size, self._rows = ids, vectors, len(ids), None
+            self.norms, self._normed, self.coarse, self.sharded = None, 0, None, None
+            if self.vdb_file is not None:
+                self.save()
+
+    def load(self) -> None:
+        """
+        Read the database from its JSON file
         """
-        data = {}
-        # Read existing data from file
         with open(self.vdb_file, 'r') as infile:
             data = json.load(infile)
+        self.ids = list(data.keys())
+        self.vectors = np.asarray(list(data.values()), dtype=np.float32) if len(data) != 0 else None
+        self.size = len(self.ids)
+        self._rows = None
+        self.norms, self._normed, self.coarse, self.sharded = None, 0, None, None
 
-        # append new data to the old data
-        data.update(in_data)
+    def save(self) -> None:
+        """
+        Write the whole database to its JSON file
+        """
+        with self._lock:
+            data = {id: self.vectors[row].tolist() for row, id in enumerate(self.ids[:self.size])}
+            # write a temporary file and move it over the old one, so readers of the file never see half of it
+            tmp_file = f'{self.vdb_file}.tmp'
+            with open(tmp_file, 'w') as outfile:
+                json.dump(data, outfile, indent=2)
+            os.replace(tmp_file, self.vdb_file)
+            self._saved_at, self._dirty = time.monotonic(), False
+            _unsaved.discard(self)
 
-        # Write updated data back to file
-        with open(self.vdb_file, 'w') as outfile:
-            json.dump(data, outfile, indent=2)
+    def flush(self) -> None:
+        """
+        Write the inserts not written to the JSON file yet
+        """
+        with self._lock:
+            if self._dirty and self.vdb_file is not None:
+                self.save()
 
     def empty_db(self) -> None:
         """
-        empty the current database file
+        empty the current database
+        """
+        with self._lock:
+            self.ids, self.vectors, self.size, self._rows = [], None, 0, dict()
+            self.norms, self._normed, self.coarse, self.sharded = None, 0, None, None
+            if self.vdb_file is not None:
+                with open(self.vdb_file, 'w') as f:
+                    json.dump({}, f)
+
+    def __getstate__(self):
+        ids, vectors = self.to_arrays()
+        return {'vdb_file': self.vdb_file, 'ids': ids, 'vectors': np.array(vectors), 'embedding': self.embedding}
+
+    def __setstate__(self, state):
+        self.vdb_file = state['vdb_file']
+        self.embedding = state.get('embedding', 'openai')
+        self.provider = get_embedding(self.embedding)
+        self.read_only = False
+        self._lock = threading.RLock()
+        self._saved_at, self._dirty = time.monotonic(), False
+        self.norms, self._normed, self.coarse = None, 0, None
+        self.batcher = None
+        self.sharding, self.sharded = None, None
+        if 'ids' not in state:
+            # pickles written before vectors were held in memory only know the JSON file
+            self.load()
+            return
+        self.ids = state['ids']
+        self.vectors = state['vectors'] if len(self.ids) != 0 else None
+        self.size = len(self.ids)
+        self._rows = None
+
+
+class CoarseIndex:
+    """
+    Clusters of unit-normalized rows (one k-means step from random seeds). For a unit query q and a row x
+    of a cluster with unit centroid c and radius r = max |x - c|, q.x <= q.c + r, so a cluster whose bound
+    is below a similarity threshold can be skipped without scoring its rows.
+    """
+    def __init__(self, unit_vectors: np.ndarray, num_clusters: Optional[int]=None, seed: int=0, chunk: int=8192):
+        self.size: int = len(unit_vectors)
+        num_clusters = num_clusters or min(256, max(1, int(np.sqrt(self.size))))
+        rng = np.random.default_rng(seed)
+        centroids = unit_vectors[rng.choice(self.size, num_clusters, replace=False)]
+
+        for step in range(2):
+            labels = np.empty(self.size, dtype=np.int64)
+            dots = np.empty(self.size, dtype=np.float32)
+            for start in range(0, self.size, chunk):
+                similarity = unit_vectors[start:start + chunk] @ centroids.T
+                labels[start:start + chunk] = np.argmax(similarity, axis=1)
+                dots[start:start + chunk] = similarity[np.arange(len(similarity)), labels[start:start + chunk]]
+            if step == 0:
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, unit_vectors)
+                lengths = np.linalg.norm(sums, axis=1)
+                # empty clusters keep their seed
+                nonempty = lengths > 0
+                centroids[nonempty] = sums[nonempty] / lengths[nonempty, None]
+
+        self.centroids: np.ndarray = centroids
+        # |x - c|^2 = 2 - 2 x.c for unit x and c
+        self.radius: np.ndarray = np.zeros(num_clusters, dtype=np.float32)
+        np.maximum.at(self.radius, labels, np.sqrt(np.maximum(0.0, 2.0 - 2.0 * dots)))
+        self.order: np.ndarray = np.argsort(labels, kind='stable')
+        self.offsets: np.ndarray = np.zeros(num_clusters + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=num_clusters), out=self.offsets[1:])
+
+    def bounds(self, unit_query: np.ndarray) -> np.ndarray:
+        """
+        Upper bound of the cosine similarity between the query and any row of each cluster
+        """
+        return self.centroids @ unit_query + self.radius
+
+    def count(self, clusters: np.ndarray) -> int:
+        """
+        Number of rows in the given clusters
+        """
+        return int((self.offsets[clusters + 1] - self.offsets[clusters]).sum())
+
+    def members(self, cluster: int) -> np.ndarray:
+        """
+        Rows of a cluster
         """
-        with open(self.vdb_file, 'w') as f:
-            json.dump({}, f)
\ No newline at end of file
+        return self.order[self.offsets[cluster]:self.offsets[cluster + 1]]
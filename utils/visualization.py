@@ -0,0 +1,196 @@
+"""
+Visualization of (part of) a knowledge graph as a vis-network HTML page or as JSON. Only a bounded sample
+of the graph is rendered, either the k-hop neighbourhood of some entities or the most important entities
+(by degree or PageRank, see KnowledgeGraph.analytics), and the output is streamed to disk node by node instead of being built in memory.
+"""
+from typing import Dict, List, Optional, TextIO
+from collections import deque
+import json
+import math
+import numpy as np
+
+HTML_HEAD = """<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/dist/vis-network.min.css" crossorigin="anonymous" referrerpolicy="no-referrer" />
+<script src="https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js" crossorigin="anonymous" referrerpolicy="no-referrer"></script>
+<style type="text/css">#mynetwork {width: 100%; height: 1000px; background-color: #ffffff; border: 1px solid lightgray;}</style>
+</head>
+<body>
+<div id="mynetwork"></div>
+<script type="text/javascript">
+"""
+
+HTML_TAIL = """var options = {
+  "edges": {"color": {"inherit": true}, "smooth": {"enabled": true, "type": "dynamic"}},
+  "interaction": {"dragNodes": true, "hideEdgesOnDrag": false, "hideNodesOnDrag": false},
+  "physics": {"enabled": %s, "stabilization": {"enabled": true, "fit": true, "iterations": 1000, "updateInterval": 50}}
+};
+var network = new vis.Network(document.getElementById("mynetwork"), {nodes: nodes, edges: edges}, options);
+</script>
+</body>
+</html>
+"""
+
+
+def sample_neighbourhood(knowledge_graph, entity_names: List[str], hops: int, max_nodes: int, max_hub_degree: Optional[int]=None) -> List:
+    """
+    Entities within the given number of hops (following relations from head to tail) of the seed
+    entities, breadth first, at most max_nodes of them. The neighbours of an entity are taken by
+    decreasing PageRank, so the budget goes to the important ones.
+
+    Parameters:
+    knowledge_graph (KnowledgeGraph): the graph
+    entity_names (list[str]): names (or aliases) of the seed entities
+    hops (int): radius of the neighbourhood
+    max_nodes (int): node budget
+    max_hub_degree (int or None): entities with a higher degree (in + out) are shown but not expanded,
+        other than the seeds
+
+    Returns:
+    list[KGEntity]: the sampled entities
+    """
+    analytics = knowledge_graph.analytics()
+    rank = analytics.pagerank
+    degree = analytics.degree
+    visited = dict()
+    q = deque()
+    for name in entity_names:
+        name = knowledge_graph.canonical_name(name)
+        if not name in knowledge_graph.entities:
+            raise Exception(f"entity {name} doesn't exist in the knowledge graph")
+        entity = knowledge_graph.entities[name]
+        if entity.id not in visited and len(visited) < max_nodes:
+            visited[entity.id] = entity
+            q.append((entity, 0))
+
+    while len(q) != 0 and len(visited) < max_nodes:
+        current, distance = q.popleft()
+        if distance == hops:
+            continue
+        if distance != 0 and max_hub_degree is not None and degree[current.id] > max_hub_degree:
+            continue
+        neighbours = [knowledge_graph.entities[relation.tail_entity] for relation in knowledge_graph.out_relations(current)]
+        neighbours.sort(key=lambda entity: -rank[entity.id])
+        for next_entity in neighbours:
+            if next_entity.id in visited:
+                continue
+            visited[next_entity.id] = next_entity
+            if len(visited) >= max_nodes:
+                break
+            q.append((next_entity, distance + 1))
+    return list(visited.values())
+
+
+def sample_top(knowledge_graph, max_nodes: int, rank: str="degree") -> List:
+    """
+    The max_nodes most important entities, isolated entities coming last
+
+    Parameters:
+    knowledge_graph (KnowledgeGraph): the graph
+    max_nodes (int): node budget
+    rank (str): "degree" (in + out) or "pagerank"
+
+    Returns:
+    list[KGEntity]: the sampled entities
+    """
+    analytics = knowledge_graph.analytics()
+    if rank == "degree":
+        order = np.argsort(-analytics.degree, kind='stable')
+    elif rank == "pagerank":
+        order = analytics.by_importance()
+    else:
+        raise Exception(f"unknown rank {rank}")
+    return [knowledge_graph.get_entity(id) for id in order[:max_nodes]]
+
+
+def layout_positions(entities: List, edges: List[tuple], layout: str) -> Dict[int, tuple]:
+    """
+    Precompute node positions so the browser doesn't have to run the physics simulation
+
+    Parameters:
+    entities (list[KGEntity]): the sampled entities
+    edges (list[tuple]): (head id, tail id) pairs between sampled entities
+    layout (str): "circular" (instant) or "spring" (networkx force-directed, on the sample only)
+
+    Returns:
+    dict[int, tuple]: entity id -> (x, y)
+    """
+    if layout == "circular":
+        count = max(len(entities), 1)
+        radius = 50 * count / (2 * math.pi) + 100
+        return {entity.id: (radius * math.cos(2 * math.pi * i / count), radius * math.sin(2 * math.pi * i / count)) for i, entity in enumerate(entities)}
+    if layout == "spring":
+        import networkx as nx
+        G = nx.DiGraph()
+        G.add_nodes_from(entity.id for entity in entities)
+        G.add_edges_from(edges)
+        pos = nx.spring_layout(G, k=0.1, iterations=50, seed=0)
+        scale = 100 * math.sqrt(len(entities)) + 100
+        return {id: (float(x) * scale, float(y) * scale) for id, (x, y) in pos.items()}
+    raise Exception(f"unknown layout {layout}")
+
+
+def _node(entity, position: Optional[tuple]) -> dict:
+    label = str(entity.name)
+    color = "blue" if label.startswith("l(") else "black"
+    shape = "box" if color == "blue" else "ellipse"
+    node = {"id": entity.id, "label": label, "color": color, "shape": shape, "font": {"color": "white"}}
+    if position is not None:
+        node["x"], node["y"] = position
+    return node
+
+
+def _write_array(f: TextIO, items, script: bool=False) -> None:
+    """
+    Write the items as a JSON array. In a <script> element, '</' is escaped so that a name holding
+    "</script>" can't end the element
+    """
+    f.write("[\n")
+    first = True
+    for item in items:
+        if not first:
+            f.write(",\n")
+        text = json.dumps(item)
+        f.write(text.replace('</', '<\\/') if script else text)
+        first = False
+    f.write("\n]")
+
+
+def write_visualization(knowledge_graph, entities: List, path: str, layout: Optional[str]=None) -> None:
+    """
+    Stream the sampled entities and the relations between them to an HTML page, or to JSON if the path
+    ends with .json
+
+    Parameters:
+    knowledge_graph (KnowledgeGraph): the graph
+    entities (list[KGEntity]): the sampled entities
+    path (str): output file
+    layout (str or None): precompute positions with this layout, None lets the browser lay out the graph
+    """
+    sampled = {entity.id for entity in entities}
+    edges = []
+    for entity in entities:
+        for relation in knowledge_graph.out_relations(entity):
+            tail = knowledge_graph.entities[relation.tail_entity]
+            if tail.id in sampled:
+                edges.append((entity.id, tail.id, relation.name))
+    positions = layout_positions(entities, [(head, tail) for head, tail, _ in edges], layout) if layout is not None else dict()
+
+    nodes = (_node(entity, positions.get(entity.id)) for entity in entities)
+    edge_items = ({"from": head, "to": tail, "title": name} for head, tail, name in edges)
+    with open(path, "w") as f:
+        if path.endswith(".json"):
+            f.write('{"nodes": ')
+            _write_array(f, nodes)
+            f.write(', "edges": ')
+            _write_array(f, edge_items)
+            f.write('}\n')
+            return
+        f.write(HTML_HEAD)
+        f.write("var nodes = new vis.DataSet(")
+        _write_array(f, nodes, script=True)
+        f.write(");\nvar edges = new vis.DataSet(")
+        _write_array(f, edge_items, script=True)
+        f.write(");\n")
+        f.write(HTML_TAIL % ("false" if layout is not None else "true"))